@@ -1,21 +1,282 @@
-from flask import Flask, request, jsonify
+import time
+# Cold-start clock: every startup phase is reported relative to the start of this import
+IMPORT_STARTED = time.perf_counter()
+
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import json
-import random
-from datetime import datetime, date
+import itertools
+import os
+import resource
+import threading
+from datetime import datetime
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import roc_auc_score
-from sklearn.preprocessing import LabelEncoder
+from data_loader import DATASET_SHEETS, DatasetLoader
+from compact_forest import CompactForest
+from feature_store import FailureFeatureStore
+from inference_pool import InferencePool, InferencePoolError, model_ref, score_churn
+from instrumentation import MetricsRegistry, SamplingProfiler
+from micro_batcher import MicroBatcher
+from plan_catalog import PlanCatalog
+from pricing import DEFAULT_ELASTICITY, DEFAULT_ELASTICITY_SCENARIOS, DEFAULT_PRICE_RANGE, DEFAULT_PRICE_STEPS, PortfolioPricingOptimizer, simulate_pricing
+from recommendation_index import DEFAULT_BUDGET_STEP, DEFAULT_INDEX_K, DEFAULT_USAGE_STEP, RecommendationIndex
+from response_cache import ResponseCache
+from retraining import BackgroundRetrainer
+from serialization import JSON_BACKENDS, InvalidLine, dumps, loads, ndjson_chunks, ndjson_records
+from model_registry import ModelRegistry
+from tenants import TenantRegistry, load_tenant_specs
+# Only the schema constants: the pipeline itself (and sklearn's training modules) load on first training
+from training_pipeline import CHURN_CATEGORICAL_COLS, CHURN_FEATURES, CHURN_REFERENCE_DATE, CHURN_TRAINING_COLUMNS, parse_partition
+
+# Routes live on a blueprint; create_app() builds the Flask app around one engine
+api = Blueprint('ml_api', __name__)
+
+# Training runs chunk by chunk; sampling/partitioning change the model, so they are part of the config
+TRAINING_N_JOBS = int(os.environ.get('TRAINING_N_JOBS', -1))  # Trees fitted in parallel (-1 = all cores)
+TRAINING_CHUNK_ROWS = int(os.environ.get('TRAINING_CHUNK_ROWS', 100000))
+TRAINING_TRACE_MEMORY = os.environ.get('TRAINING_TRACE_MEMORY', '0') == '1'  # tracemalloc stage peaks (slows training)
+CHURN_TRAINING_CONFIG = {
+    'model': 'RandomForestClassifier',
+    'n_estimators': 100,
+    'random_state': 42,
+    'test_size': 0.2,
+    'features': CHURN_FEATURES,
+    'reference_date': CHURN_REFERENCE_DATE.isoformat(),
+    'sample_fraction': float(os.environ.get('TRAINING_SAMPLE_FRACTION', 1.0)),
+    'partition': os.environ.get('TRAINING_PARTITION') or None  # e.g. '0/4': one hash partition of the subscriptions
+}
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Workbook (.xlsx) or directory of CSV/Parquet/Arrow exports named after the sheets
+DATASET_PATH = os.environ.get('DATASET_PATH', os.path.join(SERVICE_DIR, '..', 'SubscriptionUseCase_Dataset.xlsx'))
+DATASET_CACHE_DIR = os.environ.get('DATASET_CACHE_DIR', os.path.join(SERVICE_DIR, 'data_cache'))
+MODEL_CACHE_DIR = os.environ.get('MODEL_CACHE_DIR', os.path.join(SERVICE_DIR, 'model_cache'))
+# Optional CSV/Parquet plan catalog (plan_id, type, category, price, data, speed) replacing the built-in plans
+PLAN_CATALOG_PATH = os.environ.get('PLAN_CATALOG_PATH')
+
+# Extra named models hosted next to the default one: inline JSON or a JSON file (see tenants.py)
+ML_TENANTS = os.environ.get('ML_TENANTS')
+# Requests pick a model with this header (or ?model=); without one the default model answers
+MODEL_KEY_HEADER = 'X-Model-Key'
+
+# Rows scored per predict_proba call in batch mode
+BATCH_CHUNK_SIZE = 1024
+
+# Top-k plans precomputed per usage x budget x service type grid cell, built in the background per catalog
+# version and cached in DATASET_CACHE_DIR; queries outside indexed cells (or for more plans) are scored exactly
+RECOMMEND_INDEX = os.environ.get('RECOMMEND_INDEX', '1') == '1'
+RECOMMEND_INDEX_K = int(os.environ.get('RECOMMEND_INDEX_K', DEFAULT_INDEX_K))
+RECOMMEND_INDEX_USAGE_STEP = float(os.environ.get('RECOMMEND_INDEX_USAGE_STEP', DEFAULT_USAGE_STEP))  # GB
+RECOMMEND_INDEX_BUDGET_STEP = float(os.environ.get('RECOMMEND_INDEX_BUDGET_STEP', DEFAULT_BUDGET_STEP))  # $
+
+# Response encoder: 'orjson' (NumPy-aware, falls back to json when not installed) or the stdlib 'json'
+ML_JSON_BACKEND = os.environ.get('ML_JSON_BACKEND', 'orjson')
+# Echo request bodies back in responses (user_data, subscription_data, plan_data); per request with ?echo=1
+ML_ECHO_INPUT = os.environ.get('ML_ECHO_INPUT', '0') == '1'
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl')
+# Streamed NDJSON lines are flushed to the client in writes of about this size
+NDJSON_FLUSH_BYTES = 64 * 1024
+
+# Churn inference backend: 'sklearn' (RandomForestClassifier.predict_proba) or 'compact' (flat node tables)
+CHURN_INFERENCE_BACKEND = os.environ.get('CHURN_INFERENCE_BACKEND', 'sklearn')
+
+# Per-prediction explanations: path contributions walked on the forest's flat node tables. That walk yields
+# the probability too (equal to predict_proba), so while they are on churn is always scored on the node
+# tables and CHURN_INFERENCE_BACKEND only takes effect with CHURN_EXPLANATIONS=0 (see churn_scoring_mode)
+CHURN_EXPLANATIONS = os.environ.get('CHURN_EXPLANATIONS', '1') == '1'
+# Response names of the churn features (CHURN_FEATURES order) and the retention strategy each one suggests
+CHURN_FACTOR_NAMES = ['price', 'subscription_duration', 'days_since_renewal', 'payment_failures', 'renew_failures',
+                      'subscription_type', 'auto_renewal', 'user_status']
+RETENTION_STRATEGIES = {
+    'price': "Provide discount or loyalty pricing",
+    'subscription_duration': "Implement onboarding program and early engagement",
+    'days_since_renewal': "Send renewal reminders with a re-engagement offer",
+    'payment_failures': "Flexible payment options and automatic billing",
+    'renew_failures': "Flexible payment options and automatic billing",
+    'subscription_type': "Suggest a plan term that better fits the customer",
+    'auto_renewal': "Encourage auto-renewal with a renewal incentive",
+    'user_status': "Priority customer support and proactive assistance",
+}
+# Churn probability a factor must add before it drives a retention strategy
+CHURN_FACTOR_THRESHOLD = 0.02
+
+# Background retraining: new models are swapped in only if their holdout AUC reaches RETRAIN_MIN_AUC
+RETRAIN_MIN_AUC = float(os.environ.get('RETRAIN_MIN_AUC', 0.6))
+RETRAIN_INTERVAL_SECONDS = float(os.environ.get('RETRAIN_INTERVAL_SECONDS', 0))  # 0 disables the scheduler
+# Only one worker schedules (and one at a time runs) retrains; the others reload what it publishes this often
+REGISTRY_WATCH_SECONDS = float(os.environ.get('REGISTRY_WATCH_SECONDS', 10))  # 0 disables reloading
+# Incremental retraining: add warm_start trees fitted on subscriptions changed since the last checkpoint,
+# with a full refit when the serving model's AUC on them drifts below the checkpoint's or the forest is full
+RETRAIN_INCREMENTAL = os.environ.get('RETRAIN_INCREMENTAL', '0') == '1'  # default for /admin/retrain and the scheduler
+INCREMENTAL_TREES = int(os.environ.get('INCREMENTAL_TREES', 10))
+INCREMENTAL_MAX_TREES = int(os.environ.get('INCREMENTAL_MAX_TREES', 200))
+INCREMENTAL_MAX_AUC_DROP = float(os.environ.get('INCREMENTAL_MAX_AUC_DROP', 0.05))
+# When set, /admin endpoints require a matching X-Admin-Token header
+ML_ADMIN_TOKEN = os.environ.get('ML_ADMIN_TOKEN')
+
+# Response cache for /recommend, /churn/predict and /pricing/optimize[/portfolio] (0 entries disables it)
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 10000))
+RESPONSE_CACHE_TTLS = {
+    'recommend': float(os.environ.get('RECOMMEND_CACHE_TTL', 300)),
+    'churn_predict': float(os.environ.get('CHURN_CACHE_TTL', 60)),
+    'pricing_optimize': float(os.environ.get('PRICING_CACHE_TTL', 300)),
+    'pricing_portfolio': float(os.environ.get('PRICING_CACHE_TTL', 300)),
+}
+# Bump when optimize_pricing's logic changes so cached pricing responses are dropped
+PRICING_MODEL_VERSION = 'pricing-v1'
+
+# Micro-batching of concurrent single /churn/predict requests
+CHURN_MICRO_BATCHING = os.environ.get('CHURN_MICRO_BATCHING', '1') == '1'
+CHURN_BATCH_MAX_SIZE = int(os.environ.get('CHURN_BATCH_MAX_SIZE', 64))
+CHURN_BATCH_MAX_WAIT_MS = float(os.environ.get('CHURN_BATCH_MAX_WAIT_MS', 2))
+CHURN_REQUEST_TIMEOUT = float(os.environ.get('CHURN_REQUEST_TIMEOUT', 30))
+
+# Process pool for CPU-bound churn scoring, so large batches don't hold the request threads (0 scores in-process)
+INFERENCE_POOL_WORKERS = int(os.environ.get('INFERENCE_POOL_WORKERS', 0))
+INFERENCE_POOL_MAX_PENDING = int(os.environ.get('INFERENCE_POOL_MAX_PENDING', 4 * max(INFERENCE_POOL_WORKERS, 1)))  # beyond: 429
+INFERENCE_POOL_TIMEOUT = float(os.environ.get('INFERENCE_POOL_TIMEOUT', 30))  # seconds per request (per chunk when streamed); beyond: 503
+INFERENCE_POOL_MIN_ROWS = int(os.environ.get('INFERENCE_POOL_MIN_ROWS', 64))  # smaller feature matrices are scored in-process
+
+# When create_app() loads the churn model: 'background' (thread at startup; /recommend and /pricing serve
+# meanwhile), 'eager' (before returning, e.g. gunicorn preload) or 'lazy' (on the first request)
+ML_ENGINE_LOAD = os.environ.get('ML_ENGINE_LOAD', 'background')
+ENGINE_LOAD_MODES = ('background', 'eager', 'lazy')
+
+# Opt-in sampling profiler behind /admin/profile (admin token applies)
+ML_PROFILER_ENABLED = os.environ.get('ML_PROFILER_ENABLED', '0') == '1'
+ML_PROFILER_MAX_SECONDS = 60
+
+# Prometheus metrics served on /metrics (kept per worker process)
+metrics = MetricsRegistry()
+metrics.counter('ml_requests_total', 'HTTP requests handled', ['endpoint', 'method', 'status'])
+metrics.counter('ml_request_errors_total', 'HTTP requests answered with a 4xx or 5xx status', ['endpoint', 'status'])
+metrics.histogram('ml_request_duration_seconds', 'Time to produce the response (streamed responses: until the first byte)', ['endpoint'])
+metrics.histogram('ml_stage_duration_seconds', 'Time spent in each hot-path stage', ['stage'])
+metrics.gauge('ml_model_info', 'Churn model version currently serving per model key', ['model', 'version'])
+metrics.gauge('ml_startup_seconds', 'Seconds from module import to each startup phase', ['phase'])
+
+# Shared by every hosted model; workers start on first use in each (forked) process
+inference_pool = InferencePool(INFERENCE_POOL_WORKERS, INFERENCE_POOL_MAX_PENDING, INFERENCE_POOL_TIMEOUT) if INFERENCE_POOL_WORKERS > 0 else None
+
+def churn_scoring_mode():
+    """What churn probabilities are computed with: 'contributions' (explained node-table walk), 'compact' or 'sklearn'"""
+    if CHURN_EXPLANATIONS:
+        return 'contributions'
+    return 'compact' if CHURN_INFERENCE_BACKEND == 'compact' else 'sklearn'
+
+def timed_stage(stage):
+    """Time a hot-path stage into ml_stage_duration_seconds"""
+    return metrics.timer('ml_stage_duration_seconds', stage=stage)
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider on the ML_JSON_BACKEND encoder, timed as the json_serialization stage
+    
+    Keys keep their insertion order (no sorting) and NumPy values are encoded as-is, so
+    responses go out without a conversion pass; jsonify bodies are written as bytes.
+    """
+    sort_keys = False
+    
+    def _indent(self):
+        return (self.compact is None and self._app.debug) or self.compact is False
+    
+    def dumps(self, obj, **kwargs):
+        with timed_stage('json_serialization'):
+            return dumps(obj, ML_JSON_BACKEND, indent=self._indent()).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return loads(s, ML_JSON_BACKEND)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        with timed_stage('json_serialization'):
+            body = dumps(obj, ML_JSON_BACKEND, indent=self._indent())
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
 
-app = Flask(__name__)
-CORS(app)
+class ChurnModelState:
+    """One generation of the churn model: everything scoring reads, swapped as a single reference"""
+    
+    def __init__(self, model, label_encoders, version, metrics=None, forest=None, importances=None):
+        # model is None when a registry load serves from the mapped node tables alone
+        self.model = model
+        self.label_encoders = label_encoders
+        self.version = version
+        self.metrics = metrics or {}
+        # Registry file holding the estimator, for inference workers when there are no node tables
+        self.model_file = None
+        # One export serves both the compact backend and explanations; a registry copy arrives memory-mapped
+        self._use_forest(forest if forest is not None else self._build_compact_forest(model))
+        self._global_importances = importances
+    
+    def _use_forest(self, forest):
+        self.compact_forest = forest if CHURN_INFERENCE_BACKEND == 'compact' else None
+        self.explainer = forest if CHURN_EXPLANATIONS else None
+    
+    def share_forest(self, forest):
+        """Swap the heap node tables for the registry's memory-mapped copy of the same forest"""
+        if forest is not None:
+            self._use_forest(forest)
+    
+    @property
+    def forest(self):
+        return self.explainer if self.explainer is not None else self.compact_forest
+    
+    @property
+    def can_score(self):
+        return self.forest is not None or hasattr(self.model, 'predict_proba')
+    
+    @property
+    def scoring_mode(self):
+        if self.explainer is not None:
+            return 'contributions'
+        return 'compact' if self.compact_forest is not None else 'sklearn'
+    
+    @property
+    def pool_ref(self):
+        """What inference workers load this generation from; None while it only exists in this process"""
+        forest = self.explainer if self.explainer is not None else self.compact_forest
+        if forest is not None:
+            return model_ref('tables', forest.path, self.version) if forest.path else None
+        return model_ref('joblib', self.model_file, self.version) if self.model_file else None
+    
+    @property
+    def model_nbytes(self):
+        """Heap bytes of the sklearn trees' node and value arrays"""
+        total = 0
+        for estimator in getattr(self.model, 'estimators_', []):
+            tree_state = estimator.tree_.__getstate__()
+            total += tree_state['nodes'].nbytes + tree_state['values'].nbytes
+        return total
+    
+    def _build_compact_forest(self, model):
+        """Export the forest to flat node tables when the compact backend or explanations need them"""
+        if CHURN_INFERENCE_BACKEND != 'compact' and not CHURN_EXPLANATIONS:
+            return None
+        from sklearn.ensemble import RandomForestClassifier
+        if not isinstance(model, RandomForestClassifier):
+            if CHURN_INFERENCE_BACKEND == 'compact':
+                print("Warning: Compact inference needs a trained RandomForest. Using sklearn backend.")
+            return None
+        try:
+            return CompactForest.from_sklearn(model)
+        except ValueError as e:
+            print(f"Warning: Could not export churn model to compact tables: {str(e)}. Using sklearn backend.")
+            return None
+    
+    @property
+    def global_importances(self):
+        """Impurity-based importance per churn factor, strongest first; computed once per model generation"""
+        if self._global_importances is None:
+            values = getattr(self.model, 'feature_importances_', None)
+            importances = zip(CHURN_FACTOR_NAMES, np.round(values, 4).tolist()) if values is not None else []
+            self._global_importances = [{'factor': name, 'importance': value} for name, value in sorted(importances, key=lambda item: -item[1])]
+        return self._global_importances
 
 # ML model for subscription management
 class SubscriptionRecommendationEngine:
-    def __init__(self):
-        self.model_loaded = True
+    def __init__(self, force_retrain=None, load_churn_model=True, dataset_path=None, plan_catalog_path=None):
+        # Flipped to True once the churn model is trained or loaded (drives /ready)
+        self.model_loaded = False
         # Mock plan data for recommendations (kept for other functions)
         self.plans = {
             'fibernet-basic': {'type': 'Fibernet', 'category': 'Basic', 'price': 29.99, 'data': 100, 'speed': 50},
@@ -24,232 +285,757 @@ class SubscriptionRecommendationEngine:
             'copper-basic': {'type': 'Broadband Copper', 'category': 'Basic', 'price': 19.99, 'data': 50, 'speed': 25},
             'copper-standard': {'type': 'Broadband Copper', 'category': 'Standard', 'price': 34.99, 'data': 250, 'speed': 50},
         }
+        # Catalog columns are memory-mapped from the dataset cache, shared by every worker and tenant
+        plan_catalog_path = plan_catalog_path or PLAN_CATALOG_PATH
+        self.plan_catalog = PlanCatalog.from_file(plan_catalog_path, DATASET_CACHE_DIR) if plan_catalog_path else PlanCatalog.from_plans(self.plans)
+        
+        # Dataset tables and failure counts stay empty until load_churn_model() runs
+        self.dataset_path = dataset_path or DATASET_PATH
+        self._set_tables({sheet: pd.DataFrame() for sheet in DATASET_SHEETS})
+        self.feature_store = FailureFeatureStore()
+        self.model_registry = ModelRegistry(MODEL_CACHE_DIR)
+        self.churn_state = None
+        # What the serving model was trained on, for incremental retraining (see _save_checkpoint)
+        self.churn_checkpoint = None
+        self.load_seconds = None
+        self._retrain_lock = threading.Lock()
+        # Stamp of the registry pointer this process last published or reloaded (see sync_with_registry)
+        self._registry_stamp = None
+        self._load_lock = threading.Lock()
+        self._loader_pid = None
+        self._recommendation_index = None
+        self.recommendation_index_seconds = None
+        self._index_lock = threading.Lock()
+        self._index_build = None
         
-        # Load the dataset with error handling
-        dataset_path = "C:\\hackathon-app\\SubscriptionUseCase_Dataset.xlsx"
+        if load_churn_model:
+            self.load_churn_model(force_retrain)
+    
+    def load_churn_model(self, force_retrain=None):
+        """Load the dataset and feature store, then load or train the churn model (the slow part of startup)"""
+        started = time.perf_counter()
+        tables = self._load_dataset(self.dataset_path)
+        
+        # Aggregate payment/renewal failures once; training and scoring both read from here
+        feature_store = self._build_feature_store(tables['Billing_Information'], tables['Subscription_Logs'], tables['Subscriptions'])
+        self._set_tables(tables)
+        self.feature_store = feature_store
+        
+        # Load the churn model from the registry, training only when the data or config changed
+        if force_retrain is None:
+            force_retrain = os.environ.get('ML_FORCE_RETRAIN', '').lower() in ('1', 'true', 'yes')
+        self.churn_state = self._load_or_train_churn_model(self.dataset_path, force_retrain)
+        self.load_seconds = round(time.perf_counter() - started, 3)
+        self.model_loaded = True
+        record_startup_phase('churn_model_ready')
+    
+    def load_churn_model_async(self):
+        """Run load_churn_model() in a background thread of this process unless it is loaded or already loading"""
+        if self.model_loaded or self._loader_pid == os.getpid():
+            return
+        with self._load_lock:
+            # A load started before a fork does not continue in the child, so each process checks its own pid
+            if self.model_loaded or self._loader_pid == os.getpid():
+                return
+            self._loader_pid = os.getpid()
+            threading.Thread(target=self._load_in_background, name='churn-model-loader', daemon=True).start()
+    
+    def _load_in_background(self):
+        try:
+            self.load_churn_model()
+            print(f"Churn model {self.model_version} ready after {self.load_seconds}s")
+        except Exception as e:
+            print(f"Warning: Churn model failed to load: {str(e)}")
+    
+    @property
+    def recommendation_index(self):
+        """Index of the current plan catalog; None when disabled or while it builds in the background"""
+        index = self._recommendation_index
+        if index is not None and index.version == self.plan_catalog.version:
+            return index
+        if RECOMMEND_INDEX:
+            self.build_recommendation_index_async()
+        return None
+    
+    def build_recommendation_index(self):
+        """Build (or map from the dataset cache) the recommendation index for the current catalog and serve from it"""
+        started = time.perf_counter()
+        index = RecommendationIndex.for_catalog(self.plan_catalog, DATASET_CACHE_DIR, RECOMMEND_INDEX_K,
+                                                RECOMMEND_INDEX_USAGE_STEP, RECOMMEND_INDEX_BUDGET_STEP)
+        self._recommendation_index = index
+        self.recommendation_index_seconds = round(time.perf_counter() - started, 3)
+        return index
+    
+    def build_recommendation_index_async(self):
+        """Build the index for the current catalog in a background thread, once per catalog version and process"""
+        # A build started before a fork does not continue in the child
+        build = (os.getpid(), self.plan_catalog.version)
+        if self._index_build == build:
+            return
+        with self._index_lock:
+            if self._index_build == build:
+                return
+            self._index_build = build
+            threading.Thread(target=self._build_index_in_background, name='recommendation-index', daemon=True).start()
+    
+    def _build_index_in_background(self):
+        try:
+            index = self.build_recommendation_index()
+            print(f"Recommendation index for catalog {index.version} ready: {len(index)} cells in {self.recommendation_index_seconds}s")
+        except Exception as e:
+            print(f"Warning: Recommendation index build failed: {str(e)}. Scoring exactly.")
+    
+    def _set_tables(self, tables):
+        # Billing and log events live on only as feature-store counts; their (largest) frames are not kept
+        self.user_data = tables['User_Data']
+        self.subscriptions = tables['Subscriptions']
+        self.subscription_plans = tables['Subscription_Plans']
+    
+    def memory_report(self):
+        """Bytes per component; memory-mapped tables are shared by every process that maps them"""
+        state = self.churn_state
+        forest = state.forest if state else None
+        index = self._recommendation_index
+        frames = (self.user_data, self.subscriptions, self.subscription_plans)
+        components = {
+            'dataframes': (int(sum(frame.memory_usage(deep=True).sum() for frame in frames)), False),
+            'feature_store': (self.feature_store.nbytes, False),
+            'churn_model': (state.model_nbytes if state else 0, False),
+            'forest_tables': (forest.nbytes if forest is not None else 0, forest is not None and forest.is_mapped),
+            'plan_catalog': (self.plan_catalog.nbytes, self.plan_catalog.is_mapped),
+            'recommendation_index': (index.nbytes if index else 0, index is not None and index.is_mapped)
+        }
+        return {
+            'heap_bytes': sum(size for size, mapped in components.values() if not mapped),
+            'mapped_bytes': sum(size for size, mapped in components.values() if mapped),
+            'components': {name: {'bytes': size, 'mapped': mapped} for name, (size, mapped) in components.items()}
+        }
+    
+    # Read-only views of the current churn model generation
+    @property
+    def churn_model(self):
+        return self.churn_state.model
+    
+    @property
+    def label_encoders(self):
+        return self.churn_state.label_encoders
+    
+    @property
+    def compact_forest(self):
+        return self.churn_state.compact_forest
+    
+    @property
+    def model_version(self):
+        return self.churn_state.version if self.churn_state else 'loading'
+    
+    def _load_dataset(self, dataset_path):
+        """Load the five dataset tables, falling back to empty frames when unavailable"""
         try:
-            self.user_data = pd.read_excel(dataset_path, sheet_name="User_Data")
-            self.subscriptions = pd.read_excel(dataset_path, sheet_name="Subscriptions")
-            self.subscription_plans = pd.read_excel(dataset_path, sheet_name="Subscription_Plans")
-            self.subscription_logs = pd.read_excel(dataset_path, sheet_name="Subscription_Logs")
-            self.billing_info = pd.read_excel(dataset_path, sheet_name="Billing_Information")
+            return DatasetLoader(dataset_path, DATASET_CACHE_DIR, columns=CHURN_TRAINING_COLUMNS).load()
         except FileNotFoundError:
             print(f"Warning: Dataset file not found at {dataset_path}. Using mock data for demo.")
-            # Use mock data if file doesn't exist
-            self.user_data = pd.DataFrame()
-            self.subscriptions = pd.DataFrame()
-            self.subscription_plans = pd.DataFrame()
-            self.subscription_logs = pd.DataFrame()
-            self.billing_info = pd.DataFrame()
         except Exception as e:
             print(f"Warning: Error loading dataset: {str(e)}. Using mock data for demo.")
-            self.user_data = pd.DataFrame()
-            self.subscriptions = pd.DataFrame()
-            self.subscription_plans = pd.DataFrame()
-            self.subscription_logs = pd.DataFrame()
-            self.billing_info = pd.DataFrame()
+        # Use mock data if the dataset can't be read
+        return {sheet: pd.DataFrame() for sheet in DATASET_SHEETS}
+    
+    def _build_feature_store(self, billing_info, subscription_logs, subscriptions):
+        feature_store = FailureFeatureStore()
+        # Dataset subscriptions without failures scored 0 in training, so serving must find them too
+        if 'Subscription Id' in subscriptions:
+            feature_store.register(subscriptions['Subscription Id'])
+        feature_store.append_billing(billing_info)
+        feature_store.append_logs(subscription_logs)
+        return feature_store
+    
+    def _load_or_train_churn_model(self, dataset_path, force_retrain=False):
+        """Reuse a persisted churn model when its dataset hash and training config match"""
+        key = self.model_registry.artifact_key(dataset_path, CHURN_TRAINING_CONFIG)
+        version = key[:16] if key else 'untrained'
         
-        # Preprocess and train the churn model
-        self.churn_model, self.label_encoders = self._train_churn_model()
-
-    def _train_churn_model(self):
-        # Check if we have data to train with
-        if self.subscriptions.empty or self.subscription_plans.empty or self.user_data.empty:
-            print("Warning: No data available for training. Using mock model.")
-            # Return a mock model and encoders
-            from sklearn.dummy import DummyClassifier
-            mock_model = DummyClassifier(strategy='constant', constant=0)
-            # Create mock training data
-            X_mock = pd.DataFrame({'feature': [1, 2, 3]})
-            y_mock = pd.Series([0, 0, 1])
-            mock_model.fit(X_mock, y_mock)
-            return mock_model, {}
+        if key and not force_retrain:
+            # Scoring from node tables never reads the sklearn trees, so their heap copy is skipped
+            tables_only = CHURN_INFERENCE_BACKEND == 'compact' or CHURN_EXPLANATIONS
+            artifact = self.model_registry.load(key, CHURN_FEATURES, load_model=not tables_only)
+            if artifact:
+                state = self._state_from_artifact(key, artifact)
+                print(f"Loaded churn model {state.version} from {self.model_registry.artifact_path(key)}")
+                return state
+        
+        model, label_encoders, metrics = self._train_churn_model()
+        state = ChurnModelState(model, label_encoders, version, metrics)
+        if self._persist_churn_model(key, state):
+            self._save_checkpoint(key, state)
+            self._publish_churn_model(key, state)
+        return state
+    
+    def _state_from_artifact(self, key, artifact):
+        """Serving state for a registry artifact, with the training checkpoint it was saved with"""
+        metadata = artifact['metadata']
+        version = metadata.get('model_version') or key[:16]
+        state = ChurnModelState(artifact['model'], artifact['label_encoders'], version, metadata.get('metrics'),
+                                artifact['forest'], metadata.get('feature_importances'))
+        state.model_file = self.model_registry.estimator_path(key)
+        # Every retrain of a dataset shares its key, so only the checkpoint saved with this very version fits it
+        checkpoint = self.model_registry.load_checkpoint(self._checkpoint_path())
+        if checkpoint and checkpoint.get('model_key') == key and checkpoint.get('model_version') == version:
+            self.churn_checkpoint = checkpoint
+        # Versions this process retrains into next continue after the loaded one
+        _, _, count = version.rpartition('-r')
+        if count.isdigit():
+            self._retrain_count = max(getattr(self, '_retrain_count', 0), int(count))
+        return state
+    
+    def sync_with_registry(self):
+        """Swap in the model another worker published for this dataset; returns whether the serving model changed
         
+        Retrained models are saved to the registry and published by the worker that trained
+        them; every other worker calls this periodically (BackgroundRetrainer's watcher) and
+        maps the new generation instead of training its own.
+        """
+        path = self._current_path()
+        stamp = self.model_registry.stamp(path)
+        if not self.model_loaded or stamp is None or stamp == self._registry_stamp:
+            return False
+        # A retrain running here publishes on its own; look again on the next tick
+        if not self._retrain_lock.acquire(blocking=False):
+            return False
         try:
-            # Merge relevant data
-            df = self.subscriptions.merge(self.subscription_plans, left_on='Product Id', right_on='Product Id', how='left')
-            df = df.merge(self.user_data, left_on='User Id', right_on='User Id', how='left')
+            current = self.model_registry.read_current(path)
+            self._registry_stamp = stamp
+            if not current or current['model_version'] == self.model_version:
+                return False
+            key = current['key']
+            tables_only = CHURN_INFERENCE_BACKEND == 'compact' or CHURN_EXPLANATIONS
+            artifact = self.model_registry.load(key, CHURN_FEATURES, load_model=not tables_only)
+            if not artifact or artifact['metadata'].get('model_version') != current['model_version']:
+                return False
+            if key[:16] != self.model_version.split('-')[0]:
+                # Trained on a changed dataset: serve it with the tables and failure counts it was trained on
+                tables = self._load_dataset(self.dataset_path)
+                self.feature_store = self._build_feature_store(tables['Billing_Information'], tables['Subscription_Logs'], tables['Subscriptions'])
+                self._set_tables(tables)
+            self.churn_checkpoint = None
+            self.churn_state = self._state_from_artifact(key, artifact)
+            print(f"Reloaded churn model {self.churn_state.version} published by another worker")
+            return True
+        finally:
+            self._retrain_lock.release()
+    
+    def _persist_churn_model(self, key, state):
+        """Save the model to the registry; returns whether it was saved"""
+        # Fallback models (no encoders) are never persisted
+        if not key or not state.label_encoders:
+            return False
+        try:
+            tables = self.model_registry.save_forest(key, state.forest) if state.forest is not None else None
+            metadata = {'dataset_path': self.dataset_path, 'config': CHURN_TRAINING_CONFIG, 'metrics': state.metrics,
+                        'forest_tables': tables, 'feature_importances': state.global_importances, 'model_version': state.version}
+            path = self.model_registry.save(key, state.model, state.label_encoders, CHURN_FEATURES, metadata)
+            if tables:
+                # Serve from the mapped files so this process shares pages with workers that load them
+                state.share_forest(self.model_registry.load_forest(tables))
+            state.model_file = self.model_registry.estimator_path(key)
+            print(f"Saved churn model {key[:16]} to {path}")
+            return True
+        except Exception as e:
+            print(f"Warning: Could not persist churn model: {str(e)}")
+            return False
+    
+    def _publish_churn_model(self, key, state):
+        """Point other workers at a saved model; called after its checkpoint is written, which they load with it"""
+        try:
+            self._registry_stamp = self.model_registry.publish(self._current_path(), key, state.version)
+        except Exception as e:
+            print(f"Warning: Could not publish churn model: {str(e)}")
+    
+    def _checkpoint_path(self):
+        return self.model_registry.checkpoint_path(self.dataset_path, CHURN_TRAINING_CONFIG)
+    
+    def _current_path(self):
+        return self.model_registry.current_path(self.dataset_path, CHURN_TRAINING_CONFIG)
+    
+    def _save_checkpoint(self, key, state, tables=None, feature_store=None, fingerprints=None, previous=None):
+        """Checkpoint the rows state was trained on; previous is the checkpoint an incremental update built on
         
-            # Engineer features
-            current_date = date(2025, 9, 13)  # Use the provided current date
-            
-            # Subscription duration in days
-            df['Start Date'] = pd.to_datetime(df['Start Date'])
-            df['subscription_duration_days'] = (current_date - df['Start Date'].dt.date).dt.days
-            
-            # Last renewed duration
-            df['Last Renewed Date'] = pd.to_datetime(df['Last Renewed Date'])
-            df['days_since_last_renewed'] = (current_date - df['Last Renewed Date'].dt.date).dt.days
-            
-            # Count payment failures per subscription
-            payment_failures = self.billing_info[self.billing_info['payment_status'] == 'failed'].groupby('subscription_id').size().reset_index(name='payment_failures')
-            df = df.merge(payment_failures, left_on='Subscription Id', right_on='subscription_id', how='left')
-            df['payment_failures'] = df['payment_failures'].fillna(0)
-            
-            # Count renew failures from logs
-            renew_failures = self.subscription_logs[self.subscription_logs['action'] == 'renew_failed'].groupby('Subscription id').size().reset_index(name='renew_failures')
-            df = df.merge(renew_failures, left_on='Subscription Id', right_on='Subscription id', how='left')
-            df['renew_failures'] = df['renew_failures'].fillna(0)
-            
-            # Label encode categorical features
-            label_encoders = {}
-            categorical_cols = ['Subscription Type', 'Auto Renewal Allowed', 'Status_x']  # Status_x is user status
-            for col in categorical_cols:
-                le = LabelEncoder()
-                df[col] = le.fit_transform(df[col].astype(str))
-                label_encoders[col] = le
-            
-            # Features and target
-            features = ['Price', 'subscription_duration_days', 'days_since_last_renewed', 'payment_failures', 'renew_failures'] + categorical_cols
-            df['churn'] = (df['Status'] == 'PAUSED').astype(int)  # Target: 1 if PAUSED, else 0
-            
-            X = df[features]
-            y = df['churn']
-            
-            # Handle missing values (simple imputation)
-            X = X.fillna(0)
-            
-            # Train-test split
-            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-            
-            # Train RandomForestClassifier
-            model = RandomForestClassifier(n_estimators=100, random_state=42)
-            model.fit(X_train, y_train)
+        The AUC and training time of the last full refit carry over through incremental updates:
+        they are the drift baseline and what time saved is measured against.
+        """
+        try:
+            if fingerprints is None:
+                fingerprints = self._training_pipeline().fingerprints(self._training_tables(tables), feature_store or self.feature_store)
+            checkpoint = {
+                'model_version': state.version,
+                'model_key': key,
+                'fingerprints': fingerprints,
+                'trees': len(state.model.estimators_),
+                'auc': previous['auc'] if previous else state.metrics.get('auc'),
+                'full_training_seconds': previous['full_training_seconds'] if previous else state.metrics.get('training_seconds'),
+                'updates': previous['updates'] + 1 if previous else 0,
+                'saved_at': datetime.now().isoformat()
+            }
+            self.model_registry.save_checkpoint(self._checkpoint_path(), checkpoint)
+            self.churn_checkpoint = checkpoint
+        except Exception as e:
+            print(f"Warning: Could not checkpoint churn model: {str(e)}")
+    
+    def checkpoint_summary(self):
+        """The current training checkpoint without its per-subscription fingerprints, or None"""
+        checkpoint = self.churn_checkpoint
+        if checkpoint is None:
+            return None
+        summary = {name: value for name, value in checkpoint.items() if name not in ('fingerprints', 'model_key')}
+        summary['subscriptions'] = len(checkpoint['fingerprints'][0])
+        return summary
+    
+    def retrain(self, min_auc=None, reload_data=True, incremental=None):
+        """Train a new churn model while the current one keeps serving; swap it in if its holdout AUC passes
+        
+        The dataset is re-read only when its fingerprint changed, so feature-store events appended
+        since startup are kept otherwise. With incremental (default RETRAIN_INCREMENTAL) only the
+        subscriptions that changed since the last checkpoint are fitted, as extra trees; a missing
+        checkpoint, a full forest or drift fall back to a full refit. Returns a record of the attempt.
+        """
+        min_auc = RETRAIN_MIN_AUC if min_auc is None else min_auc
+        incremental = RETRAIN_INCREMENTAL if incremental is None else incremental
+        if not self.model_loaded:
+            return {'status': 'skipped', 'reason': 'Churn model is still loading'}
+        if not self._retrain_lock.acquire(blocking=False):
+            return {'status': 'skipped', 'reason': 'Retraining already in progress'}
+        try:
+            started = time.perf_counter()
+            key = self.model_registry.artifact_key(self.dataset_path, CHURN_TRAINING_CONFIG)
+            tables, feature_store = None, self.feature_store
+            if reload_data and key and key[:16] != self.model_version.split('-')[0]:
+                tables = self._load_dataset(self.dataset_path)
+                feature_store = self._build_feature_store(tables['Billing_Information'], tables['Subscription_Logs'], tables['Subscriptions'])
             
-            # Optional: Evaluate
-            predictions = model.predict_proba(X_test)[:, 1]
-            auc = roc_auc_score(y_test, predictions)
-            print(f"Churn Model AUC: {auc}")
+            record = {'mode': 'full', 'min_auc': min_auc, 'data_reloaded': tables is not None}
+            update, fingerprints = None, None
+            if incremental:
+                update, record['incremental'] = self._train_incrementally(tables, feature_store)
+                if record['incremental']['status'] == 'unchanged':
+                    record.update(status='unchanged', model_version=self.model_version, finished_at=datetime.now().isoformat(),
+                                  training_seconds=round(time.perf_counter() - started, 3))
+                    return record
+            if update is not None:
+                model, label_encoders, metrics, fingerprints = update
+                record['mode'] = 'incremental'
+            else:
+                model, label_encoders, metrics = self._train_churn_model(tables, feature_store)
+            record.update(training_seconds=round(time.perf_counter() - started, 3), auc=metrics.get('auc'),
+                          finished_at=datetime.now().isoformat())
+            full_seconds = self.churn_checkpoint['full_training_seconds'] if update is not None else None
+            if full_seconds:
+                # Pipeline time against the last full refit's, both without dataset reloads
+                record.update(full_training_seconds=full_seconds, time_saved_seconds=round(full_seconds - metrics['training_seconds'], 3),
+                              speedup=round(full_seconds / max(metrics['training_seconds'], 0.001), 1))
+            if not label_encoders or metrics.get('auc') is None or metrics['auc'] < min_auc:
+                record.update(status='rejected', model_version=self.model_version)
+                print(f"Retrained churn model rejected (AUC {metrics.get('auc')}, threshold {min_auc})")
+                return record
             
-            return model, label_encoders
+            self._retrain_count = getattr(self, '_retrain_count', 0) + 1
+            new_state = ChurnModelState(model, label_encoders, f"{(key or 'untrained')[:16]}-r{self._retrain_count}", metrics)
+            if tables is not None:
+                self._set_tables(tables)
+                self.feature_store = feature_store
+            # Single reference assignment: in-flight requests keep the generation they started with
+            previous = self.churn_checkpoint if update is not None else None
+            self.churn_state = new_state
+            if self._persist_churn_model(key, new_state):
+                self._save_checkpoint(key, new_state, tables, feature_store, fingerprints, previous)
+                self._publish_churn_model(key, new_state)
+            else:
+                self.churn_checkpoint = None
+            record.update(status='swapped', model_version=new_state.version, swapped_at=datetime.now().isoformat())
+            print(f"Swapped in churn model {new_state.version} ({record['mode']}, AUC {metrics['auc']:.4f})")
+            return record
+        finally:
+            self._retrain_lock.release()
+
+    def _predict_churn_proba(self, X, state, timeout=None):
+        """Churn probability per row of a feature matrix in CHURN_FEATURES order, with (baseline, contributions) or None
+        
+        With explanations on, one walk of the node tables yields the probability (identical to
+        predict_proba) and every feature's path contribution, so explaining costs no second pass.
+        Large matrices go to the inference pool when one is configured and the model is on disk.
+        """
+        with timed_stage('predict_proba'):
+            ref = state.pool_ref if inference_pool is not None and len(X) >= INFERENCE_POOL_MIN_ROWS else None
+            if ref is not None:
+                return inference_pool.run(score_churn, ref, X, state.scoring_mode, CHURN_FEATURES, timeout=timeout, preload=[ref])
+            if state.explainer is not None:
+                probabilities, baseline, contributions = state.explainer.predict_contributions(X)
+                return probabilities, (baseline, contributions)
+            if state.compact_forest is not None:
+                return state.compact_forest.predict_proba_positive(X), None
+            return state.model.predict_proba(pd.DataFrame(X, columns=CHURN_FEATURES))[:, 1], None
+    
+    def _training_tables(self, tables=None):
+        """The given tables, else the engine's loaded ones (billing and logs live on in the feature store)"""
+        if tables is None:
+            tables = {'User_Data': self.user_data, 'Subscriptions': self.subscriptions, 'Subscription_Plans': self.subscription_plans}
+        return tables
+    
+    def _training_pipeline(self):
+        from training_pipeline import ChurnTrainingPipeline
+        return ChurnTrainingPipeline(
+            n_estimators=CHURN_TRAINING_CONFIG['n_estimators'],
+            random_state=CHURN_TRAINING_CONFIG['random_state'],
+            test_size=CHURN_TRAINING_CONFIG['test_size'],
+            n_jobs=TRAINING_N_JOBS,
+            chunk_rows=TRAINING_CHUNK_ROWS,
+            sample_fraction=CHURN_TRAINING_CONFIG['sample_fraction'],
+            partition=parse_partition(CHURN_TRAINING_CONFIG['partition']),
+            trace_memory=TRAINING_TRACE_MEMORY
+        )
+    
+    def _train_incrementally(self, tables=None, feature_store=None):
+        """Grow the serving forest on what changed since the checkpoint; returns (update or None, info)
+        
+        update is (model, label_encoders, metrics, fingerprints). None means a full refit is due
+        (info['reason'] says why) or, with info['status'] == 'unchanged', that there is nothing to fit.
+        """
+        state, checkpoint = self.churn_state, self.churn_checkpoint
+        if checkpoint is None or checkpoint['model_version'] != state.version:
+            return None, {'status': 'full_refit', 'reason': 'No checkpoint for the serving model'}
+        if checkpoint['trees'] + INCREMENTAL_TREES > INCREMENTAL_MAX_TREES:
+            return None, {'status': 'full_refit', 'reason': f"Forest has reached {checkpoint['trees']} of {INCREMENTAL_MAX_TREES} trees"}
+        # A registry load serving from node tables left the estimator on disk
+        model = state.model
+        if model is None:
+            artifact = self.model_registry.load(checkpoint['model_key'], CHURN_FEATURES)
+            model = artifact['model'] if artifact else None
+        if not hasattr(model, 'estimators_'):
+            return None, {'status': 'full_refit', 'reason': 'Serving model cannot be grown'}
+        
+        model, metrics, fingerprints = self._training_pipeline().update(
+            model, state.label_encoders, self._training_tables(tables), checkpoint['fingerprints'], feature_store or self.feature_store,
+            n_trees=INCREMENTAL_TREES, baseline_auc=checkpoint['auc'], max_auc_drop=INCREMENTAL_MAX_AUC_DROP)
+        info = {name: metrics[name] for name in ('changed_rows', 'trees_added', 'n_estimators', 'drift_auc', 'baseline_auc', 'training_seconds')}
+        if metrics['changed_rows'] == 0:
+            return None, dict(info, status='unchanged')
+        if model is None:
+            print(f"Incremental churn update skipped: {metrics['skipped']}. Refitting.")
+            return None, dict(info, status='full_refit', reason=metrics['skipped'])
+        return (model, state.label_encoders, metrics, fingerprints), dict(info, status='updated')
+    
+    def _train_churn_model(self, tables=None, feature_store=None):
+        """Fit the churn forest; returns (model, label_encoders, metrics)
+        
+        Uses the engine's loaded tables and feature store unless others are given (background retraining).
+        """
+        tables = self._training_tables(tables)
+        feature_store = feature_store or self.feature_store
+        
+        # Check if we have data to train with
+        if any(tables[sheet].empty for sheet in ('Subscriptions', 'Subscription_Plans', 'User_Data')):
+            print("Warning: No data available for training. Using mock model.")
+            return self._mock_churn_model()
+        
+        try:
+            model, label_encoders, metrics = self._training_pipeline().run(tables, feature_store)
+            print(f"Churn Model AUC: {metrics['auc']}")
+            print("Training stages: " + ', '.join(f"{stage['stage']} {stage['seconds']}s" for stage in metrics['stages']))
+            return model, label_encoders, metrics
         
         except Exception as e:
             print(f"Warning: Error training churn model: {str(e)}. Using fallback model.")
             # Return a mock model as fallback
-            from sklearn.dummy import DummyClassifier
-            mock_model = DummyClassifier(strategy='constant', constant=0)
-            X_mock = pd.DataFrame({'feature': [1, 2, 3]})
-            y_mock = pd.Series([0, 0, 1])
-            mock_model.fit(X_mock, y_mock)
-            return mock_model, {}
-    
-    def recommend_plans(self, user_data):
+            return self._mock_churn_model()
+    
+    def _mock_churn_model(self):
+        """Constant DummyClassifier used when there is no data to train on"""
+        from sklearn.dummy import DummyClassifier
+        mock_model = DummyClassifier(strategy='constant', constant=0)
+        # Create mock training data
+        X_mock = pd.DataFrame({'feature': [1, 2, 3]})
+        y_mock = pd.Series([0, 0, 1])
+        mock_model.fit(X_mock, y_mock)
+        return mock_model, {}, {}
+    
+    def recommend_plans(self, user_data, k=5):
         """Recommend subscription plans based on user usage and preferences"""
         current_usage = user_data.get('monthly_usage_gb', 100)
         budget_max = user_data.get('budget_max', 50)
         current_plan = user_data.get('current_plan', None)
         service_type_pref = user_data.get('service_type_preference', None)
         
-        recommendations = []
+        # Answer from the precomputed index, else score the whole catalog at once; responses are built only for the top k
+        catalog = self.plan_catalog
+        with timed_stage('recommendation_scoring'):
+            top = self._indexed_top_k(current_usage, budget_max, service_type_pref, k)
+            if top is None:
+                scores = catalog.suitability_scores(current_usage, budget_max, service_type_pref)
+                indices = catalog.top_k(scores, k)
+                top = indices, scores[indices]
         
-        # Calculate usage-based recommendations
-        for plan_id, plan in self.plans.items():
-            if plan['price'] <= budget_max:
-                # Calculate suitability score
-                usage_fit = self._calculate_usage_fit(current_usage, plan['data'])
-                price_value = self._calculate_price_value(plan['price'], budget_max)
-                type_match = 1.0 if not service_type_pref or plan['type'] == service_type_pref else 0.7
-                
-                overall_score = (usage_fit * 0.4 + price_value * 0.3 + type_match * 0.3)
-                
-                recommendations.append({
-                    'plan_id': plan_id,
-                    'plan_name': f"{plan['type']} {plan['category']}",
-                    'price': plan['price'],
-                    'data_quota': plan['data'],
-                    'speed': plan['speed'],
-                    'suitability_score': round(overall_score, 2),
-                    'reasons': self._get_recommendation_reasons(current_usage, plan, current_plan),
-                    'savings_potential': self._calculate_savings(current_plan, plan) if current_plan else 0
-                })
-        
-        # Sort by suitability score
-        recommendations.sort(key=lambda x: x['suitability_score'], reverse=True)
-        
-        return recommendations[:5]  # Top 5 recommendations
+        return [self._format_recommendation(i, score, current_usage, current_plan) for i, score in zip(*top)]
+    
+    def _indexed_top_k(self, usage, budget_max, service_type, k):
+        """(plan indices, scores) from the recommendation index, or None when the query needs exact scoring"""
+        index = self.recommendation_index
+        if index is None or not index.supports(k):
+            return None
+        try:
+            cell = index.cell(float(usage), float(budget_max), self.plan_catalog.preference_code(service_type))
+        except (TypeError, ValueError):
+            return None
+        return index.top_k(cell, k) if cell >= 0 else None
+    
+    def recommend_plans_batch(self, users, k=5, max_price=None, chunk_size=BATCH_CHUNK_SIZE // 4):
+        """Yield (user, top-k recommendations or None if invalid), scoring a users x plans matrix per chunk"""
+        catalog = self.plan_catalog
+        users = iter(users)
+        while True:
+            chunk = list(itertools.islice(users, chunk_size))
+            if not chunk:
+                return
+            # Users that are not JSON objects get a NaN usage, and with it the invalid-row answer
+            rows = [u if isinstance(u, dict) else {'monthly_usage_gb': None} for u in chunk]
+            usages = pd.to_numeric(pd.Series([u.get('monthly_usage_gb', 100) for u in rows], dtype=object), errors='coerce').to_numpy(dtype=float)
+            budgets = pd.to_numeric(pd.Series([u.get('budget_max', 50) for u in rows], dtype=object), errors='coerce').to_numpy(dtype=float)
+            preferences = catalog.preference_codes([u.get('service_type_preference') for u in rows])
+            with timed_stage('recommendation_scoring'):
+                # Indexed rows are looked up; only the rest (and any max_price filter) score the catalog
+                index = self.recommendation_index if max_price is None else None
+                cells = index.cells(usages, budgets, preferences) if index is not None and index.supports(k) else np.full(len(chunk), -1)
+                exact_rows = np.flatnonzero(cells < 0)
+                scores = catalog.score_matrix(usages[exact_rows], budgets[exact_rows], preferences[exact_rows])
+                if max_price is not None:
+                    scores[:, catalog.prices > max_price] = -np.inf
+                indices, found = catalog.top_k_matrix(scores, k)
+            exact_position = dict(zip(exact_rows.tolist(), range(len(exact_rows))))
+            
+            for row, user in enumerate(chunk):
+                if np.isnan(usages[row]) or np.isnan(budgets[row]):
+                    yield user, None
+                    continue
+                if cells[row] >= 0:
+                    top = index.top_k(cells[row], k)
+                else:
+                    position = exact_position[row]
+                    top_indices = indices[position][found[position]]
+                    top = top_indices, scores[position, top_indices]
+                yield user, [self._format_recommendation(i, score, user.get('monthly_usage_gb', 100), user.get('current_plan'))
+                             for i, score in zip(*top)]
+    
+    def _format_recommendation(self, index, score, current_usage, current_plan):
+        """Build the response dict for one catalog plan"""
+        catalog = self.plan_catalog
+        plan = catalog.plan(index)
+        return {
+            'plan_id': catalog.plan_ids[index],
+            'plan_name': f"{plan['type']} {plan['category']}",
+            'price': plan['price'],
+            'data_quota': plan['data'],
+            'speed': plan['speed'],
+            'suitability_score': float(score),
+            'reasons': self._get_recommendation_reasons(current_usage, plan, current_plan),
+            'savings_potential': self._calculate_savings(current_plan, plan) if current_plan else 0
+        }
     
     def predict_churn(self, subscription_data):
         """Predict if a user is likely to cancel their subscription using the trained ML model"""
         try:
-            # Extract or compute features similar to training
-            subscription_id = subscription_data.get('subscription_id')
-            price = subscription_data.get('price', 50)
-            months_subscribed = subscription_data.get('months_subscribed', 1)
-        
-            # For demo, compute features (in real use, fetch from dataset or input)
-            current_date = date(2025, 9, 13)
-            start_date = datetime.strptime(subscription_data.get('start_date', '2024-01-01'), '%Y-%m-%d').date()
-            last_renewed_date = datetime.strptime(subscription_data.get('last_renewed_date', '2024-01-01'), '%Y-%m-%d').date()
+            # Score against one model generation even if a retrain swaps it mid-request
+            state = self.churn_state
             
-            subscription_duration_days = (current_date - start_date).days
-            days_since_last_renewed = (current_date - last_renewed_date).days
+            with timed_stage('feature_construction'):
+                # Extract or compute features similar to training
+                subscription_id = subscription_data.get('subscription_id')
+                price = subscription_data.get('price', 50)
+                months_subscribed = subscription_data.get('months_subscribed', 1)
+        
+                # For demo, compute features (in real use, fetch from dataset or input)
+                current_date = CHURN_REFERENCE_DATE
+                start_date = datetime.strptime(subscription_data.get('start_date', '2024-01-01'), '%Y-%m-%d').date()
+                last_renewed_date = datetime.strptime(subscription_data.get('last_renewed_date', '2024-01-01'), '%Y-%m-%d').date()
             
-            # Payment failures (mock or fetch)
-            payment_failures = subscription_data.get('payment_failures', 0)
-            renew_failures = subscription_data.get('renew_failures', 0)
+                subscription_duration_days = (current_date - start_date).days
+                days_since_last_renewed = (current_date - last_renewed_date).days
             
-            # Categorical (assume inputs or defaults)
-            subscription_type = subscription_data.get('subscription_type', 'monthly')
-            auto_renewal_allowed = subscription_data.get('auto_renewal_allowed', 'Yes')
-            user_status = subscription_data.get('user_status', 'active')
-        
-            # Encode categoricals
-            encoded = []
-            for col, val in zip(['Subscription Type', 'Auto Renewal Allowed', 'Status_x'], [subscription_type, auto_renewal_allowed, user_status]):
-                le = self.label_encoders.get(col)
-                if le:
-                    try:
-                        encoded.append(le.transform([str(val)])[0])
-                    except ValueError:
-                        encoded.append(0)  # Default if value not seen during training
+                # Payment failures from the feature store, falling back to the client's counts
+                stored = self.feature_store.get(subscription_id) if subscription_id is not None else None
+                if stored:
+                    payment_failures = stored['payment_failures']
+                    renew_failures = stored['renew_failures']
                 else:
-                    encoded.append(0)  # Default if encoder not found
+                    payment_failures = subscription_data.get('payment_failures', 0)
+                    renew_failures = subscription_data.get('renew_failures', 0)
+            
+                # Categorical (assume inputs or defaults)
+                subscription_type = subscription_data.get('subscription_type', 'monthly')
+                auto_renewal_allowed = subscription_data.get('auto_renewal_allowed', 'Yes')
+                user_status = subscription_data.get('user_status', 'active')
+            
+            with timed_stage('label_encoding'):
+                # Encode categoricals
+                encoded = []
+                for col, val in zip(CHURN_CATEGORICAL_COLS, [subscription_type, auto_renewal_allowed, user_status]):
+                    le = state.label_encoders.get(col)
+                    if le:
+                        try:
+                            encoded.append(le.transform([str(val)])[0])
+                        except ValueError:
+                            encoded.append(0)  # Default if value not seen during training
+                    else:
+                        encoded.append(0)  # Default if encoder not found
+            
+            # Same validity rule as the batch path: missing or non-numeric inputs get the fallback, not a score
+            if not np.isfinite(np.array([price, payment_failures, renew_failures], dtype=float)).all():
+                return self._fallback_churn_result()
             
             # If we have a trained model, use it
-            if hasattr(self.churn_model, 'predict_proba') and len(encoded) > 0:
+            if state.can_score and len(encoded) > 0:
                 # Prepare input
                 input_features = [price, subscription_duration_days, days_since_last_renewed, payment_failures, renew_failures] + encoded
-                input_df = pd.DataFrame([input_features], columns=['Price', 'subscription_duration_days', 'days_since_last_renewed', 'payment_failures', 'renew_failures', 'Subscription Type', 'Auto Renewal Allowed', 'Status_x'])
                 
                 # Predict
-                churn_probability = self.churn_model.predict_proba(input_df)[0][1]
+                probabilities, explanation = self._predict_churn_proba(np.array([input_features], dtype=float), state)
+                churn_probability = probabilities[0]
+                if explanation:
+                    explanation = (explanation[0], np.round(explanation[1][0], 4).tolist())
             else:
                 # Use rule-based fallback if model not available
                 churn_probability = self._rule_based_churn_prediction(price, months_subscribed, payment_failures, renew_failures)
+                explanation = None
             
-            risk_level = 'high' if churn_probability > 0.7 else 'medium' if churn_probability > 0.4 else 'low'
-            
-            # Mock factors for now (can use feature importance later)
-            churn_factors = {
-                'low_usage': random.uniform(0, 1),
-                'high_price': 1.0 if price > 70 else 0.0,
-                'new_customer': 1.0 if months_subscribed < 3 else 0.0,
-                'support_issues': random.uniform(0, 1),
-                'payment_issues': min(payment_failures * 0.3, 1.0)
-            }
-            
-            return {
-                'churn_probability': round(churn_probability, 2),
-                'risk_level': risk_level,
-                'factors': churn_factors,
-                'retention_strategies': self._get_retention_strategies(churn_factors, subscription_data)
-            }
+            return self._churn_result(churn_probability, explanation, price, months_subscribed, payment_failures, renew_failures, subscription_data)
         
         except Exception as e:
             print(f"Warning: Error in churn prediction: {str(e)}. Using fallback.")
             # Return fallback prediction
-            return {
-                'churn_probability': 0.3,
-                'risk_level': 'medium',
-                'factors': {
-                    'low_usage': 0.3,
-                    'high_price': 0.2,
-                    'new_customer': 0.1,
-                    'support_issues': 0.2,
-                    'payment_issues': 0.2
-                },
-                'retention_strategies': ['Provide personalized support', 'Offer loyalty rewards']
-            }
+            return self._fallback_churn_result()
+    
+    def predict_churn_batch(self, subscriptions, chunk_size=BATCH_CHUNK_SIZE, timeout=None):
+        """Predict churn for many subscriptions, one predict_proba call per chunk
+        
+        timeout bounds the whole batch's time in the inference pool (default: the pool's per call).
+        """
+        deadline = time.perf_counter() + timeout if timeout is not None else None
+        results = []
+        for start in range(0, len(subscriptions), chunk_size):
+            remaining = max(deadline - time.perf_counter(), 0) if deadline is not None else None
+            results.extend(self._predict_churn_chunk(subscriptions[start:start + chunk_size], remaining))
+        return results
+    
+    def _predict_churn_chunk(self, records, timeout=None):
+        """Score a chunk of subscription records with a single model call"""
+        if not records:
+            return []
+        try:
+            state = self.churn_state
+            with timed_stage('feature_construction'):
+                X, valid = self._build_churn_features(records, state)
+            probabilities = np.zeros(len(records))
+            explanations = [None] * len(records)
+            if valid.any():
+                if state.can_score:
+                    probabilities[valid], explanation = self._predict_churn_proba(X[valid], state, timeout)
+                    if explanation:
+                        # Round and convert the whole contribution matrix once, then hand out rows
+                        baseline, contributions = explanation
+                        for i, row in zip(np.flatnonzero(valid), np.round(contributions, 4).tolist()):
+                            explanations[i] = (baseline, row)
+                else:
+                    for i in np.flatnonzero(valid):
+                        probabilities[i] = self._rule_based_churn_prediction(X[i, 0], records[i].get('months_subscribed', 1), X[i, 3], X[i, 4])
+        except InferencePoolError:
+            # Overload is the caller's to answer (429/503), not a reason to serve fallback scores
+            raise
+        except (ValueError, TypeError, KeyError) as e:
+            print(f"Warning: Error in batch churn prediction: {str(e)}. Using fallback.")
+            return [self._fallback_churn_result() for _ in records]
+        
+        results = []
+        for i, record in enumerate(records):
+            if not valid[i]:
+                results.append(self._fallback_churn_result())
+                continue
+            try:
+                results.append(self._churn_result(probabilities[i], explanations[i], record.get('price', 50), record.get('months_subscribed', 1), X[i, 3], X[i, 4], record))
+            except Exception as e:
+                print(f"Warning: Error in churn prediction: {str(e)}. Using fallback.")
+                results.append(self._fallback_churn_result())
+        return results
+    
+    def _build_churn_features(self, records, state):
+        """Build the churn feature matrix column-wise; returns (X, valid_row_mask)"""
+        # Rows that are not JSON objects read as empty and are marked invalid below
+        is_record = np.array([isinstance(record, dict) for record in records], dtype=bool)
+        rows = [record if ok else {} for record, ok in zip(records, is_record)]
+        
+        def column(key, default):
+            return [row.get(key, default) for row in rows]
+        
+        numeric = [pd.to_numeric(pd.Series(column(key, default), dtype=object), errors='coerce').to_numpy(dtype=float)
+                   for key, default in [('price', 50), ('payment_failures', 0), ('renew_failures', 0)]]
+        price, payment_failures, renew_failures = numeric
+        
+        # Known subscriptions use the feature store's counts instead of the client's
+        stored, found = self.feature_store.lookup(column('subscription_id', None))
+        payment_failures = np.where(found, stored[:, 0], payment_failures)
+        renew_failures = np.where(found, stored[:, 1], renew_failures)
+        
+        # Date deltas against the reference date, NaT marks unparseable input
+        reference = np.datetime64(CHURN_REFERENCE_DATE, 'D')
+        start = pd.to_datetime(pd.Series(column('start_date', '2024-01-01'), dtype=object), format='%Y-%m-%d', errors='coerce').to_numpy().astype('datetime64[D]')
+        renewed = pd.to_datetime(pd.Series(column('last_renewed_date', '2024-01-01'), dtype=object), format='%Y-%m-%d', errors='coerce').to_numpy().astype('datetime64[D]')
+        valid = is_record & ~(np.isnat(start) | np.isnat(renewed)) & np.isfinite(price) & np.isfinite(payment_failures) & np.isfinite(renew_failures)
+        duration_days = np.where(valid, (reference - start).astype(np.int64), 0)
+        renewed_days = np.where(valid, (reference - renewed).astype(np.int64), 0)
+        
+        # Encode categoricals with the fitted classes, unseen values map to 0
+        encoded = []
+        with timed_stage('label_encoding'):
+            for col, key, default in zip(CHURN_CATEGORICAL_COLS, ['subscription_type', 'auto_renewal_allowed', 'user_status'], ['monthly', 'Yes', 'active']):
+                values = np.array([str(v) for v in column(key, default)])
+                le = state.label_encoders.get(col)
+                if le:
+                    classes = le.classes_
+                    positions = np.clip(np.searchsorted(classes, values), 0, len(classes) - 1)
+                    encoded.append(np.where(classes[positions] == values, positions, 0))
+                else:
+                    encoded.append(np.zeros(len(records), dtype=np.int64))
+        
+        X = np.column_stack([price, duration_days, renewed_days, payment_failures, renew_failures] + encoded).astype(float)
+        return X, valid
+    
+    def _churn_result(self, churn_probability, explanation, price, months_subscribed, payment_failures, renew_failures, subscription_data):
+        """Assemble the churn response for one scored subscription
+        
+        explanation is (baseline, contributions) from the forest, where the baseline plus every
+        factor's contribution adds up to churn_probability; without one the rule scores are used.
+        """
+        risk_level = 'high' if churn_probability > 0.7 else 'medium' if churn_probability > 0.4 else 'low'
+        
+        if explanation is not None:
+            baseline, contributions = explanation
+            churn_factors = dict(zip(CHURN_FACTOR_NAMES, contributions))
+            details = {'explanation_method': 'path_contributions', 'baseline_probability': round(baseline, 4)}
+        else:
+            churn_factors = self._rule_based_churn_factors(price, months_subscribed, payment_failures, renew_failures)
+            details = {'explanation_method': 'rules'}
+        
+        return {
+            'churn_probability': round(float(churn_probability), 2),
+            'risk_level': risk_level,
+            'factors': churn_factors,
+            **details,
+            'retention_strategies': self._get_retention_strategies(churn_factors, subscription_data)
+        }
+    
+    def _fallback_churn_result(self):
+        """Fixed churn response used when a subscription cannot be scored"""
+        return {
+            'churn_probability': 0.3,
+            'risk_level': 'medium',
+            'factors': {},
+            'explanation_method': 'fallback',
+            'retention_strategies': ['Provide personalized support', 'Offer loyalty rewards']
+        }
     
     def optimize_pricing(self, plan_data):
         """Suggest pricing optimizations for plans"""
@@ -280,46 +1066,20 @@ class SubscriptionRecommendationEngine:
     
     def _rule_based_churn_prediction(self, price, months_subscribed, payment_failures, renew_failures):
         """Rule-based churn prediction fallback when ML model is not available"""
-        churn_score = 0.0
-        
-        # High price increases churn risk
-        if price > 70:
-            churn_score += 0.3
-        elif price > 50:
-            churn_score += 0.1
-        
-        # New customers more likely to churn
-        if months_subscribed < 3:
-            churn_score += 0.2
-        elif months_subscribed < 6:
-            churn_score += 0.1
-        
-        # Payment issues increase churn
-        churn_score += min(payment_failures * 0.15, 0.3)
-        churn_score += min(renew_failures * 0.1, 0.2)
-        
-        # Add some randomness for demo
-        churn_score += random.uniform(0, 0.1)
-        
+        churn_score = sum(self._rule_based_churn_factors(price, months_subscribed, payment_failures, renew_failures).values())
         return min(churn_score, 0.95)  # Cap at 95%
     
-    def _calculate_usage_fit(self, current_usage, plan_quota):
-        """Calculate how well the plan quota fits user's usage"""
-        if plan_quota >= current_usage * 1.2:  # Good buffer
-            return 0.9
-        elif plan_quota >= current_usage:  # Just enough
-            return 0.7
-        else:  # Not enough
-            return 0.3
-    
-    def _calculate_price_value(self, price, budget_max):
-        """Calculate price value score"""
-        if price <= budget_max * 0.8:
-            return 1.0
-        elif price <= budget_max:
-            return 0.8
-        else:
-            return 0.4
+    def _rule_based_churn_factors(self, price, months_subscribed, payment_failures, renew_failures):
+        """Additive rule scores per churn factor; the rule-based prediction is their (capped) sum"""
+        return {
+            # High price increases churn risk
+            'price': 0.3 if price > 70 else 0.1 if price > 50 else 0.0,
+            # New customers more likely to churn
+            'subscription_duration': 0.2 if months_subscribed < 3 else 0.1 if months_subscribed < 6 else 0.0,
+            # Payment issues increase churn
+            'payment_failures': float(min(payment_failures * 0.15, 0.3)),
+            'renew_failures': float(min(renew_failures * 0.1, 0.2))
+        }
     
     def _get_recommendation_reasons(self, usage, plan, current_plan):
         """Generate reasons for plan recommendation"""
@@ -346,59 +1106,398 @@ class SubscriptionRecommendationEngine:
         return max(0, current_plan.get('price', 0) - recommended_plan['price'])
     
     def _get_retention_strategies(self, factors, subscription_data):
-        """Get retention strategies based on churn factors"""
+        """Get retention strategies for the factors raising churn risk, strongest first"""
         strategies = []
-        
-        if factors.get('low_usage', 0) > 0:
-            strategies.append("Offer usage tutorials or downgrade to cheaper plan")
-        
-        if factors.get('high_price', 0) > 0:
-            strategies.append("Provide discount or loyalty pricing")
-        
-        if factors.get('new_customer', 0) > 0:
-            strategies.append("Implement onboarding program and early engagement")
-        
-        if factors.get('support_issues', 0) > 0:
-            strategies.append("Priority customer support and proactive assistance")
-        
-        if factors.get('payment_issues', 0) > 0:
-            strategies.append("Flexible payment options and automatic billing")
-        
+        for name, contribution in sorted(factors.items(), key=lambda item: -item[1]):
+            strategy = RETENTION_STRATEGIES.get(name)
+            if contribution > CHURN_FACTOR_THRESHOLD and strategy and strategy not in strategies:
+                strategies.append(strategy)
         return strategies
     
     def _calculate_pricing_impact(self, current_price, new_price, subscriber_count, churn_rate):
         """Calculate expected impact of pricing changes"""
-        price_change_pct = (new_price - current_price) / current_price
-        
-        # Simple elasticity model
-        subscriber_change_pct = -price_change_pct * 0.5  # Assume elasticity of -0.5
-        new_subscriber_count = int(subscriber_count * (1 + subscriber_change_pct))
+        # One plan, one candidate price, one elasticity scenario of the portfolio simulation (subscribers floor at zero)
+        impact = simulate_pricing([current_price], [subscriber_count], [[new_price]], [DEFAULT_ELASTICITY])
+        return {
+            'revenue_change': float(impact['revenue_change'][0, 0, 0]),
+            'subscriber_change': int(impact['subscriber_change'][0, 0, 0]),
+            'revenue_change_pct': float(impact['revenue_change_pct'][0, 0, 0])
+        }
+    
+    def optimize_pricing_portfolio(self, options):
+        """Sweep every plan over candidate prices and elasticity scenarios; optimal price per plan and scenario"""
+        plan_ids, prices, subscriber_counts, churn_rates, source = self._portfolio_plans(options.get('plans'))
+        optimizer = PortfolioPricingOptimizer(
+            elasticities=options.get('elasticities', DEFAULT_ELASTICITY_SCENARIOS),
+            weights=options.get('scenario_weights'),
+            min_change=float(options.get('min_price_change', DEFAULT_PRICE_RANGE[0])),
+            max_change=float(options.get('max_price_change', DEFAULT_PRICE_RANGE[1])),
+            steps=int(options.get('price_steps', DEFAULT_PRICE_STEPS))
+        )
+        with timed_stage('pricing_simulation'):
+            result = optimizer.optimize(prices, subscriber_counts)
         
-        current_revenue = current_price * subscriber_count
-        new_revenue = new_price * new_subscriber_count
+        # Round and convert whole columns at once; per-element float()/round() dominates for thousands of plans
+        elasticities = optimizer.elasticities.tolist()
+        scenario_rows = zip(
+            np.round(result['optimal_price'], 2).tolist(),
+            np.round(result['revenue_change'], 2).tolist(),
+            np.round(result['revenue_change_pct'], 2).tolist(),
+            result['subscriber_change'].astype(np.int64).tolist()
+        )
+        plan_rows = zip(plan_ids, prices.tolist(), subscriber_counts.astype(np.int64).tolist(), churn_rates.tolist(),
+                        np.round(result['recommended_price'], 2).tolist(), np.round(result['expected_revenue_change'], 2).tolist(), scenario_rows)
+        plans = []
+        for i, (plan_id, price, subscriber_count, churn_rate, recommended_price, expected_change, scenario) in enumerate(plan_rows):
+            plan = {
+                'plan_id': plan_id,
+                'current_price': price,
+                'subscriber_count': subscriber_count,
+                'churn_rate': churn_rate,
+                'recommended_price': recommended_price,
+                'expected_revenue_change': expected_change,
+                'scenarios': [{
+                    'elasticity': elasticity,
+                    'optimal_price': optimal_price,
+                    'revenue_change': revenue_change,
+                    'revenue_change_pct': revenue_change_pct,
+                    'subscriber_change': subscriber_change
+                } for elasticity, optimal_price, revenue_change, revenue_change_pct, subscriber_change in zip(elasticities, *scenario)]
+            }
+            if options.get('include_grid'):
+                plan['candidate_prices'] = np.round(result['candidate_prices'][i], 2).tolist()
+                plan['expected_revenue'] = np.round(result['expected_revenue'][i], 2).tolist()
+            plans.append(plan)
         
+        current_revenue = float(result['current_revenue'].sum())
         return {
-            'revenue_change': new_revenue - current_revenue,
-            'subscriber_change': new_subscriber_count - subscriber_count,
-            'revenue_change_pct': (new_revenue - current_revenue) / current_revenue * 100
+            'source': source,
+            'plan_count': len(plans),
+            'price_points': optimizer.steps,
+            'elasticities': elasticities,
+            'scenario_weights': optimizer.weights.tolist(),
+            'totals': {
+                'current_revenue': round(current_revenue, 2),
+                'expected_revenue_change': round(float(result['expected_revenue_change'].sum()), 2),
+                'optimal_revenue_change_by_scenario': np.round(result['revenue_change'].sum(axis=0), 2).tolist()
+            },
+            'plans': plans
         }
+    
+    def _portfolio_plans(self, plans=None):
+        """(plan_ids, prices, subscriber_counts, churn_rates, source) from the request, the dataset or the catalog"""
+        if plans:
+            if not isinstance(plans, list) or not all(isinstance(plan, dict) for plan in plans):
+                raise ValueError('plans must be a list of JSON objects')
+            return (
+                [str(plan.get('plan_id', index)) for index, plan in enumerate(plans)],
+                np.array([plan.get('current_price', plan.get('price', 50)) for plan in plans], dtype=np.float64),
+                np.array([plan.get('subscriber_count', 100) for plan in plans], dtype=np.float64),
+                np.array([plan.get('churn_rate', 0.05) for plan in plans], dtype=np.float64),
+                'request'
+            )
+        
+        catalog = self.subscription_plans
+        if not catalog.empty:
+            # Active subscribers and paused share per plan, from the loaded Subscriptions sheet
+            paused = (self.subscriptions['Status'] == 'PAUSED')
+            totals = self.subscriptions.groupby('Product Id').size()
+            active = (~paused).groupby(self.subscriptions['Product Id']).sum()
+            product_ids = catalog['Product Id']
+            total = totals.reindex(product_ids, fill_value=0).to_numpy(dtype=np.float64)
+            active = active.reindex(product_ids, fill_value=0).to_numpy(dtype=np.float64)
+            churn_rates = np.divide(total - active, total, out=np.zeros_like(total), where=total > 0)
+            return product_ids.astype(str).tolist(), catalog['Price'].to_numpy(dtype=np.float64), active, churn_rates, 'dataset'
+        
+        count = len(self.plan_catalog)
+        return self.plan_catalog.plan_ids.tolist(), self.plan_catalog.prices, np.full(count, 100.0), np.full(count, 0.05), 'catalog'
+
+class MLService:
+    """Serving state of one model key: the engine plus the caches and background workers built around it"""
+    
+    def __init__(self, engine, key='default'):
+        self.key = key
+        self.engine = engine
+        self.response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTLS)
+        # Lock files in the shared model cache keep scheduled and manual retrains to one worker at a time
+        self.retrainer = BackgroundRetrainer(lambda: self.engine, interval_seconds=RETRAIN_INTERVAL_SECONDS,
+                                             lock_path=os.path.join(MODEL_CACHE_DIR, f"retrain-{key}"),
+                                             watch_seconds=REGISTRY_WATCH_SECONDS)
+        # Coalesces concurrent single-row churn requests into one predict_proba call
+        self.churn_batcher = MicroBatcher(lambda records: self.engine.predict_churn_batch(records),
+                                          max_batch_size=CHURN_BATCH_MAX_SIZE,
+                                          max_wait_ms=CHURN_BATCH_MAX_WAIT_MS) if CHURN_MICRO_BATCHING else None
+        self.profiler = SamplingProfiler()
+    
+    def churn_cache_version(self):
+        """Churn results depend on the model and on the feature store's failure counts"""
+        return f"{self.engine.model_version}:{self.engine.feature_store.version}"
+
+# Seconds from module import to each startup phase (import, app_ready, churn_model_ready), per process
+STARTUP_SECONDS = {}
+
+def record_startup_phase(phase):
+    STARTUP_SECONDS[phase] = round(time.perf_counter() - IMPORT_STARTED, 3)
+    metrics.set('ml_startup_seconds', STARTUP_SECONDS[phase], phase=phase)
+
+def _registry():
+    return current_app.extensions['ml_tenants']
+
+def _service():
+    """The serving stack of the model this request selected"""
+    return g.ml_service
+
+@api.before_app_request
+def start_background_jobs():
+    # Cheap per-request checks; start model loads and retrain schedulers once in each (forked) worker
+    for service in _registry().services():
+        service.engine.load_churn_model_async()
+        service.retrainer.start()
+
+@api.before_app_request
+def parse_request_body():
+    g.request_started = time.perf_counter()
+    # get_json caches its result, so endpoints reuse this parse; NDJSON bodies are parsed as they stream
+    if request.is_json:
+        with timed_stage('request_parsing'):
+            request.get_json(silent=True)
+
+@api.before_app_request
+def select_model():
+    key = request.headers.get(MODEL_KEY_HEADER) or request.args.get('model')
+    try:
+        g.ml_service = _registry().get(key)
+    except KeyError:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown model key {key!r}',
+            'timestamp': datetime.now().isoformat()
+        }), 404
+
+@api.after_app_request
+def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.inc('ml_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+    if response.status_code >= 400:
+        metrics.inc('ml_request_errors_total', endpoint=endpoint, status=response.status_code)
+    if 'request_started' in g:
+        metrics.observe('ml_request_duration_seconds', time.perf_counter() - g.request_started, endpoint=endpoint)
+    return response
+
+def _encode_line(obj):
+    with timed_stage('json_serialization'):
+        return dumps(obj, ML_JSON_BACKEND)
+
+def _ndjson_response(records):
+    """Stream an iterable of dicts as NDJSON; records are produced, encoded and sent chunk by chunk"""
+    return Response(stream_with_context(ndjson_chunks(records, _encode_line, NDJSON_FLUSH_BYTES)), mimetype='application/x-ndjson')
+
+def _ndjson_request():
+    return request.mimetype in NDJSON_MIMETYPES
+
+def _ndjson_records():
+    """Records of an NDJSON request body, parsed lazily as the body streams in"""
+    return ndjson_records(request.stream, ML_JSON_BACKEND)
 
-# Initialize ML model
-ml_model = SubscriptionRecommendationEngine()
+def _wants_ndjson():
+    """NDJSON in means NDJSON out; JSON bodies get it by sending Accept: application/x-ndjson"""
+    if _ndjson_request():
+        return True
+    return request.accept_mimetypes.best_match(['application/json', *NDJSON_MIMETYPES]) in NDJSON_MIMETYPES
+
+def _echo_input():
+    """Whether responses repeat the request body (off unless ML_ECHO_INPUT or ?echo=1)"""
+    echo = request.args.get('echo')
+    return ML_ECHO_INPUT if echo is None else echo.lower() in ('1', 'true', 'yes')
+
+def _inference_pool_error(error):
+    """429 (queue full) or 503 (timed out, pool down) response for work the inference pool could not take"""
+    response = jsonify({
+        'success': False,
+        'error': str(error),
+        'timestamp': datetime.now().isoformat()
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, error.status_code
+
+def _churn_model_loading():
+    """503 response for churn endpoints while the model is still loading, else None"""
+    if _service().engine.model_loaded:
+        return None
+    response = jsonify({
+        'success': False,
+        'error': 'Churn model is still loading',
+        'timestamp': datetime.now().isoformat()
+    })
+    response.headers['Retry-After'] = '5'
+    return response, 503
 
-@app.route('/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Liveness endpoint: the process is up and serving HTTP"""
     return jsonify({
         'status': 'ok',
         'service': 'subscription-recommendation-engine',
         'timestamp': datetime.now().isoformat(),
-        'model_loaded': ml_model.model_loaded
+        'model_loaded': _service().engine.model_loaded
     })
 
-@app.route('/recommend', methods=['POST'])
+@api.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness endpoint: 503 until every hosted churn model has finished loading"""
+    engine = _service().engine
+    models = {key: {'ready': service.engine.model_loaded, 'model_version': service.engine.model_version} for key, service in _registry().items()}
+    ready = all(model['ready'] for model in models.values())
+    return jsonify({
+        'ready': ready,
+        'model_version': engine.model_version,
+        'models': models,
+        'startup_seconds': STARTUP_SECONDS,
+        'churn_model_load_seconds': engine.load_seconds,
+        'worker_pid': os.getpid(),
+        'timestamp': datetime.now().isoformat()
+    }), 200 if ready else 503
+
+def _admin_authorized():
+    return not ML_ADMIN_TOKEN or request.headers.get('X-Admin-Token') == ML_ADMIN_TOKEN
+
+@api.route('/admin/retrain', methods=['POST'])
+def trigger_retrain():
+    """Start a background retrain; the current model keeps serving until the new one passes its AUC check"""
+    if not _admin_authorized():
+        return jsonify({
+            'success': False,
+            'error': 'Invalid admin token'
+        }), 403
+    loading = _churn_model_loading()
+    if loading:
+        return loading
+    
+    service = _service()
+    data = request.get_json(silent=True) or {}
+    retrain_kwargs = {'reload_data': bool(data.get('reload_data', True))}
+    if data.get('min_auc') is not None:
+        retrain_kwargs['min_auc'] = float(data['min_auc'])
+    if data.get('incremental') is not None:
+        retrain_kwargs['incremental'] = bool(data['incremental'])
+    
+    if not service.retrainer.trigger(reason='manual', **retrain_kwargs):
+        return jsonify({
+            'success': False,
+            'error': 'Retraining already in progress',
+            'retraining': service.retrainer.status()
+        }), 409
+    
+    return jsonify({
+        'success': True,
+        'message': 'Retraining started',
+        'model_version': service.engine.model_version,
+        'timestamp': datetime.now().isoformat()
+    }), 202
+
+@api.route('/admin/retrain', methods=['GET'])
+def retrain_status():
+    """Current model version and metrics plus recent retraining attempts"""
+    if not _admin_authorized():
+        return jsonify({
+            'success': False,
+            'error': 'Invalid admin token'
+        }), 403
+    
+    service = _service()
+    churn_state = service.engine.churn_state
+    return jsonify({
+        'success': True,
+        'model_version': service.engine.model_version,
+        'model_metrics': churn_state.metrics if churn_state else None,
+        'checkpoint': service.engine.checkpoint_summary(),
+        'retraining': service.retrainer.status(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request counts, error counts, per-stage latency histograms and model version (Prometheus text format)"""
+    for index, (key, service) in enumerate(_registry().items()):
+        metrics.set('ml_model_info', 1, replace=index == 0, model=key, version=service.engine.model_version)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/models', methods=['GET'])
+def list_models():
+    """Hosted models and plan catalogs with per-model memory use (heap vs. shared memory-mapped tables)"""
+    registry = _registry()
+    return jsonify({
+        'default_model': registry.default_key,
+        'models': {key: {
+            'model_version': service.engine.model_version,
+            'ready': service.engine.model_loaded,
+            'dataset_path': service.engine.dataset_path,
+            'plan_catalog_version': service.engine.plan_catalog.version,
+            'plans': len(service.engine.plan_catalog),
+            'scoring_mode': service.engine.churn_state.scoring_mode if service.engine.churn_state else churn_scoring_mode(),
+            'memory': service.engine.memory_report()
+        } for key, service in registry.items()},
+        # ru_maxrss is in KiB on Linux
+        'process_max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'worker_pid': os.getpid(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@api.route('/admin/profile', methods=['GET'])
+def sample_profile():
+    """Sample all threads for ?seconds= and return folded stacks for flamegraph.pl / speedscope"""
+    if not ML_PROFILER_ENABLED:
+        return jsonify({
+            'success': False,
+            'error': 'Profiler disabled (set ML_PROFILER_ENABLED=1)'
+        }), 404
+    if not _admin_authorized():
+        return jsonify({
+            'success': False,
+            'error': 'Invalid admin token'
+        }), 403
+    
+    try:
+        seconds = min(float(request.args.get('seconds', 10)), ML_PROFILER_MAX_SECONDS)
+        interval = float(request.args.get('interval_ms', 5)) / 1000.0
+    except ValueError:
+        seconds = interval = None
+    if seconds is None or not (np.isfinite(seconds) and np.isfinite(interval) and seconds > 0 and interval > 0):
+        return jsonify({
+            'success': False,
+            'error': 'seconds and interval_ms must be positive numbers'
+        }), 400
+    
+    result = _service().profiler.profile(seconds, interval)
+    if result is None:
+        return jsonify({
+            'success': False,
+            'error': 'A profile is already running'
+        }), 409
+    folded, samples = result
+    return Response(folded, mimetype='text/plain', headers={'X-Profile-Samples': str(samples)})
+
+@api.route('/metrics/cache', methods=['GET'])
+def cache_metrics():
+    """Response cache size and per-endpoint hit/miss counters"""
+    return jsonify(dict(_service().response_cache.stats(), timestamp=datetime.now().isoformat()))
+
+@api.route('/metrics/batching', methods=['GET'])
+def batching_metrics():
+    """Micro-batcher queue depth, batch sizes and queueing delay, plus inference pool load"""
+    churn_batcher = _service().churn_batcher
+    return jsonify({
+        'enabled': churn_batcher is not None,
+        'churn_predict': churn_batcher.stats() if churn_batcher else None,
+        'inference_pool': inference_pool.stats() if inference_pool is not None else None,
+        'timestamp': datetime.now().isoformat()
+    })
+
+@api.route('/recommend', methods=['POST'])
 def recommend_plans():
-    """Plan recommendation endpoint"""
+    """Plan recommendation endpoint (an NDJSON body of users streams back as /recommend/batch does)"""
+    if _ndjson_request():
+        return recommend_plans_batch()
     try:
         data = request.get_json()
         
@@ -408,15 +1507,22 @@ def recommend_plans():
                 'error': 'No user data provided'
             }), 400
         
-        # Get plan recommendations
-        recommendations = ml_model.recommend_plans(data)
+        # Get plan recommendations (cached per request body and catalog version)
+        service = _service()
+        catalog_version = service.engine.plan_catalog.version
+        recommendations = service.response_cache.get('recommend', data, catalog_version)
+        if recommendations is None:
+            recommendations = service.engine.recommend_plans(data)
+            service.response_cache.set('recommend', data, catalog_version, recommendations)
         
-        return jsonify({
+        response = {
             'success': True,
             'recommendations': recommendations,
-            'user_data': data,
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        if _echo_input():
+            response['user_data'] = data
+        return jsonify(response)
         
     except Exception as e:
         return jsonify({
@@ -424,37 +1530,246 @@ def recommend_plans():
             'error': f'Recommendation failed: {str(e)}'
         }), 500
 
-@app.route('/churn/predict', methods=['POST'])
+def _recommendation_options(options):
+    """(k, max_price) of a batch recommendation request; raises ValueError unless k >= 1 and max_price is finite"""
+    k = options.get('k', 5)
+    try:
+        k = int(k) if isinstance(k, (int, str)) and not isinstance(k, bool) else 0
+    except ValueError:
+        k = 0
+    if k < 1:
+        raise ValueError('k must be an integer of at least 1')
+    max_price = options.get('max_price')
+    if max_price is None:
+        return k, None
+    try:
+        max_price = float(max_price) if not isinstance(max_price, bool) else np.nan
+    except (TypeError, ValueError):
+        max_price = np.nan
+    if not np.isfinite(max_price):
+        raise ValueError('max_price must be a finite number')
+    return k, max_price
+
+@api.route('/recommend/batch', methods=['POST'])
+def recommend_plans_batch():
+    """Bulk plan recommendation endpoint, streamed back as NDJSON (one line per user)"""
+    try:
+        if _ndjson_request():
+            # Users are parsed lazily from the request stream, chunk by chunk
+            users = _ndjson_records()
+            options = request.args
+        else:
+            data = request.get_json()
+            users = data.get('users') if isinstance(data, dict) else data
+            options = data if isinstance(data, dict) else request.args
+            
+            if not users or not isinstance(users, list):
+                return jsonify({
+                    'success': False,
+                    'error': 'No user data provided'
+                }), 400
+        
+        try:
+            k, max_price = _recommendation_options(options)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        engine = _service().engine
+        echo = _echo_input()
+        
+        def lines():
+            for index, (user, recommendations) in enumerate(engine.recommend_plans_batch(users, k=k, max_price=max_price)):
+                if isinstance(user, InvalidLine):
+                    yield user
+                    continue
+                if not isinstance(user, dict):
+                    line = {'index': index, 'user_id': None, 'error': 'User data must be a JSON object'}
+                elif recommendations is None:
+                    line = {'index': index, 'user_id': user.get('user_id'), 'error': 'Invalid monthly_usage_gb or budget_max'}
+                else:
+                    line = {'index': index, 'user_id': user.get('user_id'), 'recommendations': recommendations}
+                if echo:
+                    line['user_data'] = user
+                yield line
+        
+        return _ndjson_response(lines())
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Batch recommendation failed: {str(e)}'
+        }), 500
+
+@api.route('/churn/predict', methods=['POST'])
 def predict_churn():
-    """Churn prediction endpoint"""
+    """Churn prediction endpoint (an NDJSON body of subscriptions streams back as /churn/predict/batch does)"""
+    if _ndjson_request():
+        return predict_churn_batch()
+    loading = _churn_model_loading()
+    if loading:
+        return loading
     try:
         data = request.get_json()
         
-        if not data:
+        if not data or not isinstance(data, dict):
             return jsonify({
                 'success': False,
                 'error': 'No subscription data provided'
             }), 400
         
-        # Get churn prediction using ML model
-        churn_prediction = ml_model.predict_churn(data)
+        # Get churn prediction using ML model (cached, else micro-batched with concurrent requests)
+        service = _service()
+        model_version = service.churn_cache_version()
+        churn_prediction = service.response_cache.get('churn_predict', data, model_version)
+        if churn_prediction is None:
+            if service.churn_batcher:
+                churn_prediction = service.churn_batcher.predict(data, timeout=CHURN_REQUEST_TIMEOUT)
+            else:
+                churn_prediction = service.engine.predict_churn(data)
+            service.response_cache.set('churn_predict', data, model_version, churn_prediction)
         
-        return jsonify({
+        response = {
             'success': True,
             'churn_prediction': churn_prediction,
-            'subscription_data': data,
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        if _echo_input():
+            response['subscription_data'] = data
+        return jsonify(response)
         
+    except InferencePoolError as e:
+        return _inference_pool_error(e)
     except Exception as e:
         return jsonify({
             'success': False,
             'error': f'Churn prediction failed: {str(e)}'
         }), 500
 
-@app.route('/pricing/optimize', methods=['POST'])
+@api.route('/churn/predict/batch', methods=['POST'])
+def predict_churn_batch():
+    """Batch churn prediction endpoint (JSON array or NDJSON stream; NDJSON out for NDJSON in or on Accept)"""
+    loading = _churn_model_loading()
+    if loading:
+        return loading
+    engine = _service().engine
+    echo = _echo_input()
+    try:
+        # Refuse up front while the pool is saturated: once a stream starts its status is already 200
+        if inference_pool is not None:
+            inference_pool.ensure_capacity()
+        if _ndjson_request():
+            return _ndjson_response(_stream_churn_predictions(engine, _ndjson_records(), echo))
+        
+        data = request.get_json()
+        if isinstance(data, dict):
+            data = data.get('subscriptions')
+        
+        if not data or not isinstance(data, list):
+            return jsonify({
+                'success': False,
+                'error': 'No subscription data provided'
+            }), 400
+        
+        if _wants_ndjson():
+            return _ndjson_response(_stream_churn_predictions(engine, data, echo))
+        predictions = engine.predict_churn_batch(data, timeout=INFERENCE_POOL_TIMEOUT)
+        
+        response = {
+            'success': True,
+            'churn_predictions': predictions,
+            'count': len(predictions),
+            'timestamp': datetime.now().isoformat()
+        }
+        if echo:
+            response['subscription_data'] = data
+        return jsonify(response)
+        
+    except InferencePoolError as e:
+        return _inference_pool_error(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Batch churn prediction failed: {str(e)}'
+        }), 500
+
+def _stream_churn_predictions(engine, subscriptions, echo=False):
+    """Score subscriptions chunk by chunk, yielding one prediction per subscription
+    
+    If the inference pool turns a chunk away mid-stream, a final error line ends the response.
+    """
+    subscriptions = iter(subscriptions)
+    while True:
+        chunk = list(itertools.islice(subscriptions, BATCH_CHUNK_SIZE))
+        if not chunk:
+            return
+        try:
+            # Lines that were not valid JSON are answered with their error line, not scored
+            predictions = iter(engine.predict_churn_batch([s for s in chunk if not isinstance(s, InvalidLine)]))
+        except InferencePoolError as e:
+            yield {'success': False, 'error': str(e), 'status': e.status_code}
+            return
+        for subscription in chunk:
+            if isinstance(subscription, InvalidLine):
+                yield subscription
+                continue
+            prediction = next(predictions)
+            yield dict(prediction, subscription_data=subscription) if echo else prediction
+
+@api.route('/churn/importances', methods=['GET'])
+def churn_importances():
+    """Global feature importances of the serving churn model (computed once per model version)"""
+    loading = _churn_model_loading()
+    if loading:
+        return loading
+    
+    state = _service().engine.churn_state
+    return jsonify({
+        'success': True,
+        'model_version': state.version,
+        'importances': state.global_importances,
+        'timestamp': datetime.now().isoformat()
+    })
+
+@api.route('/features/events', methods=['POST'])
+def append_feature_events():
+    """Append billing and subscription log events to the churn feature store"""
+    loading = _churn_model_loading()
+    if loading:
+        return loading
+    engine = _service().engine
+    try:
+        data = request.get_json()
+        
+        if not data or not (data.get('billing') or data.get('logs')):
+            return jsonify({
+                'success': False,
+                'error': 'No billing or log events provided'
+            }), 400
+        
+        payment_failures = engine.feature_store.append_billing(data.get('billing') or [])
+        renew_failures = engine.feature_store.append_logs(data.get('logs') or [])
+        
+        return jsonify({
+            'success': True,
+            'payment_failures_added': payment_failures,
+            'renew_failures_added': renew_failures,
+            'subscriptions_tracked': len(engine.feature_store),
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Feature event ingestion failed: {str(e)}'
+        }), 500
+
+@api.route('/pricing/optimize', methods=['POST'])
 def optimize_pricing():
-    """Pricing optimization endpoint"""
+    """Pricing optimization endpoint (an NDJSON body of plans streams back one optimization per line)"""
+    if _ndjson_request():
+        return _ndjson_response(_stream_pricing_optimizations(_service().engine, _ndjson_records(), _echo_input()))
     try:
         data = request.get_json()
         
@@ -463,16 +1778,28 @@ def optimize_pricing():
                 'success': False,
                 'error': 'No plan data provided'
             }), 400
+        error = _pricing_input_error(data)
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
         
         # Get pricing optimization
-        optimization = ml_model.optimize_pricing(data)
+        service = _service()
+        optimization = service.response_cache.get('pricing_optimize', data, PRICING_MODEL_VERSION)
+        if optimization is None:
+            optimization = service.engine.optimize_pricing(data)
+            service.response_cache.set('pricing_optimize', data, PRICING_MODEL_VERSION, optimization)
         
-        return jsonify({
+        response = {
             'success': True,
             'optimization': optimization,
-            'plan_data': data,
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        if _echo_input():
+            response['plan_data'] = data
+        return jsonify(response)
         
     except Exception as e:
         return jsonify({
@@ -480,12 +1807,127 @@ def optimize_pricing():
             'error': f'Pricing optimization failed: {str(e)}'
         }), 500
 
+def _pricing_input_error(plan):
+    """Why a plan cannot be priced, or None; price changes are relative to current_price, so it must be positive"""
+    if not isinstance(plan, dict):
+        return 'Plan data must be a JSON object'
+    price = plan.get('current_price', 50)
+    if isinstance(price, bool) or not isinstance(price, (int, float)) or not np.isfinite(price) or price <= 0:
+        return 'current_price must be a positive number'
+    return None
+
+def _stream_pricing_optimizations(engine, plans, echo=False):
+    for index, plan in enumerate(plans):
+        if isinstance(plan, InvalidLine):
+            yield plan
+            continue
+        line = {'index': index}
+        error = _pricing_input_error(plan)
+        if error:
+            line['error'] = error
+        else:
+            try:
+                line['optimization'] = engine.optimize_pricing(plan)
+            except Exception as e:
+                line['error'] = f'Pricing optimization failed: {str(e)}'
+        if echo:
+            line['plan_data'] = plan
+        yield line
+
+@api.route('/pricing/optimize/portfolio', methods=['POST'])
+def optimize_pricing_portfolio():
+    """Portfolio pricing endpoint: every plan x candidate price x elasticity scenario"""
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        service = _service()
+        version = f"{PRICING_MODEL_VERSION}:{service.engine.plan_catalog.version}:{service.engine.model_version}"
+        portfolio = service.response_cache.get('pricing_portfolio', data, version)
+        if portfolio is None:
+            portfolio = service.engine.optimize_pricing_portfolio(data)
+            service.response_cache.set('pricing_portfolio', data, version, portfolio)
+        
+        return jsonify({
+            'success': True,
+            'portfolio': portfolio,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except (ValueError, TypeError) as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid portfolio request: {str(e)}'
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Portfolio pricing optimization failed: {str(e)}'
+        }), 500
+
+def create_app(engine=None, load_mode=None, tenants=None):
+    """Application factory; churn models load eagerly, in a background thread or on the first request
+    
+    The recommendation and pricing endpoints serve as soon as the app exists, churn endpoints
+    answer 503 until the model is ready (ML_ENGINE_LOAD: background, eager or lazy). tenants
+    ({key: {'dataset_path', 'plan_catalog_path'}}, default ML_TENANTS) adds named models next
+    to the 'default' one, selected per request by X-Model-Key or ?model=.
+    """
+    load_mode = load_mode or ML_ENGINE_LOAD
+    if load_mode not in ENGINE_LOAD_MODES:
+        raise ValueError(f"Unknown engine load mode {load_mode!r}, expected one of {ENGINE_LOAD_MODES}")
+    if ML_JSON_BACKEND not in JSON_BACKENDS:
+        raise ValueError(f"Unknown JSON backend {ML_JSON_BACKEND!r}, expected one of {JSON_BACKENDS}")
+    if CHURN_INFERENCE_BACKEND == 'sklearn' and os.environ.get('CHURN_INFERENCE_BACKEND') and CHURN_EXPLANATIONS:
+        print("Warning: CHURN_INFERENCE_BACKEND=sklearn is overridden by CHURN_EXPLANATIONS=1: explained churn "
+              "probabilities come from the node-table walk (equal to predict_proba). Set CHURN_EXPLANATIONS=0 to score with sklearn.")
+    
+    app = Flask(__name__)
+    CORS(app)
+    app.json = TimedJSONProvider(app)
+    if engine is not None:
+        registry = TenantRegistry(lambda key, spec: MLService(engine, key))
+    else:
+        specs = load_tenant_specs(ML_TENANTS) if tenants is None else tenants
+        registry = TenantRegistry(lambda key, spec: MLService(SubscriptionRecommendationEngine(load_churn_model=False, **spec), key), specs)
+    app.extensions['ml_tenants'] = registry
+    app.register_blueprint(api)
+    
+    for service in registry.services():
+        if load_mode == 'eager' and not service.engine.model_loaded:
+            service.engine.load_churn_model()
+        elif load_mode == 'background':
+            service.engine.load_churn_model_async()
+        if RECOMMEND_INDEX and load_mode == 'eager':
+            service.engine.build_recommendation_index()
+        elif RECOMMEND_INDEX and load_mode == 'background':
+            service.engine.build_recommendation_index_async()
+    record_startup_phase('app_ready')
+    return app
+
+def __getattr__(name):
+    # `app` (gunicorn's app:app) and its engine are built on first access, so importing the module stays cheap.
+    # Unless ML_ENGINE_LOAD asks otherwise (gunicorn.conf.py always sets it), the churn model loads on the first
+    # request: a background load would leave loader threads running in scripts that only import the engine.
+    if name == 'app':
+        globals()['app'] = create_app(load_mode=os.environ.get('ML_ENGINE_LOAD', 'lazy'))
+        return globals()['app']
+    if name == 'ml_model':
+        return __getattr__('app').extensions['ml_tenants'].get().engine
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+record_startup_phase('import')
+
 if __name__ == '__main__':
     print("🤖 Starting Subscription Recommendation Engine...")
     print("📡 ML Service running on http://localhost:5000")
-    print("🔍 Health check: http://localhost:5000/health")
+    print("🔍 Health check: http://localhost:5000/health (readiness: /ready)")
     print("🎯 Endpoints:")
     print("   • Plan Recommendations: http://localhost:5000/recommend")
+    print("   • Batch Plan Recommendations: http://localhost:5000/recommend/batch")
     print("   • Churn Prediction: http://localhost:5000/churn/predict")
+    print("   • Batch Churn Prediction: http://localhost:5000/churn/predict/batch")
     print("   • Pricing Optimization: http://localhost:5000/pricing/optimize")
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    print("   • Portfolio Pricing: http://localhost:5000/pricing/optimize/portfolio")
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
+    app = create_app()
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=os.environ.get('FLASK_DEBUG') == '1', threaded=True)
\ No newline at end of file
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+HTTP load benchmark: requests/sec and latency per endpoint against a running ML service
+
+Usage:
+    gunicorn -c gunicorn.conf.py app:app
+    python benchmarks/load_test.py [--url http://localhost:5000] [--concurrency 16] [--duration 10]
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# (method, path, JSON body) for each endpoint under test
+ENDPOINTS = [
+    ('GET', '/health', None),
+    ('POST', '/recommend', {
+        "monthly_usage_gb": 300,
+        "budget_max": 60,
+        "current_plan": {"price": 45},
+        "service_type_preference": "Fibernet"
+    }),
+    ('POST', '/churn/predict', {
+        "subscription_id": "test-123",
+        "price": 49.99,
+        "months_subscribed": 6,
+        "start_date": "2024-01-01",
+        "last_renewed_date": "2024-06-01",
+        "payment_failures": 1,
+        "renew_failures": 0,
+        "subscription_type": "monthly",
+        "auto_renewal_allowed": "Yes",
+        "user_status": "active"
+    }),
+    ('POST', '/pricing/optimize', {
+        "current_price": 49.99,
+        "subscriber_count": 150,
+        "churn_rate": 0.08,
+        "competitor_prices": [45.99, 52.99, 48.99]
+    }),
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def load_endpoint(base_url, method, path, body, concurrency, duration):
+    """Hammer one endpoint from `concurrency` threads for `duration` seconds"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        session = requests.Session()
+        local_latencies, local_errors = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = session.request(method, f"{base_url}{path}", json=body, timeout=30)
+                if response.status_code >= 400:
+                    local_errors += 1
+            except requests.RequestException:
+                local_errors += 1
+            local_latencies.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000
+    }
+
+
+def run_load_test(base_url, concurrency, duration):
+    print(f"🚀 Load testing {base_url} ({concurrency} concurrent clients, {duration}s per endpoint)")
+    results = {}
+    for method, path, body in ENDPOINTS:
+        stats = load_endpoint(base_url, method, path, body, concurrency, duration)
+        results[path] = stats
+        print(f"   {method:4} {path:20} {stats['rps']:8.1f} req/s   "
+              f"p50 {stats['p50_ms']:6.1f}ms  p95 {stats['p95_ms']:6.1f}ms  p99 {stats['p99_ms']:6.1f}ms  "
+              f"errors {stats['errors']}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+    run_load_test(args.url.rstrip('/'), args.concurrency, args.duration)
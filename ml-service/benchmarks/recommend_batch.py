@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark: per-user recommend_plans vs. recommend_plans_batch, each exact and from the recommendation index
+
+Usage: python benchmarks/recommend_batch.py [--users 5000] [--plans 2000] [--k 5] [--typical]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from plan_catalog import PlanCatalog
+
+
+def synthetic_catalog(n_plans, rng):
+    return PlanCatalog(
+        [f"plan-{i}" for i in range(n_plans)],
+        rng.choice(['Fibernet', 'Broadband Copper'], n_plans),
+        rng.choice(['Basic', 'Standard', 'Premium'], n_plans),
+        rng.uniform(10, 120, n_plans).round(2),
+        rng.integers(50, 2000, n_plans),
+        rng.integers(25, 1000, n_plans)
+    )
+
+
+def synthetic_users(n_users, rng, typical=False):
+    # typical: round form inputs (usage in 50 GB steps, budget in $5 steps) as most real requests carry
+    return [{
+        'user_id': i,
+        'monthly_usage_gb': int(rng.integers(1, 30)) * 50 if typical else int(rng.integers(10, 1500)),
+        'budget_max': int(rng.integers(4, 25)) * 5 if typical else round(float(rng.uniform(20, 120)), 2),
+        'service_type_preference': ['Fibernet', 'Broadband Copper', None][i % 3],
+        'current_plan': {'price': 45} if i % 2 else None
+    } for i in range(n_users)]
+
+
+def run_benchmark(n_users, n_plans, k, typical=False):
+    # Built here, after argument parsing, and loaded eagerly so no loader threads outlive the run
+    ml_model = app.create_app(load_mode='eager').extensions['ml_tenants'].get().engine
+    rng = np.random.default_rng(42)
+    ml_model.plan_catalog = synthetic_catalog(n_plans, rng)
+    users = synthetic_users(n_users, rng, typical)
+
+    def measure():
+        start = time.perf_counter()
+        per_user = [ml_model.recommend_plans(user, k=k) for user in users]
+        per_user_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        batch = [recommendations for _, recommendations in ml_model.recommend_plans_batch(users, k=k)]
+        return per_user, per_user_seconds, batch, time.perf_counter() - start
+
+    app.RECOMMEND_INDEX = False
+    exact = measure()
+    app.RECOMMEND_INDEX = True
+    index = ml_model.build_recommendation_index()
+    indexed = measure()
+    hits = (index.cells([u['monthly_usage_gb'] for u in users], [u['budget_max'] for u in users],
+                        ml_model.plan_catalog.preference_codes([u['service_type_preference'] for u in users])) >= 0).mean()
+
+    print(f"\n📊 {n_users} users x {n_plans} plans, k={k}")
+    print(f"   Index: {len(index):,} cells, {index.nbytes / 1e6:.1f} MB, built in {ml_model.recommendation_index_seconds}s; {hits:.0%} of users indexed")
+    for label, (_, per_user_seconds, _, batch_seconds) in (('exact', exact), ('indexed', indexed)):
+        print(f"   Per-user path, {label:8} {per_user_seconds:.3f}s ({n_users / per_user_seconds:,.0f} users/s)")
+        print(f"   Batch path, {label:11} {batch_seconds:.3f}s ({n_users / batch_seconds:,.0f} users/s)")
+    results = [exact[0], exact[2], indexed[0], indexed[2]]
+    identical = all(result == results[0] for result in results)
+    print("   ✅ Results identical" if identical else "   ❌ Results differ between paths")
+    return identical
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--plans', type=int, default=2000)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--typical', action='store_true', help='Round usage/budget inputs instead of uniform random ones')
+    args = parser.parse_args()
+    sys.exit(0 if run_benchmark(args.users, args.plans, args.k, args.typical) else 1)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark: response bytes/sec with the stdlib encoder and echoed input vs. orjson and NDJSON streaming
+
+Encoders are timed on the same response objects, then /churn/predict/batch end to end through the
+Flask test client, with tracemalloc peaks showing the streamed response staying bounded.
+
+Usage: python benchmarks/serialization.py [--rows 20000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from serialization import dumps, orjson
+
+
+def synthetic_subscriptions(n_rows, rng):
+    return [{
+        'subscription_id': i,
+        'price': round(float(rng.uniform(10, 100)), 2),
+        'start_date': f"2024-{int(rng.integers(1, 13)):02d}-01",
+        'last_renewed_date': f"2025-{int(rng.integers(1, 9)):02d}-15",
+        'payment_failures': int(rng.poisson(1)),
+        'subscription_type': str(rng.choice(['monthly', 'yearly'])),
+        'auto_renewal_allowed': str(rng.choice(['Yes', 'No']))
+    } for i in range(n_rows)]
+
+
+def throughput(encode, obj, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        size = len(encode(obj))
+    seconds = (time.perf_counter() - start) / repeat
+    return size, seconds
+
+
+def report(label, size, seconds, rows=None):
+    line = f"   {label:38} {size / 1e6:8.2f} MB in {seconds * 1000:8.1f}ms  {size / seconds / 1e6:8.1f} MB/s"
+    if rows:
+        line += f"  {rows / seconds:>12,.0f} rows/s"
+    print(line)
+
+
+def stdlib_flask(obj):
+    # What Flask's default provider did: sorted keys, NumPy converted by hand beforehand
+    return json.dumps(obj, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def run_encoders(engine, subscriptions, repeat):
+    predictions = engine.predict_churn_batch(subscriptions)
+    echoed = {'success': True, 'churn_predictions': predictions, 'subscription_data': subscriptions}
+    plain = {'success': True, 'churn_predictions': predictions}
+    grid = np.random.default_rng(0).uniform(10, 120, (len(subscriptions), 25))
+
+    print(f"\n📊 Encoders, {len(subscriptions):,} churn predictions")
+    report('json, input echoed (before)', *throughput(stdlib_flask, echoed, repeat))
+    report('json, no echo', *throughput(stdlib_flask, plain, repeat))
+    report('orjson, no echo (after)', *throughput(lambda obj: dumps(obj, 'orjson'), plain, repeat))
+    print(f"\n📊 Encoders, {grid.shape[0]:,} x {grid.shape[1]} NumPy price grid")
+    report('json via .tolist() (before)', *throughput(lambda arr: stdlib_flask({'grid': arr.tolist()}), grid, repeat))
+    report('orjson, NumPy native (after)', *throughput(lambda arr: dumps({'grid': arr}, 'orjson'), grid, repeat))
+
+
+def post_batch(client, subscriptions, backend, echo, ndjson):
+    """POST the batch and consume the response chunk by chunk; returns (bytes, seconds)"""
+    app.ML_JSON_BACKEND = backend
+    headers = {'Accept': 'application/x-ndjson'} if ndjson else {}
+    start = time.perf_counter()
+    response = client.post(f"/churn/predict/batch?echo={int(echo)}", json=subscriptions, headers=headers, buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    seconds = time.perf_counter() - start
+    response.close()
+    return size, seconds
+
+
+def traced_peak(fn, *args):
+    # A separate run: tracemalloc slows allocation-heavy code too much to time under it
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def run_http(client, subscriptions):
+    print(f"\n📊 POST /churn/predict/batch, {len(subscriptions):,} rows (request parsing and scoring included)")
+    for label, backend, echo, ndjson in (('json, input echoed (before)', 'json', True, False),
+                                         ('orjson, no echo (after)', 'orjson', False, False),
+                                         ('orjson, streamed NDJSON', 'orjson', False, True)):
+        size, seconds = post_batch(client, subscriptions, backend, echo, ndjson)
+        report(label, size, seconds, len(subscriptions))
+        peak = traced_peak(post_batch, client, subscriptions, backend, echo, ndjson)
+        print(f"   {'':38} traced peak {peak / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    if orjson is None:
+        print("⚠️  orjson is not installed; the 'after' rows use the stdlib encoder too")
+
+    flask_app = app.create_app(load_mode='eager')
+    engine = flask_app.extensions['ml_tenants'].get().engine
+    subscriptions = synthetic_subscriptions(args.rows, np.random.default_rng(42))
+    run_encoders(engine, subscriptions, args.repeat)
+    run_http(flask_app.test_client(), subscriptions)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Reproducible benchmark suite: training, scoring and endpoint latency on synthetic data of growing size
+
+Each size runs in fresh child processes against its own synthetic dataset (synthetic_data.py),
+plan catalog and model cache, so startup time and peak RSS are measured cleanly. The engine is
+driven both in-process and through the Flask test client; results are written to JSON for
+comparison across commits.
+
+Usage:
+    python benchmarks/suite.py [--sizes small,medium,large] [--requests 500] [--output results.json]
+    python benchmarks/suite.py --compare baseline.json results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+from synthetic_data import SyntheticDatasetGenerator, pa
+
+# users == subscriptions; plans scale both the churn products and the recommendation catalog
+SIZES = {
+    'small': {'users': 1000, 'plans': 20, 'billing_per_subscription': 3},
+    'medium': {'users': 10000, 'plans': 200, 'billing_per_subscription': 5},
+    'large': {'users': 100000, 'plans': 2000, 'billing_per_subscription': 10},
+}
+
+SEED = 42
+BATCH_REQUEST_ROWS = 1000
+
+
+def percentiles(latencies):
+    values = np.asarray(latencies) * 1000
+    return {'p50_ms': round(float(np.percentile(values, 50)), 4),
+            'p95_ms': round(float(np.percentile(values, 95)), 4),
+            'p99_ms': round(float(np.percentile(values, 99)), 4),
+            'requests': len(values)}
+
+
+def request_bodies(n, seed=SEED):
+    """Deterministic /churn/predict and /recommend bodies"""
+    rng = np.random.default_rng(seed + 1)
+    churn = [{
+        'subscription_id': int(rng.integers(1, 1000)),
+        'price': round(float(rng.uniform(10, 100)), 2),
+        'months_subscribed': int(rng.integers(1, 24)),
+        'start_date': f"2024-{int(rng.integers(1, 13)):02d}-01",
+        'last_renewed_date': f"2025-{int(rng.integers(1, 9)):02d}-15",
+        'subscription_type': str(rng.choice(['monthly', 'yearly'])),
+        'auto_renewal_allowed': str(rng.choice(['Yes', 'No'])),
+        'user_status': str(rng.choice(['active', 'inactive']))
+    } for _ in range(n)]
+    recommend = [{
+        'monthly_usage_gb': int(rng.integers(10, 1000)),
+        'budget_max': round(float(rng.uniform(20, 100)), 2),
+        'service_type_preference': str(rng.choice(['Fibernet', 'Broadband Copper']))
+    } for _ in range(n)]
+    return churn, recommend
+
+
+def timed(fn, items):
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - start)
+    return percentiles(latencies)
+
+
+def rows_per_sec(fn, rows):
+    start = time.perf_counter()
+    fn(rows)
+    elapsed = time.perf_counter() - start
+    return {'rows': len(rows), 'seconds': round(elapsed, 4), 'rows_per_sec': round(len(rows) / elapsed, 1)}
+
+
+def child_measure(n_requests, startup_only):
+    """Runs inside a child process with the dataset environment set; prints one JSON line"""
+    started = time.perf_counter()
+    import app
+    import_seconds = time.perf_counter() - started
+    # Cold start as a client sees it: the churn model loads in the background while /recommend serves
+    flask_app = app.create_app(load_mode='background')
+    client = flask_app.test_client()
+    recommend_body = request_bodies(1)[1][0]
+    while client.post('/recommend', json=recommend_body).status_code != 200:
+        time.sleep(0.001)
+    first_recommend_seconds = time.perf_counter() - started
+    while client.get('/ready').status_code != 200:
+        time.sleep(0.01)
+    ready_seconds = time.perf_counter() - started
+    result = {
+        'startup_seconds': round(ready_seconds, 3),
+        'cold_start': {'import': round(import_seconds, 3), 'first_recommend': round(first_recommend_seconds, 3), 'ready': round(ready_seconds, 3)}
+    }
+    if startup_only:
+        result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        print(json.dumps(result))
+        return
+
+    engine = flask_app.extensions['ml_tenants'].get().engine
+    metrics = engine.churn_state.metrics
+    trained_rows = metrics.get('train_rows', 0) + metrics.get('holdout_rows', 0)
+    result['training'] = {
+        'rows': trained_rows,
+        'seconds': metrics.get('training_seconds'),
+        'rows_per_sec': round(trained_rows / metrics['training_seconds'], 1) if metrics.get('training_seconds') else None,
+        'auc': metrics.get('auc'),
+        'stages': {stage['stage']: stage['seconds'] for stage in metrics.get('stages', [])}
+    }
+
+    churn_bodies, recommend_bodies = request_bodies(n_requests)
+    result['in_process'] = {
+        'predict_churn': timed(engine.predict_churn, churn_bodies),
+        'recommend_plans': timed(engine.recommend_plans, recommend_bodies),
+    }
+    batch_rows = (churn_bodies * (len(engine.subscriptions) // len(churn_bodies) + 1))[:max(len(engine.subscriptions), 1)]
+    users_rows = (recommend_bodies * (len(engine.subscriptions) // len(recommend_bodies) + 1))[:max(len(engine.subscriptions), 1)]
+    result['batch_scoring'] = {
+        'predict_churn_batch': rows_per_sec(engine.predict_churn_batch, batch_rows),
+        'recommend_plans_batch': rows_per_sec(lambda rows: sum(1 for _ in engine.recommend_plans_batch(rows)), users_rows),
+    }
+
+    pricing_body = {'current_price': 49.99, 'subscriber_count': 150, 'churn_rate': 0.08, 'competitor_prices': [45.99, 52.99, 48.99]}
+    result['http'] = {
+        '/churn/predict': timed(lambda body: client.post('/churn/predict', json=body), churn_bodies),
+        '/recommend': timed(lambda body: client.post('/recommend', json=body), recommend_bodies),
+        '/pricing/optimize': timed(lambda body: client.post('/pricing/optimize', json=body), [pricing_body] * n_requests),
+        '/churn/predict/batch': rows_per_sec(lambda rows: client.post('/churn/predict/batch', json=rows), batch_rows[:BATCH_REQUEST_ROWS]),
+    }
+    result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(json.dumps(result))
+
+
+def run_child(env, n_requests, startup_only=False):
+    command = [sys.executable, os.path.abspath(__file__), '--child', '--requests', str(n_requests)]
+    if startup_only:
+        command.append('--startup-only')
+    output = subprocess.run(command, env=env, cwd=SERVICE_DIR, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise RuntimeError(f"Benchmark child failed:\n{output.stderr[-2000:]}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def run_size(name, spec, n_requests, n_jobs, workdir):
+    print(f"\n📦 {name}: {spec['users']:,} users/subscriptions, {spec['plans']:,} plans, "
+          f"{spec['users'] * spec['billing_per_subscription']:,} billing rows")
+    data_dir = os.path.join(workdir, name, 'data')
+    started = time.perf_counter()
+    fmt = 'parquet' if pa is not None else 'csv'
+    SyntheticDatasetGenerator(spec['users'], plans=spec['plans'], billing_per_subscription=spec['billing_per_subscription'], seed=SEED).write(data_dir, fmt)
+    catalog_path = os.path.join(data_dir, f"plan_catalog.{fmt}")
+    generate_seconds = time.perf_counter() - started
+
+    env = dict(os.environ,
+               DATASET_PATH=data_dir,
+               DATASET_CACHE_DIR=os.path.join(workdir, name, 'data_cache'),
+               MODEL_CACHE_DIR=os.path.join(workdir, name, 'model_cache'),
+               PLAN_CATALOG_PATH=catalog_path,
+               TRAINING_N_JOBS=str(n_jobs),
+               # Measure the compute paths themselves, not the response cache or cross-request batching
+               RESPONSE_CACHE_SIZE='0',
+               CHURN_MICRO_BATCHING='0',
+               ML_FORCE_RETRAIN='0')
+    cold = run_child(env, n_requests)
+    warm = run_child(env, n_requests, startup_only=True)
+    result = dict(cold, spec=spec, generate_seconds=round(generate_seconds, 3),
+                  startup_seconds={'cold_with_training': cold['startup_seconds'], 'warm_cached_model': warm['startup_seconds']},
+                  cold_start={'cold_with_training': cold['cold_start'], 'warm_cached_model': warm['cold_start']},
+                  warm_peak_rss_mb=warm['peak_rss_mb'])
+
+    training = result['training']
+    print(f"   startup: {result['startup_seconds']['cold_with_training']}s cold (trains), "
+          f"{result['startup_seconds']['warm_cached_model']}s warm   peak RSS {result['peak_rss_mb']} MB")
+    for label, phases in result['cold_start'].items():
+        print(f"   {label}: import {phases['import']}s, first /recommend {phases['first_recommend']}s, /ready {phases['ready']}s")
+    print(f"   training: {training['rows']:,} rows in {training['seconds']}s ({training['rows_per_sec']:,} rows/s, AUC {training['auc']:.3f})")
+    for group in ('in_process', 'http'):
+        for endpoint, stats in result[group].items():
+            if 'p50_ms' in stats:
+                print(f"   {group:10} {endpoint:22} p50 {stats['p50_ms']:8.3f}ms  p95 {stats['p95_ms']:8.3f}ms  p99 {stats['p99_ms']:8.3f}ms")
+            else:
+                print(f"   {group:10} {endpoint:22} {stats['rows_per_sec']:>12,} rows/s")
+    for endpoint, stats in result['batch_scoring'].items():
+        print(f"   {'batch':10} {endpoint:22} {stats['rows_per_sec']:>12,} rows/s")
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVICE_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(result, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1}, numbers only"""
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(baseline_path, current_path):
+    """Print every shared metric with its relative change (latency/seconds/RSS: lower is better)"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+    print(f"📊 {baseline['meta'].get('commit')} -> {current['meta'].get('commit')}")
+    for size in current['results']:
+        if size not in baseline['results']:
+            continue
+        print(f"\n📦 {size}")
+        before, after = flatten(baseline['results'][size]), flatten(current['results'][size])
+        for key in sorted(set(before) & set(after)):
+            if key.startswith('spec.') or key.endswith('.requests') or key.endswith('.rows') or not before[key]:
+                continue
+            change = (after[key] - before[key]) / before[key] * 100
+            print(f"   {key:60} {before[key]:>12} -> {after[key]:>12}  {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='small,medium', help=f"Comma-separated subset of {', '.join(SIZES)}")
+    parser.add_argument('--requests', type=int, default=500, help='Requests per latency measurement')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='TRAINING_N_JOBS for the churn model fit')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help='Compare two result files and exit')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--startup-only', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child_measure(args.requests, args.startup_only)
+        return
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"Unknown sizes: {', '.join(unknown)}")
+
+    import sklearn
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'sklearn': sklearn.__version__,
+            'cpu_count': os.cpu_count(),
+            'seed': SEED,
+            'requests': args.requests,
+            'n_jobs': args.n_jobs
+        },
+        'results': {}
+    }
+    print(f"🏁 Benchmark suite at {report['meta']['commit']} ({', '.join(sizes)})")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            report['results'][size] = run_size(size, SIZES[size], args.requests, args.n_jobs, workdir)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
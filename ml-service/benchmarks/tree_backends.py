@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Churn inference backends: sklearn RandomForestClassifier vs. CompactForest node tables
+
+Reports per-call latency at several batch sizes and the resident memory each backend
+adds to a fresh process once its model is loaded and has served one prediction.
+
+Usage: python benchmarks/tree_backends.py [--rows 20000] [--trees 100]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+from compact_forest import CompactForest
+
+N_FEATURES = 8
+
+# Runs in a child process so each backend's memory is measured in isolation
+RSS_PROBE = """
+import sys
+import numpy as np
+sys.path.insert(0, {service_dir!r})
+def rss_kb():
+    fields = dict(line.split(':', 1) for line in open('/proc/self/status'))
+    return [int(fields[name].split()[0]) for name in ('RssAnon', 'RssFile')]
+baseline = rss_kb()
+if {backend!r} == 'sklearn':
+    import joblib
+    model = joblib.load({path!r})
+    predict = lambda X: model.predict_proba(X)[:, 1]
+else:
+    from compact_forest import CompactForest
+    model = CompactForest.load({path!r})
+    predict = model.predict_proba_positive
+predict(np.random.default_rng(0).normal(size=(1000, {n_features})))
+print(*[after - before for after, before in zip(rss_kb(), baseline)])
+"""
+
+
+def synthetic_training_data(n_rows, rng):
+    X = rng.normal(size=(n_rows, N_FEATURES))
+    y = (X[:, 0] + 0.5 * X[:, 3] + rng.normal(size=n_rows) > 0).astype(int)
+    return X, y
+
+
+def time_call(fn, X, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(X)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def resident_kb(backend, path):
+    """(private, file-backed) RSS in KB added by loading the model; Linux /proc only"""
+    # Import numpy (and sklearn for its backend) before the baseline so only the model is counted
+    probe = RSS_PROBE.format(service_dir=SERVICE_DIR, backend=backend, path=path, n_features=N_FEATURES)
+    if backend == 'sklearn':
+        probe = "import sklearn.ensemble\n" + probe
+    output = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True)
+    anon_kb, file_kb = output.stdout.strip().splitlines()[-1].split()
+    return int(anon_kb), int(file_kb)
+
+
+def run_benchmark(n_rows, n_trees):
+    rng = np.random.default_rng(42)
+    X, y = synthetic_training_data(n_rows, rng)
+    model = RandomForestClassifier(n_estimators=n_trees, random_state=42).fit(X, y)
+    compact = CompactForest.from_sklearn(model)
+
+    X_test = rng.normal(size=(10000, N_FEATURES))
+    max_diff = np.abs(model.predict_proba(X_test)[:, 1] - compact.predict_proba_positive(X_test)).max()
+    print(f"\n🌲 {n_trees} trees, {len(compact.feature):,} nodes, trained on {n_rows:,} rows")
+    print(f"   Max |sklearn - compact| probability difference: {max_diff:.2e}")
+
+    print("\n⏱️  Latency per call (ms)")
+    print(f"   {'batch':>7} {'sklearn':>10} {'compact':>10}")
+    for batch_size, repeats in [(1, 200), (16, 100), (64, 50), (1024, 10), (10000, 2)]:
+        batch = X_test[:batch_size]
+        sklearn_ms = time_call(lambda b: model.predict_proba(b)[:, 1], batch, repeats)
+        compact_ms = time_call(compact.predict_proba_positive, batch, repeats)
+        print(f"   {batch_size:>7} {sklearn_ms:>10.3f} {compact_ms:>10.3f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sklearn_path = os.path.join(tmp, 'forest.joblib')
+        joblib.dump(model, sklearn_path)
+        compact_path = compact.save(os.path.join(tmp, 'compact'))
+        print("\n💾 Resident memory added by the loaded model (private / file-backed, shareable across workers)")
+        for backend, path in [('sklearn', sklearn_path), ('compact', compact_path)]:
+            private_kb, shared_kb = resident_kb(backend, path)
+            print(f"   {backend}: {private_kb / 1024:8.1f} MB / {shared_kb / 1024:8.1f} MB")
+        print(f"   compact node tables: {compact.nbytes / 1e6:.1f} MB on disk, memory-mapped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--trees', type=int, default=100)
+    args = parser.parse_args()
+    run_benchmark(args.rows, args.trees)
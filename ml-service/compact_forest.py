@@ -0,0 +1,154 @@
+import os
+
+import numpy as np
+
+# Node tables written by save() and read back (optionally memory-mapped) by load()
+TABLES = ['feature', 'threshold', 'left', 'right', 'leaf_value', 'roots']
+
+
+class CompactForest:
+    """A fitted RandomForestClassifier flattened into array-backed node tables.
+
+    All trees share one set of tables: feature/threshold per split node, global
+    left/right child indices (-1 at leaves) and the positive-class probability
+    stored at every node. Inference walks every (sample, tree) pair one level per
+    step with vectorised NumPy, matching sklearn's predict_proba[:, 1].
+    """
+
+    def __init__(self, feature, threshold, left, right, leaf_value, roots, max_depth=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.max_depth = max_depth if max_depth is not None else self._depth()
+        # Directory the tables were loaded from (None for an in-memory export)
+        self.path = None
+
+    @classmethod
+    def from_sklearn(cls, model, positive_class=1):
+        """Export the trees of a fitted forest (binary or multi-class, one output)"""
+        classes = list(model.classes_)
+        if positive_class not in classes:
+            raise ValueError(f"Model was not trained with class {positive_class!r}")
+        column = classes.index(positive_class)
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            counts = tree.value[:, 0, :]
+            # sklearn normalises class weights per leaf before averaging trees
+            totals = counts.sum(axis=1)
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(np.where(is_leaf, -1, tree.children_left + offset).astype(np.int32))
+            rights.append(np.where(is_leaf, -1, tree.children_right + offset).astype(np.int32))
+            values.append(np.divide(counts[:, column], totals, out=np.zeros_like(totals), where=totals > 0))
+            roots.append(offset)
+            offset += tree.node_count
+
+        return cls(np.concatenate(features), np.concatenate(thresholds), np.concatenate(lefts),
+                   np.concatenate(rights), np.concatenate(values), np.asarray(roots, dtype=np.int32),
+                   max_depth=max(estimator.tree_.max_depth for estimator in model.estimators_))
+
+    def _depth(self):
+        depth, nodes = 0, self.roots
+        while True:
+            nodes = nodes[self.left[nodes] >= 0]
+            if len(nodes) == 0:
+                return depth
+            nodes = np.concatenate([self.left[nodes], self.right[nodes]])
+            depth += 1
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in TABLES)
+
+    @property
+    def is_mapped(self):
+        return isinstance(self.feature, np.memmap)
+
+    def predict_proba_positive(self, X, chunk_size=4096):
+        """Positive-class probability per row of X (n_samples, n_features)"""
+        # sklearn compares float32 inputs against float64 thresholds; do the same for identical splits
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), chunk_size):
+            out[start:start + chunk_size] = self._predict_chunk(X[start:start + chunk_size])
+        return out
+
+    def _predict_chunk(self, X):
+        # One flat slot per (sample, tree); each step advances only the slots not yet at a leaf
+        n_trees = self.n_trees
+        flat_X = X.ravel()
+        nodes = np.tile(self.roots, len(X))
+        # Offset of each slot's sample row inside the flattened X
+        row_offsets = np.repeat(np.arange(len(X), dtype=np.int64) * X.shape[1], n_trees)
+        active = np.arange(len(nodes))
+        while active.size:
+            current = nodes[active]
+            left = self.left[current]
+            split = left >= 0
+            active, current, left = active[split], current[split], left[split]
+            go_left = flat_X[row_offsets[active] + self.feature[current]] <= self.threshold[current]
+            nodes[active] = np.where(go_left, left, self.right[current])
+        return self.leaf_value[nodes].reshape(len(X), n_trees).mean(axis=1)
+
+    def predict_contributions(self, X, chunk_size=4096):
+        """Path-based explanation per row: (probability, bias, contributions (n_samples, n_features))
+
+        Walking a tree from the root, every split moves the node value (positive-class
+        probability) from parent to child; that change is credited to the split's
+        feature. Averaged over trees, bias + contributions.sum(axis=1) == probability.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        probability = np.empty(len(X), dtype=np.float64)
+        contributions = np.empty(X.shape, dtype=np.float64)
+        for start in range(0, len(X), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            probability[chunk], contributions[chunk] = self._contributions_chunk(X[chunk])
+        return probability, float(self.leaf_value[self.roots].mean()), contributions
+
+    def _contributions_chunk(self, X):
+        # Same level-by-level walk as _predict_chunk, crediting each step's value change to its feature
+        n_trees, n_features = self.n_trees, X.shape[1]
+        flat_X = X.ravel()
+        nodes = np.tile(self.roots, len(X))
+        row_offsets = np.repeat(np.arange(len(X), dtype=np.int64) * n_features, n_trees)
+        totals = np.zeros(len(X) * n_features, dtype=np.float64)
+        active = np.arange(len(nodes))
+        while active.size:
+            current = nodes[active]
+            left = self.left[current]
+            split = left >= 0
+            active, current, left = active[split], current[split], left[split]
+            slots = row_offsets[active] + self.feature[current]
+            go_left = flat_X[slots] <= self.threshold[current]
+            children = np.where(go_left, left, self.right[current])
+            nodes[active] = children
+            totals += np.bincount(slots, self.leaf_value[children] - self.leaf_value[current], minlength=len(totals))
+        probability = self.leaf_value[nodes].reshape(len(X), n_trees).mean(axis=1)
+        return probability, totals.reshape(len(X), n_features) / n_trees
+
+    def save(self, path):
+        """Write the node tables as .npy files so they can be memory-mapped by load()"""
+        os.makedirs(path, exist_ok=True)
+        for name in TABLES:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        np.save(os.path.join(path, 'max_depth.npy'), np.asarray(self.max_depth))
+        return path
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        tables = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in TABLES}
+        max_depth = int(np.load(os.path.join(path, 'max_depth.npy')))
+        forest = cls(max_depth=max_depth, **tables)
+        forest.path = path
+        return forest
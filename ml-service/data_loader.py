@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, Excel/CSV still work without it
+    pa = None
+    ipc = None
+    pq = None
+
+# Sheets of the subscription workbook, in the order the engine loads them
+DATASET_SHEETS = ['User_Data', 'Subscriptions', 'Subscription_Plans', 'Subscription_Logs', 'Billing_Information']
+
+# Export formats accepted when the source is a directory, in lookup order
+EXPORT_EXTENSIONS = ['.arrow', '.parquet', '.csv']
+
+# Rows per record batch in the Arrow IPC cache
+ARROW_BATCH_ROWS = 65536
+
+
+def file_sha256(path, digest=None):
+    """SHA-256 of a file, or of every file under a directory (names included)"""
+    digest = digest or hashlib.sha256()
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            digest.update(name.encode('utf-8'))
+            file_sha256(os.path.join(path, name), digest)
+        return digest.hexdigest()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_file(path, write):
+    """Write a file with write(tmp_path) on a unique temp file next to it and rename it into place
+
+    Concurrent writers never share a temp file, and readers only ever see a complete file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def write_directory(path, write):
+    """Build a directory with write(tmp_path) and rename it into place atomically
+
+    Readers never see a half-written directory; if another process published the
+    same path first, its copy is kept and this one is discarded.
+    """
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, suffix='.tmp')
+    try:
+        write(tmp_path)
+        os.rename(tmp_path, path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+    finally:
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+    return path
+
+
+class DatasetLoader:
+    """Loads the subscription tables from an Excel workbook or a directory of CSV/Parquet/Arrow exports.
+
+    Workbooks are converted once to uncompressed Arrow IPC files under cache_dir and
+    memory-mapped on later loads. The conversion is reused while the workbook's
+    mtime/size match, and also when they changed but the content hash did not.
+    """
+
+    def __init__(self, source, cache_dir, columns=None):
+        self.source = source
+        self.cache_dir = cache_dir
+        # Optional {sheet: [columns]} projection; columns absent from a table are skipped
+        self.columns = columns or {}
+
+    def load(self):
+        """Return {sheet_name: DataFrame} for every sheet in DATASET_SHEETS"""
+        if not os.path.exists(self.source):
+            raise FileNotFoundError(self.source)
+        if os.path.isdir(self.source):
+            return {sheet: self._read_export(sheet) for sheet in DATASET_SHEETS}
+        if pa is None:
+            print("Warning: pyarrow not installed, reading the workbook directly with pandas.")
+            return {sheet: self._project(pd.read_excel(self.source, sheet_name=sheet), sheet) for sheet in DATASET_SHEETS}
+        cache_path = self._ensure_arrow_cache()
+        return {sheet: self._read_arrow(os.path.join(cache_path, f"{sheet}.arrow"), sheet) for sheet in DATASET_SHEETS}
+
+    def iter_batches(self, sheet, batch_rows=100000):
+        """Yield one table as DataFrames of at most batch_rows rows without materialising it whole
+
+        Arrow files are memory-mapped, Parquet is read row group by row group and CSV with a
+        chunked reader, so peak memory is bounded by the batch size rather than the table size.
+        """
+        if not os.path.exists(self.source):
+            raise FileNotFoundError(self.source)
+        if not os.path.isdir(self.source):
+            if pa is None:
+                yield from self._slice(self._project(pd.read_excel(self.source, sheet_name=sheet), sheet), batch_rows)
+                return
+            yield from self._iter_arrow(os.path.join(self._ensure_arrow_cache(), f"{sheet}.arrow"), sheet, batch_rows)
+            return
+        wanted = self.columns.get(sheet)
+        for ext in EXPORT_EXTENSIONS:
+            path = os.path.join(self.source, f"{sheet}{ext}")
+            if not os.path.exists(path) or (ext != '.csv' and pa is None):
+                continue
+            if ext == '.arrow':
+                yield from self._iter_arrow(path, sheet, batch_rows)
+            elif ext == '.parquet':
+                parquet = pq.ParquetFile(path)
+                columns = [col for col in wanted if col in parquet.schema_arrow.names] if wanted else None
+                for batch in parquet.iter_batches(batch_size=batch_rows, columns=columns):
+                    yield batch.to_pandas()
+            else:
+                usecols = (lambda col: col in wanted) if wanted else None
+                yield from pd.read_csv(path, usecols=usecols, chunksize=batch_rows)
+            return
+        raise FileNotFoundError(f"No export found for sheet {sheet} in {self.source}")
+
+    def _iter_arrow(self, path, sheet, batch_rows):
+        wanted = self.columns.get(sheet)
+        with pa.memory_map(path, 'r') as source:
+            reader = ipc.open_file(source)
+            columns = [col for col in wanted if col in reader.schema.names] if wanted else None
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns:
+                    batch = batch.select(columns)
+                # Record batches follow the writer's chunking; re-slice to the requested size
+                for start in range(0, batch.num_rows, batch_rows):
+                    yield batch.slice(start, batch_rows).to_pandas()
+
+    @staticmethod
+    def _slice(df, batch_rows):
+        for start in range(0, len(df), batch_rows):
+            yield df.iloc[start:start + batch_rows]
+
+    def _project(self, df, sheet):
+        wanted = self.columns.get(sheet)
+        if not wanted:
+            return df
+        return df[[col for col in wanted if col in df.columns]]
+
+    def _read_export(self, sheet):
+        """Read one table from a directory of exports, pulling only the projected columns"""
+        wanted = self.columns.get(sheet)
+        for ext in EXPORT_EXTENSIONS:
+            path = os.path.join(self.source, f"{sheet}{ext}")
+            if not os.path.exists(path) or (ext == '.arrow' and pa is None):
+                continue
+            if ext == '.arrow':
+                return self._read_arrow(path, sheet)
+            if ext == '.parquet':
+                if wanted and pq is not None:
+                    available = pq.read_schema(path).names
+                    wanted = [col for col in wanted if col in available]
+                return pd.read_parquet(path, columns=wanted or None)
+            usecols = (lambda col: col in wanted) if wanted else None
+            return pd.read_csv(path, usecols=usecols)
+        raise FileNotFoundError(f"No export found for sheet {sheet} in {self.source}")
+
+    def _read_arrow(self, path, sheet):
+        """Memory-map an Arrow IPC file and read only the projected columns"""
+        with pa.memory_map(path, 'r') as source:
+            table = ipc.open_file(source).read_all()
+        wanted = self.columns.get(sheet)
+        if wanted:
+            table = table.select([col for col in wanted if col in table.column_names])
+        return table.to_pandas()
+
+    def _ensure_arrow_cache(self):
+        """Convert the workbook to Arrow IPC unless an up-to-date conversion already exists"""
+        stat = os.stat(self.source)
+        stem = os.path.splitext(os.path.basename(self.source))[0]
+        cache_path = os.path.join(self.cache_dir, stem)
+        manifest_path = os.path.join(cache_path, 'manifest.json')
+
+        manifest = None
+        complete = all(os.path.exists(os.path.join(cache_path, f"{sheet}.arrow")) for sheet in DATASET_SHEETS)
+        if complete:
+            manifest = self._read_manifest(manifest_path)
+            if manifest and manifest.get('mtime_ns') == stat.st_mtime_ns and manifest.get('size') == stat.st_size:
+                return cache_path
+
+        # mtime changed (or no readable manifest): only reconvert when the content really differs
+        content_hash = file_sha256(self.source)
+        if manifest and manifest.get('sha256') == content_hash:
+            manifest.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        else:
+            print(f"Converting {self.source} to Arrow IPC cache at {cache_path}")
+            os.makedirs(cache_path, exist_ok=True)
+            sheets = pd.read_excel(self.source, sheet_name=DATASET_SHEETS)
+            for sheet, df in sheets.items():
+                self._write_arrow(df, os.path.join(cache_path, f"{sheet}.arrow"))
+            manifest = {'source': os.path.abspath(self.source), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': content_hash}
+
+        def write_manifest(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f)
+        write_file(manifest_path, write_manifest)
+        return cache_path
+
+    def _read_manifest(self, path):
+        """The cache manifest, or None (a cache miss) if it is missing or unreadable"""
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if isinstance(manifest, dict) else None
+
+    def _write_arrow(self, df, path):
+        """Write an uncompressed Arrow IPC file (required for zero-copy memory mapping)"""
+        table = pa.Table.from_pandas(self._arrow_safe(df), preserve_index=False)
+
+        def write_table(tmp_path):
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with ipc.new_file(sink, table.schema) as writer:
+                    # Bounded record batches let iter_batches() stream the table from the memory map
+                    writer.write_table(table, max_chunksize=ARROW_BATCH_ROWS)
+        write_file(path, write_table)
+
+    def _arrow_safe(self, df):
+        """Stringify object columns Arrow cannot type (e.g. mixed numbers and text)"""
+        df = df.copy()
+        for col in df.columns:
+            if df[col].dtype != object:
+                continue
+            try:
+                pa.array(df[col], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                df[col] = df[col].astype(str).where(df[col].notna(), None)
+        return df
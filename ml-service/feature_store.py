@@ -0,0 +1,103 @@
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class FailureFeatureStore:
+    """Per-subscription payment/renewal failure counts, maintained incrementally.
+
+    Counts live in one int32 matrix (one row per subscription, one column per
+    feature) with a dict index from subscription id to row. Events are appended
+    in bulk, so neither training nor online scoring has to rescan the billing and
+    log tables.
+    """
+
+    FEATURES = ['payment_failures', 'renew_failures']
+
+    def __init__(self, capacity=1024):
+        self._index = {}
+        self._counts = np.zeros((capacity, len(self.FEATURES)), dtype=np.int32)
+        self._lock = threading.Lock()
+        # Bumped on every append that changes a count, so cached predictions can be invalidated
+        self.version = 0
+
+    def __len__(self):
+        return len(self._index)
+
+    @staticmethod
+    def _key(subscription_id):
+        # Dataset ids are ints, API callers often send strings: index both the same way
+        if isinstance(subscription_id, (float, np.floating)) and float(subscription_id).is_integer():
+            subscription_id = int(subscription_id)
+        return str(subscription_id)
+
+    def append_billing(self, events):
+        """Add billing events (DataFrame or list of dicts with subscription_id, payment_status)"""
+        events = pd.DataFrame(events)
+        if events.empty or 'subscription_id' not in events or 'payment_status' not in events:
+            return 0
+        failed = events.loc[events['payment_status'] == 'failed', 'subscription_id']
+        return self._increment(failed, 0)
+
+    def append_logs(self, events):
+        """Add subscription log events (DataFrame or list of dicts with 'Subscription id', action)"""
+        events = pd.DataFrame(events)
+        if events.empty or 'Subscription id' not in events or 'action' not in events:
+            return 0
+        renew_failed = events.loc[events['action'] == 'renew_failed', 'Subscription id']
+        return self._increment(renew_failed, 1)
+
+    def register(self, subscription_ids):
+        """Index known subscriptions without events, so they resolve to zero counts instead of unknown"""
+        with self._lock:
+            before = len(self._index)
+            for sub_id in subscription_ids:
+                self._row(sub_id)
+            if len(self._index) != before:
+                self.version += 1
+        return len(self._index) - before
+
+    def _increment(self, subscription_ids, column):
+        """Add one per occurrence of each id to the given feature column; returns events counted"""
+        occurrences = subscription_ids.value_counts()
+        if occurrences.empty:
+            return 0
+        with self._lock:
+            rows = np.fromiter((self._row(sub_id) for sub_id in occurrences.index), dtype=np.int64, count=len(occurrences))
+            # add.at accumulates even when two raw ids (54 and '54') share a row
+            np.add.at(self._counts, (rows, column), occurrences.to_numpy(dtype=np.int32))
+            self.version += 1
+        return int(occurrences.sum())
+
+    def _row(self, subscription_id):
+        key = self._key(subscription_id)
+        row = self._index.get(key)
+        if row is None:
+            row = len(self._index)
+            if row == len(self._counts):
+                self._counts = np.vstack([self._counts, np.zeros_like(self._counts)])
+            self._index[key] = row
+        return row
+
+    def lookup(self, subscription_ids):
+        """Return (counts[n, len(FEATURES)], found_mask[n]) for the given ids; unknown ids get zeros"""
+        with self._lock:
+            rows = np.fromiter((self._index.get(self._key(sub_id), -1) for sub_id in subscription_ids), dtype=np.int64)
+            found = rows >= 0
+            counts = np.zeros((len(rows), len(self.FEATURES)), dtype=np.int32)
+            counts[found] = self._counts[rows[found]]
+        return counts, found
+
+    @property
+    def nbytes(self):
+        """Count matrix plus the id index's hash table (keys are small ints/strings shared with the dataset)"""
+        return self._counts.nbytes + sys.getsizeof(self._index)
+
+    def get(self, subscription_id):
+        """Return the feature dict for one subscription, or None if it is neither registered nor has events"""
+        counts, found = self.lookup([subscription_id])
+        if not found[0]:
+            return None
+        return dict(zip(self.FEATURES, counts[0].tolist()))
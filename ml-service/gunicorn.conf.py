@@ -0,0 +1,41 @@
+"""
+Gunicorn settings for the ML service.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app (and with it the trained churn model) is loaded once in the master
+process (preload_app) and shared copy-on-write with every forked worker.
+Without preloading, each worker starts serving /recommend and /pricing
+immediately and loads the churn model in a background thread (ML_ENGINE_LOAD).
+Retraining runs in one worker at a time (lock files in MODEL_CACHE_DIR); the
+others reload the model it publishes (REGISTRY_WATCH_SECONDS).
+All settings can be overridden through the environment variables below.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('ML_BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+
+# Process/thread layout: scoring is CPU-bound, so workers scale with cores and
+# threads mostly cover I/O (request bodies, streamed NDJSON responses)
+workers = int(os.environ.get('ML_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('ML_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Load the model before forking so workers share its memory pages
+preload_app = os.environ.get('ML_PRELOAD', '1') == '1'
+# A background load started in the master would not survive the fork, so preloading loads eagerly
+os.environ.setdefault('ML_ENGINE_LOAD', 'eager' if preload_app else 'background')
+
+# Concurrency and connection tuning
+backlog = int(os.environ.get('ML_BACKLOG', 2048))
+timeout = int(os.environ.get('ML_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('ML_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('ML_KEEPALIVE', 5))
+# Recycle workers periodically to bound heap growth (0 disables)
+max_requests = int(os.environ.get('ML_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('ML_MAX_REQUESTS_JITTER', 0))
+
+accesslog = os.environ.get('ML_ACCESS_LOG', '-')
+loglevel = os.environ.get('ML_LOG_LEVEL', 'info')
@@ -0,0 +1,204 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from compact_forest import CompactForest
+
+# Model generations a worker keeps loaded at once (one per co-hosted tenant, plus the previous after a swap)
+WORKER_MODEL_SLOTS = 4
+
+# Models loaded in this worker process, keyed by model ref
+_worker_models = OrderedDict()
+
+
+class InferencePoolError(RuntimeError):
+    """Work the pool refused or could not finish; status_code is the HTTP status to answer with"""
+
+    def __init__(self, message, status_code, retry_after=1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class PoolSaturated(InferencePoolError):
+    def __init__(self, pending):
+        super().__init__(f'Inference queue is full ({pending} tasks pending)', 429)
+
+
+class PoolTimeout(InferencePoolError):
+    def __init__(self, timeout):
+        super().__init__(f'Inference did not finish within {timeout:g}s', 503, retry_after=5)
+
+
+class PoolUnavailable(InferencePoolError):
+    def __init__(self, reason):
+        super().__init__(f'Inference pool unavailable: {reason}', 503, retry_after=5)
+
+
+def model_ref(kind, path, version):
+    """Picklable handle a worker loads a model from: ('tables', node table dir) or ('joblib', estimator file)"""
+    return (kind, path, version)
+
+
+def _load_model(ref):
+    kind, path, _ = ref
+    if kind == 'tables':
+        return CompactForest.load(path)
+    import joblib
+    obj = joblib.load(path)
+    # A registry artifact without node tables embeds the estimator
+    return obj['model'] if isinstance(obj, dict) else obj
+
+
+def _worker_model(ref):
+    model = _worker_models.get(ref)
+    if model is None:
+        model = _load_model(ref)
+        _worker_models[ref] = model
+        while len(_worker_models) > WORKER_MODEL_SLOTS:
+            _worker_models.popitem(last=False)
+    else:
+        _worker_models.move_to_end(ref)
+    return model
+
+
+def _init_worker(refs):
+    # Load the serving models up front so the first request does not pay for it
+    for ref in refs:
+        try:
+            _worker_model(ref)
+        except Exception as e:
+            print(f"Warning: Inference worker could not preload {ref[1]}: {str(e)}")
+
+
+def score_churn(ref, X, mode, columns=None):
+    """Worker task: churn probabilities for X, with (baseline, contributions) when mode is 'contributions'"""
+    model = _worker_model(ref)
+    if mode == 'contributions':
+        probabilities, baseline, contributions = model.predict_contributions(X)
+        return probabilities, (baseline, contributions)
+    if mode == 'compact':
+        return model.predict_proba_positive(X), None
+    import pandas as pd
+    return model.predict_proba(pd.DataFrame(X, columns=columns))[:, 1], None
+
+
+class InferencePool:
+    """Process pool that runs CPU-bound scoring off the request threads.
+
+    Workers load each model once, from the registry's memory-mapped node tables
+    (or its joblib file), and keep it until newer generations push it out, so a
+    task only ships its feature matrix and model ref. At most max_pending tasks
+    are queued or running; beyond that run() raises PoolSaturated (answered with
+    429) instead of queueing, and a task that misses its timeout raises
+    PoolTimeout (503). Like the other background workers, the executor is
+    created lazily per process, since it does not survive gunicorn's fork.
+    """
+
+    def __init__(self, workers, max_pending=None, timeout=30.0, start_method='spawn'):
+        self.workers = workers
+        self.max_pending = max_pending if max_pending is not None else workers * 4
+        self.timeout = timeout
+        self.start_method = start_method
+        # Reentrant: shutting down a broken executor runs the cancelled futures' callbacks under the lock
+        self._lock = threading.RLock()
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'timeouts': 0,
+                       'restarts': 0, 'total_task_ms': 0.0, 'max_task_ms': 0.0, 'max_pending_seen': 0}
+
+    def _ensure_executor(self, preload):
+        if self._pid != os.getpid() or self._executor is None:
+            if self._pid != os.getpid():
+                self._pending = 0
+            self._pid = os.getpid()
+            # spawn: forking a process that runs request threads could copy held locks into the workers
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(self.start_method),
+                                                 initializer=_init_worker, initargs=(list(preload),))
+        return self._executor
+
+    def ensure_capacity(self):
+        """Raise PoolSaturated now rather than after a streamed response has started"""
+        with self._lock:
+            if self._pid == os.getpid() and self._pending >= self.max_pending:
+                self._stats['rejected'] += 1
+                raise PoolSaturated(self._pending)
+
+    def submit(self, fn, *args, preload=()):
+        """Queue fn(*args) on a worker; raises PoolSaturated when max_pending tasks are outstanding"""
+        with self._lock:
+            executor = self._ensure_executor(preload)
+            if self._pending >= self.max_pending:
+                self._stats['rejected'] += 1
+                raise PoolSaturated(self._pending)
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool as e:
+                self._restart()
+                raise PoolUnavailable(str(e) or 'a worker process died')
+            self._pending += 1
+            self._stats['submitted'] += 1
+            self._stats['max_pending_seen'] = max(self._stats['max_pending_seen'], self._pending)
+        pid, started = os.getpid(), time.perf_counter()
+        future.add_done_callback(lambda f: self._finished(f, pid, started))
+        return future
+
+    def run(self, fn, *args, timeout=None, preload=()):
+        """submit() and wait; raises PoolTimeout after timeout seconds (default: the pool's)"""
+        timeout = self.timeout if timeout is None else timeout
+        future = self.submit(fn, *args, preload=preload)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            # Only a task still queued can be cancelled; a running one keeps its slot until it finishes
+            future.cancel()
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise PoolTimeout(timeout)
+        except BrokenProcessPool as e:
+            with self._lock:
+                self._restart()
+            raise PoolUnavailable(str(e) or 'a worker process died')
+
+    def _restart(self):
+        # The broken executor is dropped; the next submit starts a fresh set of workers
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._stats['restarts'] += 1
+
+    def _finished(self, future, pid, started):
+        task_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            if pid == self._pid:
+                self._pending -= 1
+            stats = self._stats
+            if future.cancelled() or future.exception() is not None:
+                stats['failed'] += 1
+                return
+            stats['completed'] += 1
+            stats['total_task_ms'] += task_ms
+            stats['max_task_ms'] = max(stats['max_task_ms'], task_ms)
+
+    def stats(self):
+        """Snapshot of outstanding tasks, outcomes and task latency (queueing included)"""
+        with self._lock:
+            stats = dict(self._stats, pending=self._pending if self._pid == os.getpid() else 0)
+        stats.update(
+            avg_task_ms=round(stats.pop('total_task_ms') / (stats['completed'] or 1), 3),
+            max_task_ms=round(stats['max_task_ms'], 3),
+            config={'workers': self.workers, 'max_pending': self.max_pending, 'timeout': self.timeout}
+        )
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        # Outside the lock: the executor's own thread runs done callbacks that take it
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=True, cancel_futures=True)
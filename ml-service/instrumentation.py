@@ -0,0 +1,153 @@
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds, from 50µs (one-row scoring) to 10s (large batches)
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms rendered in the Prometheus text format.
+
+    Series are kept per process: under gunicorn each worker reports its own
+    values, so a scrape through the shared port sees whichever worker answered.
+    Observing is a lock plus a bisect over the buckets, cheap enough for
+    per-request hot paths.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _declare(self, name, kind, help_text, labelnames, buckets=None):
+        self._metrics[name] = {'type': kind, 'help': help_text, 'labels': tuple(labelnames), 'buckets': buckets, 'series': {}}
+
+    def counter(self, name, help_text, labelnames=()):
+        self._declare(name, 'counter', help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        self._declare(name, 'gauge', help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self._declare(name, 'histogram', help_text, labelnames, tuple(sorted(buckets)))
+
+    def _key(self, metric, labels):
+        return tuple(str(labels.get(label, '')) for label in metric['labels'])
+
+    def inc(self, name, amount=1, **labels):
+        metric = self._metrics[name]
+        key = self._key(metric, labels)
+        with self._lock:
+            metric['series'][key] = metric['series'].get(key, 0) + amount
+
+    def set(self, name, value, replace=False, **labels):
+        """Set a gauge; replace=True drops its other series (e.g. the previous model version)"""
+        metric = self._metrics[name]
+        key = self._key(metric, labels)
+        with self._lock:
+            if replace:
+                metric['series'].clear()
+            metric['series'][key] = value
+
+    def observe(self, name, value, **labels):
+        metric = self._metrics[name]
+        key = self._key(metric, labels)
+        buckets = metric['buckets']
+        with self._lock:
+            series = metric['series'].get(key)
+            if series is None:
+                series = metric['series'][key] = {'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            # Counts are stored per bucket and made cumulative at render time
+            index = bisect_left(buckets, value)
+            if index < len(buckets):
+                series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the wall-clock duration of the with-block into a histogram"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @staticmethod
+    def _escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def _labels(self, names, values, extra=None):
+        pairs = list(zip(names, values)) + ([extra] if extra else [])
+        return '{' + ','.join(f'{name}="{self._escape(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+    def render(self):
+        """Exposition text (format 0.0.4) for every declared metric"""
+        lines = []
+        with self._lock:
+            for name, metric in self._metrics.items():
+                lines.append(f"# HELP {name} {metric['help']}")
+                lines.append(f"# TYPE {name} {metric['type']}")
+                for key, value in metric['series'].items():
+                    if metric['type'] != 'histogram':
+                        lines.append(f"{name}{self._labels(metric['labels'], key)} {value}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(metric['buckets'], value['counts']):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self._labels(metric['labels'], key, ('le', repr(float(bound))))} {cumulative}")
+                    lines.append(f"{name}_bucket{self._labels(metric['labels'], key, ('le', '+Inf'))} {value['count']}")
+                    lines.append(f"{name}_sum{self._labels(metric['labels'], key)} {value['sum']}")
+                    lines.append(f"{name}_count{self._labels(metric['labels'], key)} {value['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """Samples every thread's Python stack at a fixed interval and folds the stacks.
+
+    The output is the collapsed-stack format ("frame;frame;frame count" per line)
+    read by flamegraph.pl, inferno and speedscope. The calling thread does the
+    sampling through sys._current_frames() and leaves itself out, so the profiled
+    code needs no changes; only one profile runs at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _fold(self, frame, thread_name):
+        stack = []
+        while frame is not None:
+            stack.append(self._frame_name(frame))
+            frame = frame.f_back
+        stack.append(thread_name)
+        return ';'.join(reversed(stack))
+
+    def profile(self, seconds, interval=0.005):
+        """Sample for `seconds`; returns (folded_text, sample_count), or None if a profile is already running"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            stacks = Counter()
+            samples = 0
+            me = threading.get_ident()
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident != me:
+                        stacks[self._fold(frame, names.get(ident, f"thread-{ident}"))] += 1
+                samples += 1
+                time.sleep(interval)
+            folded = '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common())
+            return folded + '\n' if folded else '', samples
+        finally:
+            self._lock.release()
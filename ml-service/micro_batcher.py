@@ -0,0 +1,109 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row requests into one batched model call.
+
+    Callers submit one item and block on the returned Future. A background
+    thread takes the first queued item, keeps collecting for up to max_wait_ms
+    or until max_batch_size items are queued, then runs predict_batch once and
+    hands each result back to its caller. predict_batch must return one result
+    per input, in order.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=64, max_wait_ms=2.0):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self._stats = {'batches': 0, 'rows': 0, 'errors': 0, 'max_batch_size': 0,
+                       'total_wait_ms': 0.0, 'max_wait_ms': 0.0, 'batch_size_counts': {}}
+
+    def submit(self, item):
+        """Queue one item for the next batch; returns a Future resolving to its result"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def predict(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _ensure_worker(self):
+        # Threads do not survive fork (gunicorn preload), so each process starts its own
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or self._worker_pid != os.getpid() or not self._worker.is_alive():
+                if self._worker_pid != os.getpid():
+                    self._queue = queue.Queue()
+                self._worker_pid = os.getpid()
+                self._worker = threading.Thread(target=self._run, name='churn-micro-batcher', daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        """Block for the first item, then gather more until the batch is full or max wait elapses"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Drain whatever else is already waiting without blocking further
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.predict_batch(items)
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                with self._lock:
+                    self._stats['errors'] += 1
+            self._record(len(batch), max((started - enqueued) * 1000 for _, _, enqueued in batch))
+
+    def _record(self, batch_size, wait_ms):
+        with self._lock:
+            stats = self._stats
+            stats['batches'] += 1
+            stats['rows'] += batch_size
+            stats['max_batch_size'] = max(stats['max_batch_size'], batch_size)
+            stats['total_wait_ms'] += wait_ms
+            stats['max_wait_ms'] = max(stats['max_wait_ms'], wait_ms)
+            stats['batch_size_counts'][batch_size] = stats['batch_size_counts'].get(batch_size, 0) + 1
+
+    def stats(self):
+        """Snapshot of queue depth, batch sizes and queueing delay"""
+        with self._lock:
+            stats = dict(self._stats, batch_size_counts=dict(self._stats['batch_size_counts']))
+        batches = stats['batches'] or 1
+        stats.update(
+            queue_depth=self._queue.qsize(),
+            avg_batch_size=round(stats['rows'] / batches, 2),
+            avg_wait_ms=round(stats.pop('total_wait_ms') / batches, 3),
+            max_wait_ms=round(stats['max_wait_ms'], 3),
+            config={'max_batch_size': self.max_batch_size, 'max_wait_ms': self.max_wait_ms}
+        )
+        return stats
@@ -0,0 +1,184 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime
+
+from compact_forest import CompactForest
+from data_loader import file_sha256, write_directory
+
+
+class ModelRegistry:
+    """On-disk store for fitted churn models, keyed by dataset hash and training config.
+
+    Next to each joblib artifact the forest's flat node tables are kept as .npy
+    files and memory-mapped on load, so every worker (and every tenant trained on
+    the same data) reads one copy of the trees through the page cache. The sklearn
+    estimator then goes to its own file and is only unpickled when asked for, since
+    scoring from the tables never touches it.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def artifact_key(self, dataset_path, config):
+        """Hash the dataset bytes together with the training config; None if the dataset is missing"""
+        if not os.path.exists(dataset_path):
+            return None
+        digest = hashlib.sha256()
+        file_sha256(dataset_path, digest)
+        digest.update(json.dumps(config, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+    def artifact_path(self, key):
+        return os.path.join(self.cache_dir, f"churn-{key[:16]}.joblib")
+
+    def model_path(self, key):
+        return os.path.join(self.cache_dir, f"churn-{key[:16]}.model.joblib")
+
+    def estimator_path(self, key):
+        """File the sklearn estimator of key is stored in: its own file when saved with node tables"""
+        model_path = self.model_path(key)
+        return model_path if os.path.exists(model_path) else self.artifact_path(key)
+
+    def _read(self, path):
+        try:
+            # Imported on first use: joblib and the sklearn classes it unpickles stay off the import path
+            import joblib
+            return joblib.load(path)
+        except Exception as e:
+            print(f"Warning: Could not load model artifact {path}: {str(e)}. Retraining.")
+            return None
+
+    def _write(self, obj, path):
+        """Dump obj next to path and rename it into place so concurrent workers never read a partial file"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            import joblib
+            joblib.dump(obj, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load(self, key, features, load_model=True):
+        """Return the stored artifact for key, or None if absent, unreadable or built for another schema
+
+        With load_model=False and node tables on disk, artifact['model'] is None and
+        only the mapped forest is returned.
+        """
+        path = self.artifact_path(key)
+        if not os.path.exists(path):
+            return None
+        artifact = self._read(path)
+        if not artifact or artifact.get('key') != key or artifact.get('features') != list(features):
+            return None
+        tables = artifact['metadata'].get('forest_tables')
+        artifact['forest'] = self.load_forest(tables) if tables else None
+        if artifact.get('model') is None and (load_model or artifact['forest'] is None):
+            model_path = self.model_path(key)
+            artifact['model'] = self._read(model_path) if os.path.exists(model_path) else None
+            if artifact['model'] is None:
+                return None
+        return artifact
+
+    def _location_digest(self, dataset_path, config):
+        digest = hashlib.sha256(os.path.abspath(dataset_path).encode('utf-8'))
+        digest.update(json.dumps(config, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def checkpoint_path(self, dataset_path, config):
+        """Incremental-training checkpoint of a dataset location and config (unlike artifacts, not of its bytes)"""
+        return os.path.join(self.cache_dir, f"churn-checkpoint-{self._location_digest(dataset_path, config)}.joblib")
+
+    def current_path(self, dataset_path, config):
+        """Pointer to the model last published for a dataset location and config, which other workers reload"""
+        return os.path.join(self.cache_dir, f"churn-current-{self._location_digest(dataset_path, config)}.json")
+
+    def publish(self, path, key, version):
+        """Point path at the saved artifact of key, served as version; returns the new pointer's stamp"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'key': key, 'model_version': version, 'published_at': datetime.now().isoformat()}, f)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return self.stamp(path)
+
+    def stamp(self, path):
+        """(inode, mtime) of a pointer file, which changes with every publish; None if there is none"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def read_current(self, path):
+        """The pointer at path, or None if nothing was published or it cannot be read"""
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_checkpoint(self, path, checkpoint):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._write(checkpoint, path)
+        return path
+
+    def load_checkpoint(self, path):
+        """The checkpoint at path, or None if there is none or it cannot be read"""
+        if not os.path.exists(path):
+            return None
+        try:
+            import joblib
+            return joblib.load(path)
+        except Exception as e:
+            print(f"Warning: Could not load training checkpoint {path}: {str(e)}")
+            return None
+
+    def save_forest(self, key, forest):
+        """Write a forest's node tables to a new directory and return its name (for the artifact metadata)
+
+        Each save gets a fresh directory because processes may still map the previous one.
+        """
+        name = f"churn-{key[:16]}-{uuid.uuid4().hex[:12]}.tables"
+        write_directory(os.path.join(self.cache_dir, name), forest.save)
+        return name
+
+    def load_forest(self, name):
+        """Memory-map the node tables saved under name, or None if they are gone"""
+        path = os.path.join(self.cache_dir, name)
+        return CompactForest.load(path) if os.path.isdir(path) else None
+
+    def _remove_stale_tables(self, key, keep):
+        # Unlinking is safe while other processes still map the files; their mapping stays valid
+        for path in glob.glob(os.path.join(self.cache_dir, f"churn-{key[:16]}-*.tables")):
+            if os.path.basename(path) != keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def save(self, key, model, label_encoders, features, metadata=None):
+        """Write the artifact atomically; with forest tables the estimator is written first to its own file"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        metadata = dict(metadata or {}, saved_at=datetime.now().isoformat())
+        tables = metadata.get('forest_tables')
+        if tables:
+            self._write(model, self.model_path(key))
+        artifact = {
+            'key': key,
+            'model': None if tables else model,
+            'label_encoders': label_encoders,
+            'features': list(features),
+            'metadata': metadata
+        }
+        self._write(artifact, self.artifact_path(key))
+        if tables:
+            self._remove_stale_tables(key, tables)
+        return self.artifact_path(key)
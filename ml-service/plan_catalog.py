@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_loader import file_sha256, write_directory
+
+# Columns a catalog export must provide (one row per plan SKU)
+CATALOG_COLUMNS = ['plan_id', 'type', 'category', 'price', 'data', 'speed']
+
+# Columns written by save() and memory-mapped by load(); strings are stored fixed-width so they map too
+TABLES = ['plan_ids', 'categories', 'prices', 'quotas', 'speeds', 'type_names', 'type_codes']
+
+# Type code meaning "user has no service type preference"
+NO_PREFERENCE = -2
+
+# Suitability components per class: usage fit (quota under usage, >= usage, >= 1.2x usage), price value
+# (over budget, within budget, within 80% of it) and type match (other type, preferred or no preference)
+USAGE_FIT = np.array([0.3, 0.7, 0.9])
+PRICE_VALUE = np.array([0.4, 0.8, 1.0])
+TYPE_MATCH = np.array([0.7, 1.0])
+# Rounded score of every class combination at usage * 6 + price * 2 + type; the last entry is "over budget"
+SCORE_TABLE = np.append(np.round(USAGE_FIT[:, None, None] * 0.4 + PRICE_VALUE[None, :, None] * 0.3 + TYPE_MATCH * 0.3, 2).ravel(), -np.inf)
+
+
+class PlanCatalog:
+    """Plan catalog held as parallel NumPy columns so recommendations score every plan in one expression"""
+
+    def __init__(self, plan_ids, types, categories, prices, quotas, speeds):
+        self.plan_ids = np.asarray(plan_ids, dtype=object)
+        self.categories = np.asarray(categories, dtype=object)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self.quotas = np.asarray(quotas)
+        self.speeds = np.asarray(speeds)
+        # Service types are stored as small integer codes into type_names
+        self.type_names, self.type_codes = np.unique(np.asarray(types, dtype=str), return_inverse=True)
+        self.version = self._fingerprint()
+
+    def __len__(self):
+        return len(self.plan_ids)
+
+    @classmethod
+    def from_plans(cls, plans):
+        """Build from the engine's {plan_id: {'type', 'category', 'price', 'data', 'speed'}} dict"""
+        return cls(
+            list(plans.keys()),
+            [plan['type'] for plan in plans.values()],
+            [plan['category'] for plan in plans.values()],
+            [plan['price'] for plan in plans.values()],
+            [plan['data'] for plan in plans.values()],
+            [plan['speed'] for plan in plans.values()]
+        )
+
+    @classmethod
+    def from_frame(cls, df):
+        missing = [col for col in CATALOG_COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError(f"Plan catalog is missing columns: {', '.join(missing)}")
+        return cls(df['plan_id'].astype(str), df['type'], df['category'], df['price'], df['data'], df['speed'])
+
+    @classmethod
+    def from_file(cls, path, cache_dir=None):
+        """Load a CSV or Parquet catalog export, reading only the catalog columns
+
+        With a cache_dir the columns are converted once per file version and memory-mapped,
+        so every worker and tenant serving the same catalog shares one copy.
+        """
+        if cache_dir:
+            tables = os.path.join(cache_dir, f"catalog-{file_sha256(path)[:16]}")
+            if not os.path.isdir(tables):
+                write_directory(tables, cls.from_file(path).save)
+            return cls.load(tables)
+        if os.path.splitext(path)[1].lower() == '.parquet':
+            return cls.from_frame(pd.read_parquet(path, columns=CATALOG_COLUMNS))
+        return cls.from_frame(pd.read_csv(path, usecols=CATALOG_COLUMNS))
+
+    def save(self, path):
+        """Write the columns as .npy files so they can be memory-mapped by load()"""
+        os.makedirs(path, exist_ok=True)
+        for name in TABLES:
+            column = getattr(self, name)
+            np.save(os.path.join(path, f"{name}.npy"), column.astype(str) if column.dtype == object else column)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        catalog = cls.__new__(cls)
+        for name in TABLES:
+            setattr(catalog, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode))
+        catalog.version = catalog._fingerprint()
+        return catalog
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in TABLES)
+
+    @property
+    def is_mapped(self):
+        return isinstance(self.prices, np.memmap)
+
+    def _fingerprint(self):
+        digest = hashlib.sha256()
+        for column in (self.plan_ids.astype(str), self.categories.astype(str), self.type_names, self.type_codes,
+                       self.prices, self.quotas, self.speeds):
+            digest.update(np.ascontiguousarray(column).tobytes() if column.dtype != object else json.dumps(column.tolist()).encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def type_code(self, service_type):
+        """Integer code for a service type name, -1 if no plan has that type"""
+        position = np.searchsorted(self.type_names, str(service_type))
+        if position < len(self.type_names) and self.type_names[position] == str(service_type):
+            return int(position)
+        return -1
+
+    def plan(self, index):
+        """Materialise one catalog row as a plan dict"""
+        return {
+            'type': str(self.type_names[self.type_codes[index]]),
+            'category': self.categories[index],
+            'price': self.prices.item(index),
+            'data': self.quotas.item(index),
+            'speed': self.speeds.item(index)
+        }
+
+    def suitability_scores(self, usage, budget_max, service_type=None):
+        """Score every plan against a user; plans over budget get -inf"""
+        return self.suitability_matrix([usage], [budget_max], [service_type])[0]
+
+    def preference_code(self, service_type):
+        """Type code of a preference: NO_PREFERENCE for none, -1 for a type no plan has"""
+        return self.type_code(service_type) if service_type else NO_PREFERENCE
+
+    def preference_codes(self, service_types):
+        return np.array([self.preference_code(t) for t in service_types], dtype=np.int64)
+
+    def suitability_matrix(self, usages, budgets, service_types):
+        """Score every plan for every user in one pass -> (users, plans); plans over budget get -inf"""
+        return self.score_matrix(usages, budgets, self.preference_codes(service_types))
+
+    def score_matrix(self, usages, budgets, preference_codes):
+        """suitability_matrix() with preferences already mapped by preference_codes()"""
+        usages = np.asarray(usages, dtype=np.float64)[:, None]
+        budgets = np.asarray(budgets, dtype=np.float64)[:, None]
+        # NO_PREFERENCE matches every plan, unknown types (-1) match none
+        preferred = np.asarray(preference_codes)[:, None]
+
+        # Small integer classes per (user, plan) looked up in SCORE_TABLE: the same values as the
+        # weighted sum per element, for a fraction of the floating-point work
+        affordable = self.prices <= budgets
+        usage_class = np.maximum(self.quotas >= usages, (self.quotas >= usages * 1.2) * np.uint8(2))
+        price_class = np.maximum(affordable, (self.prices <= budgets * 0.8) * np.uint8(2))
+        type_class = (preferred == NO_PREFERENCE) | (self.type_codes == preferred)
+        classes = usage_class * np.uint8(6) + price_class * np.uint8(2) + type_class
+        classes[~affordable] = len(SCORE_TABLE) - 1
+        return SCORE_TABLE[classes]
+
+    def top_k(self, scores, k):
+        """Indices of the k best finite scores, highest first; ties keep catalog order"""
+        indices, found = self.top_k_matrix(scores[None, :], k)
+        return indices[0][found[0]]
+
+    def top_k_matrix(self, scores, k):
+        """Row-wise top k of a (users, plans) score matrix -> (indices, found); found is False for padding"""
+        n_users, n_plans = scores.shape
+        k = max(0, min(k, n_plans))
+        # Rounded scores are multiples of 0.01, so score * 100 * n - index ranks uniquely and stably
+        rank_keys = np.where(np.isfinite(scores), np.rint(scores * 100) * n_plans - np.arange(n_plans), -np.inf)
+        if k < n_plans:
+            indices = np.argpartition(-rank_keys, k - 1, axis=1)[:, :k] if k else np.zeros((n_users, 0), dtype=np.int64)
+        else:
+            indices = np.broadcast_to(np.arange(n_plans), (n_users, n_plans))
+        selected = np.take_along_axis(rank_keys, indices, axis=1)
+        order = np.argsort(-selected, axis=1)
+        indices = np.take_along_axis(indices, order, axis=1)
+        return indices, np.isfinite(np.take_along_axis(selected, order, axis=1))
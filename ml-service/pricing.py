@@ -0,0 +1,101 @@
+import numpy as np
+
+# Price elasticity of demand assumed by the single-plan optimizer
+DEFAULT_ELASTICITY = -0.5
+
+# Portfolio sweep defaults: candidate prices from -30% to +30% of the current price, four demand scenarios
+DEFAULT_PRICE_RANGE = (-0.3, 0.3)
+DEFAULT_PRICE_STEPS = 25
+DEFAULT_ELASTICITY_SCENARIOS = (-0.25, -0.5, -1.0, -1.5)
+
+
+def price_grid(current_prices, min_change=DEFAULT_PRICE_RANGE[0], max_change=DEFAULT_PRICE_RANGE[1], steps=DEFAULT_PRICE_STEPS):
+    """(plans, steps) candidate prices, evenly spaced relative changes around each current price"""
+    if steps < 1 or not -1 < min_change <= max_change:
+        raise ValueError('Price range needs -1 < min_change <= max_change and at least one step')
+    # Rounded so the unchanged price lands exactly on 1.0 instead of 1 +- 1e-17 (floor() would drop a subscriber)
+    multipliers = np.round(1 + np.linspace(min_change, max_change, steps), 12)
+    return np.asarray(current_prices, dtype=np.float64)[:, None] * multipliers
+
+
+def simulate_pricing(current_prices, subscriber_counts, candidate_prices, elasticities):
+    """Revenue and subscriber impact of every candidate price under every elasticity scenario
+
+    current_prices and subscriber_counts hold one value per plan, candidate_prices is
+    (plans, prices) and elasticities (scenarios,). Current prices must be positive, since
+    price changes are relative to them; callers validate this (PortfolioPricingOptimizer,
+    /pricing/optimize). Subscribers respond linearly to the relative price change,
+    floor(count * (1 + elasticity * change)), clamped at zero: once an increase is large
+    enough that the linear model predicts every subscriber leaves, larger ones lose no
+    more subscribers and revenue drops to zero rather than going negative.
+    Every returned array is (plans, prices, scenarios).
+    """
+    current_prices = np.asarray(current_prices, dtype=np.float64)
+    subscriber_counts = np.asarray(subscriber_counts, dtype=np.float64)
+    candidate_prices = np.asarray(candidate_prices, dtype=np.float64)
+    elasticities = np.asarray(elasticities, dtype=np.float64)
+
+    price_change = (candidate_prices - current_prices[:, None]) / current_prices[:, None]
+    new_subscribers = np.floor(subscriber_counts[:, None, None] * (1 + price_change[:, :, None] * elasticities))
+    np.maximum(new_subscribers, 0, out=new_subscribers)
+
+    current_revenue = (current_prices * subscriber_counts)[:, None, None]
+    new_revenue = candidate_prices[:, :, None] * new_subscribers
+    with np.errstate(divide='ignore', invalid='ignore'):
+        revenue_change_pct = np.where(current_revenue > 0, (new_revenue - current_revenue) / current_revenue * 100, 0.0)
+    return {
+        'new_revenue': new_revenue,
+        'revenue_change': new_revenue - current_revenue,
+        'subscriber_change': new_subscribers - subscriber_counts[:, None, None],
+        'revenue_change_pct': revenue_change_pct
+    }
+
+
+class PortfolioPricingOptimizer:
+    """Sweeps every plan over a price grid and a set of elasticity scenarios in one array pass.
+
+    For each plan and scenario it picks the revenue-maximising candidate price, and
+    across scenarios the price with the best scenario-weighted expected revenue (the
+    recommendation that holds up when demand sensitivity is uncertain). Work is
+    plans x prices x scenarios float operations, so thousands of plans take
+    milliseconds.
+    """
+
+    def __init__(self, elasticities=DEFAULT_ELASTICITY_SCENARIOS, weights=None, min_change=DEFAULT_PRICE_RANGE[0],
+                 max_change=DEFAULT_PRICE_RANGE[1], steps=DEFAULT_PRICE_STEPS):
+        self.elasticities = np.asarray(elasticities, dtype=np.float64)
+        if not len(self.elasticities):
+            raise ValueError('At least one elasticity scenario is required')
+        weights = np.ones(len(self.elasticities)) if weights is None else np.asarray(weights, dtype=np.float64)
+        if weights.shape != self.elasticities.shape or weights.min() < 0 or weights.sum() <= 0:
+            raise ValueError('Scenario weights must be non-negative, one per elasticity')
+        self.weights = weights / weights.sum()
+        self.min_change = min_change
+        self.max_change = max_change
+        self.steps = steps
+
+    def optimize(self, current_prices, subscriber_counts):
+        """Optimal prices per plan; returns a dict of NumPy arrays indexed by plan (and scenario)"""
+        current_prices = np.asarray(current_prices, dtype=np.float64)
+        # NaN fails every comparison, so test for what a usable price is rather than for <= 0
+        if not (np.isfinite(current_prices) & (current_prices > 0)).all():
+            raise ValueError('Current prices must be positive and finite')
+        candidates = price_grid(current_prices, self.min_change, self.max_change, self.steps)
+        impact = simulate_pricing(current_prices, subscriber_counts, candidates, self.elasticities)
+
+        plans = np.arange(len(current_prices))
+        best = impact['new_revenue'].argmax(axis=1)  # (plans, scenarios)
+        expected_revenue = impact['new_revenue'] @ self.weights  # (plans, prices)
+        recommended = expected_revenue.argmax(axis=1)
+        expected_change = impact['revenue_change'] @ self.weights
+        return {
+            'candidate_prices': candidates,
+            'optimal_price': np.take_along_axis(candidates, best, axis=1),
+            'revenue_change': np.take_along_axis(impact['revenue_change'], best[:, None, :], axis=1)[:, 0, :],
+            'revenue_change_pct': np.take_along_axis(impact['revenue_change_pct'], best[:, None, :], axis=1)[:, 0, :],
+            'subscriber_change': np.take_along_axis(impact['subscriber_change'], best[:, None, :], axis=1)[:, 0, :],
+            'current_revenue': current_prices * np.asarray(subscriber_counts, dtype=np.float64),
+            'recommended_price': candidates[plans, recommended],
+            'expected_revenue_change': expected_change[plans, recommended],
+            'expected_revenue': expected_revenue
+        }
@@ -0,0 +1,169 @@
+import json
+import math
+import os
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from data_loader import write_directory
+from plan_catalog import NO_PREFERENCE
+
+# Grid the index is built over: usage every 10 GB and budget every $1, up to just past the largest
+# quota and the budget at which every plan is affordable
+DEFAULT_USAGE_STEP = 10.0
+DEFAULT_BUDGET_STEP = 1.0
+# Plans stored per cell; requests for more fall back to exact scoring
+DEFAULT_INDEX_K = 10
+
+# Cells scored per score_matrix() call while building, bounded to about this many plan scores
+BUILD_CHUNK_SCORES = 2 ** 21
+
+# Arrays written by save() and memory-mapped by load()
+TABLES = ['quotas', 'prices', 'preference_codes', 'usage_grid', 'budget_grid', 'usage_keys', 'budget_keys', 'indices', 'scores', 'counts']
+
+
+class RecommendationIndex:
+    """Precomputed top-k plans for a quantized usage x budget x service type grid of one catalog version.
+
+    A plan's suitability only changes where usage crosses quota / 1.2 or quota and where the
+    budget crosses price / 0.8 or price, so the thresholds a query passes (two searchsorted
+    calls per axis) identify its cell. Every query in the same cell as a grid point gets that
+    point's top-k, which is exactly what scoring the whole catalog returns; queries in cells no
+    grid point reaches, non-finite inputs and k above the stored depth are not indexed and
+    the caller scores them exactly. cell() answers one query with bisect and dict lookups,
+    cells() a batch of them with searchsorted.
+
+    Building scores every cell against the whole catalog (seconds for thousands of plans),
+    so for_catalog() keeps built indexes in a cache directory, memory-mapped by every worker.
+    """
+
+    def __init__(self, catalog, k=DEFAULT_INDEX_K, usage_step=DEFAULT_USAGE_STEP, budget_step=DEFAULT_BUDGET_STEP):
+        if usage_step <= 0 or budget_step <= 0:
+            raise ValueError('Index grid steps must be positive')
+        self.version = catalog.version
+        self.k = max(0, min(k, len(catalog)))
+        self.complete = self.k == len(catalog)
+        self.quotas = np.unique(np.asarray(catalog.quotas, dtype=np.float64))
+        self.prices = np.unique(catalog.prices)
+        # Preference codes run from NO_PREFERENCE (-2) and unknown (-1) through every catalog type
+        self.preference_codes = np.arange(NO_PREFERENCE, len(catalog.type_names))
+
+        max_quota = self.quotas[-1] if len(self.quotas) else 0.0
+        max_price = self.prices[-1] if len(self.prices) else 0.0
+        self.usage_grid = np.arange(0.0, max_quota + 2 * usage_step, usage_step)
+        self.budget_grid = np.arange(0.0, max_price / 0.8 + 2 * budget_step, budget_step)
+        # Grid points that land in the same cell collapse to one row, scored at its first point
+        self.usage_keys, first_usage = np.unique(self._usage_key(self.usage_grid), return_index=True)
+        self.budget_keys, first_budget = np.unique(self._budget_key(self.budget_grid), return_index=True)
+        self._build(catalog, self.usage_grid[first_usage], self.budget_grid[first_budget])
+        self._prepare_lookups()
+
+    @classmethod
+    def for_catalog(cls, catalog, cache_dir=None, k=DEFAULT_INDEX_K, usage_step=DEFAULT_USAGE_STEP, budget_step=DEFAULT_BUDGET_STEP):
+        """Index of a catalog version, built once per cache_dir and grid and memory-mapped from there"""
+        if not cache_dir:
+            return cls(catalog, k, usage_step, budget_step)
+        path = os.path.join(cache_dir, f"recindex-{catalog.version}-k{k}-u{usage_step:g}-b{budget_step:g}")
+        if not os.path.isdir(path):
+            write_directory(path, cls(catalog, k, usage_step, budget_step).save)
+        return cls.load(path)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in TABLES:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, 'index.json'), 'w') as f:
+            json.dump({'version': self.version, 'k': self.k, 'complete': self.complete}, f)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        index = cls.__new__(cls)
+        for name in TABLES:
+            setattr(index, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode))
+        with open(os.path.join(path, 'index.json')) as f:
+            index.__dict__.update(json.load(f))
+        index._prepare_lookups()
+        return index
+
+    def _prepare_lookups(self):
+        # Plain-Python copies for single lookups, where NumPy's per-call overhead would dominate
+        self._quota_list, self._price_list = self.quotas.tolist(), self.prices.tolist()
+        self._usage_rows = {key: row for row, key in enumerate(self.usage_keys.tolist())}
+        self._budget_rows = {key: row for row, key in enumerate(self.budget_keys.tolist())}
+
+    def _usage_key(self, usages):
+        # Same comparisons as PlanCatalog.score_matrix: quota >= usage * 1.2 and quota >= usage
+        n = len(self.quotas) + 1
+        return np.searchsorted(self.quotas, usages * 1.2, 'left') * n + np.searchsorted(self.quotas, usages, 'left')
+
+    def _budget_key(self, budgets):
+        # ... and price <= budget * 0.8 and price <= budget
+        n = len(self.prices) + 1
+        return np.searchsorted(self.prices, budgets * 0.8, 'right') * n + np.searchsorted(self.prices, budgets, 'right')
+
+    def _build(self, catalog, usages, budgets):
+        n_types, n_usages, n_budgets = len(self.preference_codes), len(usages), len(budgets)
+        cells = n_types * n_usages * n_budgets
+        type_rows, usage_rows, budget_rows = np.unravel_index(np.arange(cells), (n_types, n_usages, n_budgets))
+        self.indices = np.zeros((cells, self.k), dtype=np.int32)
+        # Scores are multiples of 0.01 and stored as hundredths
+        self.scores = np.zeros((cells, self.k), dtype=np.int16)
+        self.counts = np.zeros(cells, dtype=np.int16)
+
+        chunk = max(1, BUILD_CHUNK_SCORES // max(len(catalog), 1))
+        for start in range(0, cells, chunk):
+            rows = slice(start, start + chunk)
+            scores = catalog.score_matrix(usages[usage_rows[rows]], budgets[budget_rows[rows]], self.preference_codes[type_rows[rows]])
+            indices, found = catalog.top_k_matrix(scores, self.k)
+            self.indices[rows] = indices
+            self.scores[rows] = np.where(found, np.rint(np.take_along_axis(scores, indices, axis=1) * 100), 0)
+            self.counts[rows] = found.sum(axis=1)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in TABLES)
+
+    @property
+    def is_mapped(self):
+        return isinstance(self.indices, np.memmap)
+
+    def __len__(self):
+        return len(self.counts)
+
+    @staticmethod
+    def _locate(keys, values):
+        positions = np.minimum(np.searchsorted(keys, values), len(keys) - 1)
+        return np.where(keys[positions] == values, positions, -1)
+
+    def supports(self, k):
+        """Whether cells hold enough plans to answer a top-k query"""
+        return k <= self.k or self.complete
+
+    def cell(self, usage, budget, preference_code):
+        """Cell of one query for top_k(), -1 when it is not indexed"""
+        if not (math.isfinite(usage) and math.isfinite(budget)):
+            return -1
+        quotas, prices = self._quota_list, self._price_list
+        usage_row = self._usage_rows.get(bisect_left(quotas, usage * 1.2) * (len(quotas) + 1) + bisect_left(quotas, usage), -1)
+        budget_row = self._budget_rows.get(bisect_right(prices, budget * 0.8) * (len(prices) + 1) + bisect_right(prices, budget), -1)
+        if usage_row < 0 or budget_row < 0:
+            return -1
+        return ((preference_code - NO_PREFERENCE) * len(self.usage_keys) + usage_row) * len(self.budget_keys) + budget_row
+
+    def cells(self, usages, budgets, preference_codes):
+        """Cell per query for top_k(), -1 where the query is not indexed"""
+        usages = np.asarray(usages, dtype=np.float64)
+        budgets = np.asarray(budgets, dtype=np.float64)
+        usage_rows = self._locate(self.usage_keys, self._usage_key(usages))
+        budget_rows = self._locate(self.budget_keys, self._budget_key(budgets))
+        type_rows = np.asarray(preference_codes) - NO_PREFERENCE
+        cells = (type_rows * len(self.usage_keys) + usage_rows) * len(self.budget_keys) + budget_rows
+        indexed = (usage_rows >= 0) & (budget_rows >= 0) & np.isfinite(usages) & np.isfinite(budgets)
+        return np.where(indexed, cells, -1)
+
+    def top_k(self, cell, k):
+        """(plan indices, scores) of an indexed cell, best first, as PlanCatalog.top_k() ranks them"""
+        # Clamped like PlanCatalog.top_k_matrix: k <= 0 selects nothing rather than slicing from the end
+        count = max(0, min(k, self.counts[cell]))
+        return self.indices[cell, :count], self.scores[cell, :count] / 100
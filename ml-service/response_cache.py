@@ -0,0 +1,95 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of endpoint results with per-endpoint TTLs.
+
+    Entries are keyed on the endpoint plus a canonical form of the JSON request
+    body. Each endpoint also carries a version (model or catalog version): when
+    the version seen by get() changes, that endpoint's entries are dropped, so a
+    retrain or catalog reload invalidates the cache without any explicit call.
+    """
+
+    def __init__(self, max_entries=10000, ttls=None):
+        self.max_entries = max_entries
+        self.ttls = dict(ttls or {})
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def canonical_key(endpoint, body):
+        canonical = json.dumps(body, sort_keys=True, separators=(',', ':'), default=str)
+        return endpoint, hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _endpoint_stats(self, endpoint):
+        return self._stats.setdefault(endpoint, {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0})
+
+    def _check_version(self, endpoint, version):
+        if self._versions.get(endpoint, version) != version:
+            self._drop_endpoint(endpoint)
+        self._versions[endpoint] = version
+
+    def _drop_endpoint(self, endpoint):
+        stale = [key for key in self._entries if key[0] == endpoint]
+        for key in stale:
+            del self._entries[key]
+        self._endpoint_stats(endpoint)['invalidations'] += len(stale)
+
+    def get(self, endpoint, body, version):
+        """Return the cached result for this request, or None on a miss"""
+        if not self.enabled:
+            return None
+        key = self.canonical_key(endpoint, body)
+        with self._lock:
+            self._check_version(endpoint, version)
+            stats = self._endpoint_stats(endpoint)
+            entry = self._entries.get(key)
+            if entry is None:
+                stats['misses'] += 1
+                return None
+            value, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._entries[key]
+                stats['expirations'] += 1
+                stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            stats['hits'] += 1
+            return value
+
+    def set(self, endpoint, body, version, value):
+        if not self.enabled:
+            return
+        key = self.canonical_key(endpoint, body)
+        ttl = self.ttls.get(endpoint)
+        with self._lock:
+            self._check_version(endpoint, version)
+            self._entries[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                (evicted_endpoint, _), _ = self._entries.popitem(last=False)
+                self._endpoint_stats(evicted_endpoint)['evictions'] += 1
+
+    def invalidate(self, endpoint=None):
+        """Drop all entries, or only those of one endpoint"""
+        with self._lock:
+            for name in ([endpoint] if endpoint else {key[0] for key in self._entries}):
+                self._drop_endpoint(name)
+
+    def stats(self):
+        with self._lock:
+            endpoints = {name: dict(stats, version=self._versions.get(name)) for name, stats in self._stats.items()}
+            for stats in endpoints.values():
+                lookups = stats['hits'] + stats['misses']
+                stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+            return {'entries': len(self._entries), 'max_entries': self.max_entries, 'ttls': self.ttls, 'endpoints': endpoints}
@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): a single process is assumed and every lock is granted
+    fcntl = None
+
+
+class ProcessLock:
+    """Non-blocking exclusive flock on a file, held until release() or until the process exits"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._pid = None
+
+    @property
+    def held(self):
+        # A lock file inherited through fork belongs to the parent, not to this process
+        return self._file is not None and self._pid == os.getpid()
+
+    def acquire(self):
+        """Take the lock if it is free; returns whether this process holds it"""
+        if self.held:
+            return True
+        if fcntl is None:
+            self._file, self._pid = True, os.getpid()
+            return True
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        lock_file = open(self.path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file, self._pid = lock_file, os.getpid()
+        return True
+
+    def release(self):
+        if self.held and fcntl is not None:
+            self._file.close()
+        self._file = self._pid = None
+
+
+class BackgroundRetrainer:
+    """Runs engine.retrain() off the request path, on demand or on a fixed interval.
+
+    At most one retrain runs at a time across all processes sharing lock_path:
+    the interval scheduler only fires in the worker holding the scheduler lock,
+    and a run only starts while its process holds the run lock. The serving
+    model is only replaced by the engine's atomic swap once a new model passes
+    its AUC check; every other worker picks it up from the registry within
+    watch_seconds (engine.sync_with_registry()). Like the micro-batcher, the
+    executor and threads are (re)created lazily per process so they survive
+    gunicorn's pre-fork.
+    """
+
+    def __init__(self, get_engine, interval_seconds=0, history_size=20, lock_path=None, watch_seconds=0):
+        self.get_engine = get_engine
+        self.interval_seconds = interval_seconds
+        self.watch_seconds = watch_seconds
+        self.history = deque(maxlen=history_size)
+        self._scheduler_lock = ProcessLock(f"{lock_path}.scheduler.lock") if lock_path else None
+        self._run_lock = ProcessLock(f"{lock_path}.run.lock") if lock_path else None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._running = None
+        self._scheduler = None
+        self._watcher = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='churn-retrain')
+            self._running = None
+            if self.interval_seconds > 0:
+                self._scheduler = threading.Thread(target=self._schedule, name='churn-retrain-scheduler', daemon=True)
+                self._scheduler.start()
+            if self.watch_seconds > 0:
+                self._watcher = threading.Thread(target=self._watch, name='churn-registry-watcher', daemon=True)
+                self._watcher.start()
+
+    def start(self):
+        """Start the interval scheduler and registry watcher (if configured) in this process"""
+        self._ensure_started()
+
+    @property
+    def is_scheduler(self):
+        """Whether the interval scheduler fires in this process (the first to take the scheduler lock)"""
+        return self.interval_seconds > 0 and (self._scheduler_lock is None or self._scheduler_lock.acquire())
+
+    def _schedule(self):
+        while True:
+            time.sleep(self.interval_seconds)
+            # Every worker ticks, only the lock holder retrains; if it dies the lock frees up for the next
+            if self.is_scheduler:
+                self.trigger(reason='scheduled')
+
+    def _watch(self):
+        while True:
+            time.sleep(self.watch_seconds)
+            try:
+                self.get_engine().sync_with_registry()
+            except Exception as e:
+                print(f"Warning: Could not reload churn model from the registry: {str(e)}")
+
+    def trigger(self, reason='manual', **retrain_kwargs):
+        """Queue a background retrain; returns False if one is already running"""
+        self._ensure_started()
+        with self._lock:
+            if self._running is not None and not self._running.done():
+                return False
+            requested_at = datetime.now().isoformat()
+            self._running = self._executor.submit(self._run, reason, requested_at, retrain_kwargs)
+            return True
+
+    def _run(self, reason, requested_at, retrain_kwargs):
+        if self._run_lock is not None and not self._run_lock.acquire():
+            record = {'status': 'skipped', 'reason': 'Retraining already in progress in another worker'}
+        else:
+            try:
+                record = self.get_engine().retrain(**retrain_kwargs)
+            except Exception as e:
+                print(f"Warning: Background retraining failed: {str(e)}")
+                record = {'status': 'failed', 'error': str(e)}
+            finally:
+                if self._run_lock is not None:
+                    self._run_lock.release()
+        record.update(reason=reason, requested_at=requested_at)
+        self.history.append(record)
+        return record
+
+    def status(self):
+        return {
+            'running': self._running is not None and not self._running.done(),
+            'interval_seconds': self.interval_seconds,
+            'scheduler': self._scheduler_lock.held if self._scheduler_lock is not None else self.interval_seconds > 0,
+            'history': list(self.history)
+        }
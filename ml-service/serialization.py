@@ -0,0 +1,82 @@
+import json
+from datetime import date
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib encoder is used without it
+    orjson = None
+
+JSON_BACKENDS = ('orjson', 'json')
+
+# NumPy arrays and scalars are encoded natively; dict keys need not be strings (plan ids, counts)
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def default(obj):
+    """Encode what neither encoder handles natively: NumPy values for json, odd arrays and dates for both"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, date):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj, backend='orjson', sort_keys=False, indent=False):
+    """Compact UTF-8 JSON bytes; falls back to the stdlib encoder when orjson is unavailable"""
+    if backend == 'orjson' and orjson is not None:
+        option = ORJSON_OPTIONS | (orjson.OPT_SORT_KEYS if sort_keys else 0) | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=default, option=option)
+    separators = None if indent else (',', ':')
+    return json.dumps(obj, default=default, sort_keys=sort_keys, indent=2 if indent else None,
+                      separators=separators, ensure_ascii=False).encode('utf-8')
+
+
+def loads(data, backend='orjson'):
+    if backend == 'orjson' and orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class InvalidLine(dict):
+    """Stands in for an NDJSON line that is not valid JSON; it is also the error line to answer with"""
+
+    def __init__(self, index):
+        super().__init__(index=index, error='Invalid JSON')
+
+
+def ndjson_records(lines, backend='orjson'):
+    """Parse an iterable of NDJSON lines (e.g. a request stream) lazily, skipping blank lines
+
+    A line that does not parse yields an InvalidLine with its record index instead of raising,
+    since a streamed response has already gone out with status 200 by the time it is read.
+    """
+    index = 0
+    for line in lines:
+        if line.strip():
+            try:
+                yield loads(line, backend)
+            except ValueError:  # json's and orjson's decode errors (and bad UTF-8) are all ValueErrors
+                yield InvalidLine(index)
+            index += 1
+
+
+def ndjson_chunks(records, encode, flush_bytes=64 * 1024):
+    """Encode records one line at a time and yield them joined into writes of about flush_bytes
+
+    Memory stays bounded by one chunk however many records flow through, and the
+    server makes one write per chunk rather than one per line.
+    """
+    buffer, size = [], 0
+    for record in records:
+        line = encode(record) + b'\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= flush_bytes:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
@@ -0,0 +1,260 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from plan_catalog import CATALOG_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, CSV output still works without it
+    pa = None
+    pq = None
+
+# Window the generated dates fall into; CHURN_REFERENCE_DATE (2025-09-13) sits just after it
+DATE_START = np.datetime64('2023-09-01')
+DATE_SPAN_DAYS = 730
+
+OUTPUT_FORMATS = ['parquet', 'csv']
+
+# Subscription_Logs actions, indexed by the codes the generator draws
+LOG_ACTIONS = ['purchase', 'renew', 'renew_failed', 'billing_success']
+
+
+class TableWriter:
+    """Appends DataFrame chunks to one Parquet or CSV file without keeping earlier chunks"""
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.rows = 0
+        self._writer = None
+
+    def write(self, df):
+        if self.fmt == 'parquet':
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode='a' if self.rows else 'w', header=not self.rows, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class SyntheticDatasetGenerator:
+    """Streams schema-compatible subscription tables at arbitrary scale.
+
+    The five sheets of SubscriptionUseCase_Dataset.xlsx are written as one
+    Parquet or CSV file each (the export-directory layout DatasetLoader reads),
+    plus a plan catalog for recommendations. Subscriptions are generated
+    chunk_rows at a time together with their billing and log events, so memory
+    stays bounded by the chunk; only small per-user and per-plan arrays are
+    kept whole. A subscription ends up PAUSED with a probability driven by the
+    same signals the churn model reads: price, payment and renewal failures,
+    auto renewal, user status, tenure and subscription type.
+    """
+
+    def __init__(self, users=100000, subscriptions=None, plans=200, billing_per_subscription=8.0,
+                 logs_per_subscription=3.0, chunk_rows=100000, seed=42):
+        self.users = users
+        self.subscriptions = subscriptions or users
+        self.plans = plans
+        self.billing_per_subscription = billing_per_subscription
+        self.logs_per_subscription = logs_per_subscription
+        self.chunk_rows = chunk_rows
+        self.seed = seed
+
+    def write(self, path, fmt='parquet', progress=False):
+        """Write every table under path; returns {table: rows} plus the observed churn rate"""
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(OUTPUT_FORMATS)}")
+        if fmt == 'parquet' and pa is None:
+            raise RuntimeError('Parquet output needs pyarrow; use fmt="csv"')
+        os.makedirs(path, exist_ok=True)
+        rng = np.random.default_rng(self.seed)
+        self._next_billing_id = 1
+        writers = {name: TableWriter(os.path.join(path, f"{name}.{fmt}"), fmt) for name in
+                   ['User_Data', 'Subscription_Plans', 'Subscriptions', 'Billing_Information', 'Subscription_Logs', 'plan_catalog']}
+        try:
+            plans = self._plans(rng)
+            writers['Subscription_Plans'].write(plans)
+            writers['plan_catalog'].write(self._catalog(plans, rng))
+            user_inactive = self._write_users(writers['User_Data'], rng)
+
+            paused = 0
+            started = time.perf_counter()
+            for start in range(0, self.subscriptions, self.chunk_rows):
+                ids = np.arange(start + 1, min(start + self.chunk_rows, self.subscriptions) + 1)
+                subscriptions, billing, logs = self._subscription_chunk(ids, plans, user_inactive, rng)
+                writers['Subscriptions'].write(subscriptions)
+                writers['Billing_Information'].write(billing)
+                writers['Subscription_Logs'].write(logs)
+                paused += int((subscriptions['Status'] == 'PAUSED').sum())
+                if progress:
+                    done = ids[-1]
+                    print(f"   {done:,}/{self.subscriptions:,} subscriptions ({done / (time.perf_counter() - started):,.0f}/s)")
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        summary = {name: writer.rows for name, writer in writers.items()}
+        summary['churn_rate'] = round(paused / max(self.subscriptions, 1), 4)
+        return summary
+
+    def _plans(self, rng):
+        ids = np.arange(1, self.plans + 1)
+        # Most plans are mid-priced; a long tail of premium tiers
+        prices = np.round(np.clip(rng.lognormal(np.log(40), 0.45, self.plans), 9.99, 199.99), 2)
+        return pd.DataFrame({
+            'Product Id': ids,
+            'Name': [f"Plan{i}" for i in ids],
+            'Price': prices,
+            'Auto Renewal Allowed': rng.choice(['Yes', 'No'], self.plans, p=[0.7, 0.3]),
+            'Status': rng.choice(['Active', 'Inactive'], self.plans, p=[0.9, 0.1])
+        })
+
+    def _catalog(self, plans, rng):
+        """Plan catalog rows (CATALOG_COLUMNS) for PLAN_CATALOG_PATH; quota and speed grow with price"""
+        tier = np.searchsorted(np.quantile(plans['Price'], [0.33, 0.66]), plans['Price'])
+        catalog = pd.DataFrame({
+            'plan_id': [f"plan-{i}" for i in plans['Product Id']],
+            'type': rng.choice(['Fibernet', 'Broadband Copper'], len(plans), p=[0.6, 0.4]),
+            'category': np.array(['Basic', 'Standard', 'Premium'])[tier],
+            'price': plans['Price'],
+            'data': np.array([100, 500, 1000])[tier] * rng.choice([1, 2], len(plans)),
+            'speed': np.array([50, 100, 200])[tier] * rng.choice([1, 2], len(plans))
+        })
+        return catalog[CATALOG_COLUMNS]
+
+    def _write_users(self, writer, rng):
+        """Write User_Data in chunks; returns the per-user inactive flags subscriptions need"""
+        inactive = np.zeros(self.users + 1, dtype=bool)
+        for start in range(0, self.users, self.chunk_rows):
+            ids = np.arange(start + 1, min(start + self.chunk_rows, self.users) + 1)
+            chunk_inactive = rng.random(len(ids)) < 0.35
+            inactive[ids] = chunk_inactive
+            writer.write(pd.DataFrame({
+                'User Id': ids,
+                'Name': [f"User{i}" for i in ids],
+                'Phone': 1000000000 + ids,
+                'Email': [f"user{i}@example.com" for i in ids],
+                'Status': self._labels(chunk_inactive, ['active', 'inactive'])
+            }))
+        return inactive
+
+    def _subscription_chunk(self, ids, plans, user_inactive, rng):
+        n = len(ids)
+        prices = plans['Price'].to_numpy()
+        no_auto_renew = (plans['Auto Renewal Allowed'] == 'No').to_numpy()
+
+        # Cheaper plans are more popular (Zipf-like over the price rank)
+        popularity = 1.0 / (np.argsort(np.argsort(prices)) + 1.0) ** 0.8
+        product = rng.choice(plans['Product Id'].to_numpy(), n, p=popularity / popularity.sum())
+        user = rng.integers(1, self.users + 1, n)
+        yearly = rng.random(n) < 0.4
+        start_offset = rng.integers(0, DATE_SPAN_DAYS, n)
+        tenure_days = DATE_SPAN_DAYS - start_offset
+        renew_offset = start_offset + (rng.random(n) * tenure_days).astype(np.int64)
+
+        # Per-subscription failure propensity: most pay reliably, a tail fails often
+        failure_propensity = rng.beta(1.2, 9, n)
+        billing, payment_failures = self._billing_chunk(ids, prices[product - 1] * np.where(yearly, 10, 1), failure_propensity, start_offset, rng)
+        logs, renew_failures = self._logs_chunk(ids, failure_propensity, start_offset, rng)
+
+        logit = (-1.6 + 0.015 * (prices[product - 1] - 40) + 0.45 * payment_failures + 0.6 * renew_failures
+                 + 0.7 * no_auto_renew[product - 1] + 0.6 * user_inactive[user] - 0.5 * yearly
+                 - 0.0015 * tenure_days + 0.002 * (DATE_SPAN_DAYS - renew_offset))
+        paused = rng.random(n) < 1 / (1 + np.exp(-logit))
+
+        subscriptions = pd.DataFrame({
+            'Subscription Id': ids,
+            'Subscription Type': self._labels(yearly, ['monthly', 'yearly']),
+            'Product Id': product,
+            'User Id': user,
+            'Status': self._labels(paused, ['active', 'PAUSED']),
+            'Start Date': self._dates(start_offset),
+            'Last Billed Date': self._dates(np.minimum(renew_offset + rng.integers(0, 30, n), DATE_SPAN_DAYS - 1)),
+            'Last Renewed Date': self._dates(renew_offset),
+            'Terminated Date': np.nan,
+            'Grace Time': rng.choice([0, 5, 7, 15], n, p=[0.2, 0.5, 0.2, 0.1])
+        })
+        return subscriptions, billing, logs
+
+    def _billing_chunk(self, ids, amounts, failure_propensity, start_offset, rng):
+        counts = rng.poisson(self.billing_per_subscription, len(ids))
+        owner = np.repeat(np.arange(len(ids)), counts)
+        failed = rng.random(len(owner)) < failure_propensity[owner]
+        pending = ~failed & (rng.random(len(owner)) < 0.05)
+        billing = pd.DataFrame({
+            'billing_id': self._next_billing_id + np.arange(len(owner)),
+            'subscription_id': ids[owner],
+            'amount': np.round(amounts[owner] * rng.normal(1.0, 0.05, len(owner)), 2),
+            'billing_date': self._dates(start_offset[owner] + (rng.random(len(owner)) * (DATE_SPAN_DAYS - start_offset[owner])).astype(np.int64)),
+            'payment_status': self._labels(np.where(failed, 2, pending), ['paid', 'pending', 'failed'])
+        })
+        self._next_billing_id += len(owner)
+        return billing, np.bincount(owner[failed], minlength=len(ids))
+
+    def _logs_chunk(self, ids, failure_propensity, start_offset, rng):
+        # Every subscription starts with a purchase, followed by renewals and billing events
+        counts = rng.poisson(self.logs_per_subscription, len(ids))
+        events = np.repeat(np.arange(len(ids)), counts)
+        renew_failed = rng.random(len(events)) < np.minimum(failure_propensity[events] * 2, 0.9)
+        event_action = np.where(renew_failed, 2, rng.choice([1, 3], len(events), p=[0.6, 0.4]))
+        event_offset = start_offset[events] + (rng.random(len(events)) * (DATE_SPAN_DAYS - start_offset[events])).astype(np.int64)
+
+        owner = np.concatenate([np.arange(len(ids)), events])
+        action = np.concatenate([np.zeros(len(ids), dtype=np.int64), event_action])
+        offsets = np.concatenate([start_offset, event_offset])
+        logs = pd.DataFrame({
+            'Subscription id': ids[owner],
+            'current status': self._labels(action != 0, ['initialized', 'active']),
+            'next status': self._labels(action == 2, ['active', 'paused']),
+            'action': self._labels(action, LOG_ACTIONS),
+            'action date': self._dates(offsets)
+        })
+        return logs, np.bincount(owner[action == 2], minlength=len(ids))
+
+    @staticmethod
+    def _labels(codes, names):
+        # Categoricals keep one copy of each label: far smaller than per-row strings, same CSV/Parquet values
+        return pd.Categorical.from_codes(np.asarray(codes, dtype=np.int8), names)
+
+    @staticmethod
+    def _dates(offsets):
+        # Typed dates are a fraction of the size of date strings; CSV still renders them as YYYY-MM-DD
+        return DATE_START + offsets.astype('timedelta64[D]')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream a synthetic subscription dataset (export-directory layout) to Parquet or CSV')
+    parser.add_argument('output', help='Directory to write the tables into (use as DATASET_PATH)')
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--subscriptions', type=int, default=None, help='Defaults to --users')
+    parser.add_argument('--plans', type=int, default=500)
+    parser.add_argument('--billing-per-subscription', type=float, default=8.0)
+    parser.add_argument('--logs-per-subscription', type=float, default=3.0)
+    parser.add_argument('--chunk-rows', type=int, default=100000, help='Subscriptions generated per chunk')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='parquet' if pa is not None else 'csv')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    generator = SyntheticDatasetGenerator(args.users, args.subscriptions, args.plans, args.billing_per_subscription,
+                                          args.logs_per_subscription, args.chunk_rows, args.seed)
+    print(f"🧪 Generating {generator.subscriptions:,} subscriptions for {args.users:,} users into {args.output} ({args.format})")
+    started = time.perf_counter()
+    summary = generator.write(args.output, args.format, progress=True)
+    print(f"✅ Done in {time.perf_counter() - started:.1f}s, churn rate {summary.pop('churn_rate'):.1%}")
+    for table, rows in summary.items():
+        print(f"   {table:22} {rows:>12,} rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import json
+import os
+
+# Settings a tenant may override; everything else comes from the service environment
+TENANT_SETTINGS = ('dataset_path', 'plan_catalog_path')
+
+
+def load_tenant_specs(value):
+    """Tenant specs from inline JSON or a JSON file: {key: {'dataset_path': ..., 'plan_catalog_path': ...}}
+
+    Relative paths in a file are resolved against the file's directory.
+    """
+    if not value:
+        return {}
+    base_dir = None
+    if os.path.isfile(value):
+        base_dir = os.path.dirname(os.path.abspath(value))
+        with open(value) as f:
+            specs = json.load(f)
+    else:
+        specs = json.loads(value)
+    if not isinstance(specs, dict):
+        raise ValueError('Tenant specs must be a JSON object keyed by model key')
+
+    resolved = {}
+    for key, spec in specs.items():
+        unknown = set(spec) - set(TENANT_SETTINGS)
+        if unknown:
+            raise ValueError(f"Tenant {key!r} has unknown settings: {', '.join(sorted(unknown))}")
+        resolved[key] = {name: os.path.join(base_dir, path) if base_dir and path else path for name, path in spec.items()}
+    return resolved
+
+
+class TenantRegistry:
+    """Named models and plan catalogs (per region or tenant) served by one process.
+
+    Each key gets its own serving stack built by factory(key, spec): engine,
+    response cache, micro-batcher and retrainer. Requests select one by key and
+    fall back to the default. Tenants trained on the same dataset share one
+    registry artifact, and forest and catalog tables are memory-mapped from the
+    cache directories, so co-hosted tenants and gunicorn workers read one copy.
+    """
+
+    def __init__(self, factory, specs=None, default_key='default'):
+        specs = dict(specs or {})
+        specs.setdefault(default_key, {})
+        self.default_key = default_key
+        self._services = {key: factory(key, spec) for key, spec in specs.items()}
+
+    def get(self, key=None):
+        """The serving stack for key (default when empty); raises KeyError for unknown keys"""
+        return self._services[key or self.default_key]
+
+    def items(self):
+        return self._services.items()
+
+    def services(self):
+        return self._services.values()
+
+    def __len__(self):
+        return len(self._services)
@@ -0,0 +1,355 @@
+import argparse
+import copy
+import json
+import os
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DatasetLoader
+from feature_store import FailureFeatureStore
+
+# Churn model feature schema (order matters for predict_proba)
+CHURN_CATEGORICAL_COLS = ['Subscription Type', 'Auto Renewal Allowed', 'Status_x']
+CHURN_FEATURES = ['Price', 'subscription_duration_days', 'days_since_last_renewed', 'payment_failures', 'renew_failures'] + CHURN_CATEGORICAL_COLS
+CHURN_REFERENCE_DATE = date(2025, 9, 13)
+
+# Columns the pipeline reads from each sheet; everything else is skipped at load time
+CHURN_TRAINING_COLUMNS = {
+    'User_Data': ['User Id', 'Status'],
+    'Subscriptions': ['Subscription Id', 'Subscription Type', 'Product Id', 'User Id', 'Status', 'Start Date', 'Last Renewed Date'],
+    'Subscription_Plans': ['Product Id', 'Price', 'Auto Renewal Allowed', 'Status'],
+    'Subscription_Logs': ['Subscription id', 'action'],
+    'Billing_Information': ['subscription_id', 'payment_status'],
+}
+
+
+def feature_fingerprints(df):
+    """One hash per featurised subscription row (features and label), to tell which rows changed"""
+    # Fixed dtypes, so a reload that reads a column as float instead of int does not mark every row changed
+    dtypes = {col: str if col in CHURN_CATEGORICAL_COLS else np.float64 for col in CHURN_FEATURES + ['churn']}
+    return pd.util.hash_pandas_object(df[list(dtypes)].astype(dtypes), index=False).to_numpy()
+
+
+def encode_with(encoder, values):
+    """Codes of values under a fitted LabelEncoder; unseen values map to 0, as at serving time"""
+    classes = encoder.classes_
+    values = np.asarray(values, dtype=str)
+    positions = np.clip(np.searchsorted(classes, values), 0, len(classes) - 1)
+    return np.where(classes[positions] == values, positions, 0)
+
+
+def parse_partition(value):
+    """Parse an 'index/count' partition spec such as '0/4'; empty means no partitioning"""
+    if not value:
+        return None
+    index, count = (int(part) for part in str(value).split('/'))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid partition {value!r}, expected index/count with 0 <= index < count")
+    return index, count
+
+
+class StageProfiler:
+    """Wall-clock time and peak memory of each named pipeline stage.
+
+    Peak memory is the tracemalloc high-water mark above the stage's starting
+    allocation (NumPy and pandas buffers included) when trace_memory is on, plus
+    the process peak RSS seen so far, which is always available and free to read.
+    tracemalloc slows allocation-heavy stages (the forest fit several-fold), so
+    it is opt-in.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, **details):
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        record = {'stage': name, **details}
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - started, 3)
+            if self.trace_memory:
+                record['peak_mb'] = round((tracemalloc.get_traced_memory()[1] - baseline) / 1e6, 1)
+                if started_tracing:
+                    tracemalloc.stop()
+            # ru_maxrss is in KiB on Linux
+            record['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+            self.stages.append(record)
+
+
+class ChurnTrainingPipeline:
+    """Chunked churn-model training over in-memory tables or a streamed dataset.
+
+    Billing and log events are folded into a FailureFeatureStore batch by batch
+    and subscriptions are joined and featurised one chunk at a time, so only the
+    small feature frame is ever held whole. The forest is fitted with n_jobs
+    workers (trees are built in parallel). sample_fraction and partition select a
+    deterministic subset of subscriptions by hashing their ids, independent of
+    chunk size, so the same settings always train on the same rows.
+
+    update() is the incremental path: it featurises the same way, compares each
+    row's fingerprint with a checkpoint and grows the forest with warm_start
+    trees fitted on the new and changed rows only.
+    """
+
+    def __init__(self, n_estimators=100, random_state=42, test_size=0.2, n_jobs=None, chunk_rows=100000,
+                 sample_fraction=1.0, partition=None, trace_memory=False):
+        if not 0 < sample_fraction <= 1:
+            raise ValueError(f"sample_fraction must be in (0, 1], got {sample_fraction}")
+        self.n_estimators = n_estimators
+        self.random_state = random_state
+        self.test_size = test_size
+        self.n_jobs = n_jobs
+        self.chunk_rows = chunk_rows
+        self.sample_fraction = sample_fraction
+        self.partition = parse_partition(partition) if isinstance(partition, str) else partition
+        self.trace_memory = trace_memory
+
+    def run(self, source, feature_store=None):
+        """Train on source ({sheet: DataFrame} or DatasetLoader); returns (model, label_encoders, metrics)
+
+        An existing feature store (the serving one) is reused instead of re-aggregating billing and logs.
+        """
+        # Imported here so the serving process, which only needs the schema constants above, never loads them
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.metrics import roc_auc_score
+        from sklearn.model_selection import train_test_split
+        from sklearn.preprocessing import LabelEncoder
+
+        profiler = StageProfiler(self.trace_memory)
+        started = time.perf_counter()
+
+        df = self._features(source, feature_store, profiler)
+
+        with profiler.stage('encode'):
+            label_encoders = {}
+            for col in CHURN_CATEGORICAL_COLS:
+                le = LabelEncoder()
+                df[col] = le.fit_transform(df[col].astype(str))
+                label_encoders[col] = le
+            X = df[CHURN_FEATURES].fillna(0)
+            y = df['churn']
+            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=self.test_size, random_state=self.random_state)
+
+        with profiler.stage('fit', n_jobs=self.n_jobs):
+            model = RandomForestClassifier(n_estimators=self.n_estimators, random_state=self.random_state, n_jobs=self.n_jobs)
+            model.fit(X_train, y_train)
+            # Serving scores small batches, where dispatching to a thread pool costs more than it saves
+            model.set_params(n_jobs=None)
+
+        with profiler.stage('evaluate'):
+            auc = roc_auc_score(y_test, model.predict_proba(X_test)[:, 1])
+
+        metrics = {
+            'auc': float(auc),
+            'train_rows': len(X_train),
+            'holdout_rows': len(X_test),
+            'training_seconds': round(time.perf_counter() - started, 3),
+            'trained_at': datetime.now().isoformat(),
+            'n_jobs': self.n_jobs,
+            'sample_fraction': self.sample_fraction,
+            'partition': '/'.join(map(str, self.partition)) if self.partition else None,
+            'stages': profiler.stages
+        }
+        return model, label_encoders, metrics
+
+    def update(self, model, label_encoders, source, fingerprints, feature_store=None, n_trees=10,
+               baseline_auc=None, max_auc_drop=None):
+        """Grow a fitted forest by n_trees trees fitted on the subscriptions that changed since a checkpoint
+
+        fingerprints is the checkpoint's (subscription ids, row hashes). Rows that are new or whose
+        features or label changed (failure events, renewals, plan or user updates) are the update's
+        data; before fitting, the current model's AUC on them is the drift check against
+        baseline_auc. Returns (model, metrics, fingerprints): model is a copy sharing the existing
+        trees, or None when nothing changed, the changed rows hold one class or drift exceeds
+        max_auc_drop (metrics['skipped'] says which); fingerprints are the ones to checkpoint next.
+        model is never modified.
+        """
+        from sklearn.metrics import roc_auc_score
+        from sklearn.model_selection import train_test_split
+
+        profiler = StageProfiler(self.trace_memory)
+        started = time.perf_counter()
+        df = self._features(source, feature_store, profiler)
+
+        with profiler.stage('diff') as record:
+            ids = df['Subscription Id'].astype(str).to_numpy()
+            hashes = feature_fingerprints(df)
+            previous = pd.Series(fingerprints[1], index=fingerprints[0]).reindex(ids)
+            changed = df[previous.isna().to_numpy() | (previous.to_numpy() != hashes)]
+            record.update(rows=len(df), changed_rows=len(changed))
+
+        metrics = {
+            'mode': 'incremental',
+            'changed_rows': len(changed),
+            'trees_added': 0,
+            'n_estimators': len(model.estimators_),
+            'auc': None,
+            'drift_auc': None,
+            'baseline_auc': baseline_auc,
+            'trained_at': datetime.now().isoformat(),
+            'n_jobs': self.n_jobs,
+            'stages': profiler.stages
+        }
+
+        def finish(updated, skipped=None):
+            metrics.update(skipped=skipped, training_seconds=round(time.perf_counter() - started, 3))
+            return updated, metrics, (ids, hashes)
+
+        if changed.empty:
+            return finish(None, 'No subscriptions changed since the checkpoint')
+        y = changed['churn']
+        if y.nunique() < 2:
+            return finish(None, 'Changed subscriptions hold a single class')
+
+        with profiler.stage('encode'):
+            X = changed[CHURN_FEATURES].copy()
+            for col in CHURN_CATEGORICAL_COLS:
+                X[col] = encode_with(label_encoders[col], X[col].astype(str))
+            X = X.fillna(0)
+
+        with profiler.stage('drift'):
+            # The serving model has not seen these rows as they are now: its AUC on them tracks drift
+            metrics['drift_auc'] = float(roc_auc_score(y, model.predict_proba(X)[:, 1]))
+        if baseline_auc is not None and max_auc_drop is not None and baseline_auc - metrics['drift_auc'] > max_auc_drop:
+            return finish(None, f"AUC on changed subscriptions fell to {metrics['drift_auc']:.4f} (checkpoint {baseline_auc:.4f})")
+
+        stratify = y if y.value_counts().min() >= 2 else None
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=self.test_size, random_state=self.random_state, stratify=stratify)
+        if y_train.nunique() < 2:
+            return finish(None, 'Changed subscriptions hold a single class')
+
+        with profiler.stage('fit', n_jobs=self.n_jobs, trees=n_trees):
+            # A shallow copy with its own estimator list: warm_start appends to it, the serving model stays as is
+            updated = copy.copy(model)
+            updated.estimators_ = list(model.estimators_)
+            updated.set_params(warm_start=True, n_estimators=len(model.estimators_) + n_trees, n_jobs=self.n_jobs)
+            updated.fit(X_train, y_train)
+            updated.set_params(warm_start=False, n_jobs=None)
+
+        with profiler.stage('evaluate'):
+            if y_test.nunique() > 1:
+                metrics['auc'] = float(roc_auc_score(y_test, updated.predict_proba(X_test)[:, 1]))
+        metrics.update(trees_added=n_trees, n_estimators=len(updated.estimators_), train_rows=len(X_train), holdout_rows=len(X_test))
+        return finish(updated)
+
+    def fingerprints(self, source, feature_store=None):
+        """(subscription ids, row hashes) of the training rows, the checkpoint update() compares against"""
+        df = self._features(source, feature_store, StageProfiler())
+        return df['Subscription Id'].astype(str).to_numpy(), feature_fingerprints(df)
+
+    def _features(self, source, feature_store, profiler):
+        """Featurised subscriptions of the sample/partition, with their ids; failure counts come from feature_store if given"""
+        with profiler.stage('load_dimensions') as record:
+            plans = pd.concat(list(self._batches(source, 'Subscription_Plans')), ignore_index=True)
+            users = pd.concat(list(self._batches(source, 'User_Data')), ignore_index=True)
+            record['rows'] = len(plans) + len(users)
+
+        if feature_store is None:
+            with profiler.stage('failure_counts') as record:
+                feature_store = FailureFeatureStore()
+                record['rows'] = sum(len(batch) for batch in self._append(source, 'Billing_Information', feature_store.append_billing))
+                record['rows'] += sum(len(batch) for batch in self._append(source, 'Subscription_Logs', feature_store.append_logs))
+
+        with profiler.stage('features') as record:
+            frames, scanned = [], 0
+            for batch in self._batches(source, 'Subscriptions'):
+                scanned += len(batch)
+                batch = self._select(batch)
+                if len(batch):
+                    frames.append(self._featurise(batch, plans, users, feature_store))
+            if not frames:
+                raise ValueError('No subscriptions selected for training')
+            df = pd.concat(frames, ignore_index=True)
+            record.update(rows=scanned, selected_rows=len(df))
+        return df
+
+    def _batches(self, source, sheet):
+        if isinstance(source, DatasetLoader):
+            yield from source.iter_batches(sheet, self.chunk_rows)
+            return
+        table = source[sheet]
+        for start in range(0, len(table), self.chunk_rows):
+            yield table.iloc[start:start + self.chunk_rows]
+
+    def _append(self, source, sheet, append):
+        for batch in self._batches(source, sheet):
+            append(batch)
+            yield batch
+
+    def _select(self, subscriptions):
+        """Keep the subscriptions in the configured sample/partition"""
+        if self.sample_fraction >= 1 and not self.partition:
+            return subscriptions
+        hashes = pd.util.hash_pandas_object(subscriptions['Subscription Id'].astype(str), index=False).to_numpy()
+        keep = np.ones(len(subscriptions), dtype=bool)
+        if self.partition:
+            index, count = self.partition
+            keep &= hashes % count == index
+        if self.sample_fraction < 1:
+            # High 32 bits as a uniform draw, independent of the low bits used for partitioning
+            keep &= (hashes >> np.uint64(32)) < np.uint64(int(self.sample_fraction * 2 ** 32))
+        return subscriptions[keep]
+
+    def _featurise(self, subscriptions, plans, users, feature_store):
+        """Join one chunk of subscriptions to plans and users and engineer the model features"""
+        # Subscription keeps 'Status', user status becomes 'Status_x'
+        df = subscriptions.merge(plans, on='Product Id', how='left', suffixes=('', '_plan'))
+        df = df.merge(users, on='User Id', how='left', suffixes=('', '_x'))
+
+        current_date = pd.Timestamp(CHURN_REFERENCE_DATE)
+        df['subscription_duration_days'] = (current_date - pd.to_datetime(df['Start Date'])).dt.days
+        df['days_since_last_renewed'] = (current_date - pd.to_datetime(df['Last Renewed Date'])).dt.days
+
+        failure_counts, _ = feature_store.lookup(df['Subscription Id'])
+        df['payment_failures'] = failure_counts[:, 0]
+        df['renew_failures'] = failure_counts[:, 1]
+
+        df['churn'] = (df['Status'] == 'PAUSED').astype(int)  # Target: 1 if PAUSED, else 0
+        return df[['Subscription Id'] + CHURN_FEATURES + ['churn']]
+
+
+def main():
+    service_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Train the churn model out of core and report per-stage time and memory')
+    parser.add_argument('--dataset', default=os.path.join(service_dir, '..', 'SubscriptionUseCase_Dataset.xlsx'),
+                        help='Workbook or directory of CSV/Parquet/Arrow exports')
+    parser.add_argument('--cache-dir', default=os.path.join(service_dir, 'data_cache'))
+    parser.add_argument('--n-jobs', type=int, default=-1, help='Trees fitted in parallel (-1 = all cores)')
+    parser.add_argument('--chunk-rows', type=int, default=100000)
+    parser.add_argument('--sample', type=float, default=1.0, help='Fraction of subscriptions to train on')
+    parser.add_argument('--partition', default=None, help="Train on one hash partition, e.g. '0/4'")
+    parser.add_argument('--trace-memory', action='store_true', help='Also report tracemalloc peaks (slows the fit)')
+    parser.add_argument('--json', action='store_true', help='Print the metrics as JSON')
+    args = parser.parse_args()
+
+    pipeline = ChurnTrainingPipeline(n_jobs=args.n_jobs, chunk_rows=args.chunk_rows, sample_fraction=args.sample,
+                                     partition=args.partition, trace_memory=args.trace_memory)
+    loader = DatasetLoader(args.dataset, args.cache_dir, columns=CHURN_TRAINING_COLUMNS)
+    _, _, metrics = pipeline.run(loader)
+
+    if args.json:
+        print(json.dumps(metrics, indent=2))
+        return
+    print(f"🌲 Churn model AUC {metrics['auc']:.4f} on {metrics['train_rows']} training rows ({metrics['training_seconds']}s)")
+    for stage in metrics['stages']:
+        peak = f"{stage['peak_mb']:>8.1f} MB peak" if 'peak_mb' in stage else ''
+        print(f"  {stage['stage']:<16} {stage['seconds']:>8.3f}s {peak}  max RSS {stage['max_rss_mb']:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()